@@ -0,0 +1,517 @@
+import asyncio
+import datetime
+import json
+import logging
+import os
+import pprint
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from agent.batch_runner import (STATUS_FINISHED, STATUS_STEP_BUDGET,
+                                 STATUS_TIMEOUT, STATUS_WAITING_FOR_USER,
+                                 BatchResult, BatchTask)
+
+from agent.context_compactor import ContextCompactor
+from agent.llm_clients.async_client_interface import AsyncLLMClientInterface
+from agent.llm_clients.model_router import RoutingSignals
+from agent.llm_clients.structured_output import drop_null_arguments
+from agent.prompt_layout import (canonicalize_message,
+                                  canonicalize_tool_schema, log_prefix)
+from agent.prompts import get_system_message, get_user_task_message
+from agent.session_log import SessionLog, SessionReplay
+from agent.session_metrics import SessionMetrics
+from agent.tool_call_repair import ToolCallRepairError, ToolCallRepairer
+from agent.tool_request_parser import (BadToolRequestError,
+                                       InvalidCommandJson,
+                                       NoToolRequestError,
+                                       parse_tool_request_to_llm_format)
+from agent.tools.finish_task_tool import TaskCompleteError
+from agent.tools.tool_manager import ToolCallCancelledError, ToolManager
+
+LOGGER_NAME = __name__
+
+# keep tools, system prompt and environment byte-identical at the front of every
+# request so OpenAI prompt caching and LM Studio KV-cache reuse can hit
+PROMPT_CACHE_FRIENDLY = os.getenv("SIIV_PROMPT_CACHE_FRIENDLY", "1") != "0"
+
+# read-only tool calls from one assistant message run concurrently; 1 runs everything in order
+MAX_PARALLEL_TOOLS = int(os.getenv("SIIV_MAX_PARALLEL_TOOLS", "8"))
+
+# repeated reads of unchanged files/directories get a short reference instead of the full output
+TOOL_RESULT_CACHE = os.getenv("SIIV_TOOL_RESULT_CACHE", "1") != "0"
+
+logger = logging.getLogger(LOGGER_NAME)
+
+
+def get_tool_call_fields(tool_call) -> Tuple[str, str, Dict[str, Any]]:
+    """Return (id, function name, arguments) for an OpenAI tool call object or an LM Studio dict."""
+    if isinstance(tool_call, dict):
+        function = tool_call["function"]
+        return tool_call["id"], function["name"], json.loads(function["arguments"])
+    return (
+        tool_call.id,
+        tool_call.function.name,
+        json.loads(tool_call.function.arguments),
+    )
+
+
+class AgentSession:
+    """
+    The message history and tool state of one agent conversation.
+
+    It does everything except call the model, so the same session logic is
+    driven by the blocking loop in main.handle_pytest_query and by the
+    asyncio loop in run_session_async.
+    """
+
+    def __init__(
+        self,
+        query_text: str,
+        current_working_dir: str,
+        session_log: Optional[SessionLog] = None,
+        interactive: bool = True,
+    ):
+        # related_code_chunks = vector_client.retrieve(query_text=query_text, top_k=10)
+        # context_string = vector_client.build_context_string(code_chunks=related_code_chunks)
+
+        current_time = datetime.datetime.now()
+
+        self.messages = [
+            get_system_message(
+                full_current_working_dir=current_working_dir,
+                default_shell="bin/zsh",
+                home_dir="/Users/matthewflood",
+                operating_system="macOS",
+            ),
+            get_user_task_message(
+                task=query_text,
+                full_current_working_dir=current_working_dir,
+                current_time=current_time,
+                stable_prefix_first=PROMPT_CACHE_FRIENDLY,
+            ),
+        ]
+
+        self.tool_manager = ToolManager.default(
+            root_dir=current_working_dir,
+            max_parallel_tools=MAX_PARALLEL_TOOLS,
+            cache_results=TOOL_RESULT_CACHE,
+            interactive=interactive,
+        )
+        self.tool_schema = self.tool_manager.get_tools_schema_list()
+        if PROMPT_CACHE_FRIENDLY:
+            self.messages[0] = canonicalize_message(self.messages[0])
+            self.tool_schema = canonicalize_tool_schema(self.tool_schema)
+            log_prefix(self.messages[:1], self.tool_schema)
+        self.final_message: Optional[str] = None
+        self.waiting_for_user = False
+        self.metrics = SessionMetrics()
+        self.compactor = ContextCompactor()
+        self.turn = 0
+        self.planning = True
+        self.consecutive_parse_failures = 0
+        self.consecutive_tool_errors = 0
+        self.tool_call_repairer = ToolCallRepairer(self.tool_schema)
+        self.session_log = session_log
+        # set by cancel(); tool calls not yet started are skipped
+        self._cancelled = threading.Event()
+        # held while a reply is applied, which may run in a worker thread
+        self._step_lock = threading.Lock()
+
+    def state(self) -> Dict[str, Any]:
+        """What besides the messages a resumed session needs."""
+        return {
+            "turn": self.turn,
+            "planning": self.planning,
+            "waiting_for_user": self.waiting_for_user,
+            "consecutive_parse_failures": self.consecutive_parse_failures,
+            "consecutive_tool_errors": self.consecutive_tool_errors,
+            "final_message": self.final_message,
+        }
+
+    def restore(self, replay: SessionReplay) -> None:
+        if replay.messages:
+            self.messages = replay.messages
+        for name, value in replay.state.items():
+            setattr(self, name, value)
+
+    def checkpoint(self) -> None:
+        if self.session_log is not None:
+            self.session_log.checkpoint(self.turn, self.messages, self.state())
+
+    def log_invocation(self) -> None:
+        logger.info("----------- START INVOCATION -------------")
+        for message in self.messages:
+            logger.info(
+                "------- %s message %s ------",
+                message["role"],
+                message.get("tool_call_id", ""),
+            )
+            pprint.pprint(message)
+
+        logger.info("----------- END INVOCATION -------------")
+
+    def compact_history(self) -> None:
+        """Shrink stale tool output once the history outgrows the context budget."""
+        compacted = self.compactor.compact(self.messages)
+        if compacted is not self.messages and self.tool_manager.result_cache is not None:
+            # cached results may point at output that was just elided or dropped
+            self.tool_manager.result_cache.clear()
+        self.messages = compacted
+
+    def routing_signals(self) -> RoutingSignals:
+        return RoutingSignals(
+            turn=self.turn,
+            planning=self.planning,
+            consecutive_parse_failures=self.consecutive_parse_failures,
+            consecutive_tool_errors=self.consecutive_tool_errors,
+        )
+
+    def record_llm_call(self, chat_and_tool_response, latency_seconds: float):
+        return self.metrics.record_llm_call(
+            model=chat_and_tool_response.model,
+            usage=chat_and_tool_response.usage,
+            latency_seconds=latency_seconds,
+        )
+
+    def close(self) -> None:
+        """Release the session's tool worker threads."""
+        self.tool_manager.close()
+
+    def cancel(self) -> None:
+        """Stop running tools: the current tool call finishes, later ones and later replies are skipped."""
+        self._cancelled.set()
+
+    def wait_for_step(self) -> None:
+        """Block until the reply being applied, if any, is done with the messages."""
+        with self._step_lock:
+            pass
+
+    def handle_response(self, chat_and_tool_response) -> bool:
+        """
+        Apply one model reply: run its tool calls and append the results.
+
+        Returns True once the task is complete. If the reply had no tool call,
+        waiting_for_user is set and add_user_input must be called next. A
+        cancelled session ignores the reply.
+        """
+        with self._step_lock:
+            if self._cancelled.is_set():
+                logger.info("Session cancelled; ignoring the model reply")
+                return False
+            return self._handle_response(chat_and_tool_response)
+
+    def _handle_response(self, chat_and_tool_response) -> bool:
+        if self.session_log is not None:
+            # logged before the tools run, so a crash in between does not cost another model call
+            self.session_log.record_response(
+                self.turn + 1,
+                {
+                    "content": chat_and_tool_response.content,
+                    "tool_calls": chat_and_tool_response.tool_calls,
+                    "usage": chat_and_tool_response.usage,
+                    "model": chat_and_tool_response.model,
+                },
+            )
+        done = self._apply_response(chat_and_tool_response)
+        self.checkpoint()
+        if done and self.session_log is not None:
+            self.session_log.finish(self.final_message)
+        return done
+
+    def _apply_response(self, chat_and_tool_response) -> bool:
+        self.waiting_for_user = False
+        self.turn += 1
+        self.planning = False
+
+        if chat_and_tool_response.tool_calls:
+            tool_calls = chat_and_tool_response.tool_calls
+            logger.info(
+                "The LLM response included %d explicit tool calls", len(tool_calls)
+            )
+            assistant_message = {
+                "role": "assistant",
+                "tool_calls": tool_calls,
+            }
+            logger.info(assistant_message)
+            self.messages.append(assistant_message)
+            return self._execute_tool_calls(tool_calls)
+
+        try:
+            tool_call = parse_tool_request_to_llm_format(
+                text=chat_and_tool_response.content
+            )
+        except (NoToolRequestError, BadToolRequestError, InvalidCommandJson) as e:
+            tool_call = self._repair_tool_request(chat_and_tool_response.content)
+            if tool_call is None:
+                return self._handle_unparsed_response(chat_and_tool_response, e)
+
+        assistant_message = {
+            "role": "assistant",
+            "content": chat_and_tool_response.content,
+            "tool_calls": [{"type": "function", **tool_call}],
+        }
+        self.messages.append(assistant_message)
+        return self._execute_tool_calls([tool_call])
+
+    def _repair_tool_request(self, text: str) -> Optional[dict]:
+        """Fix a malformed [TOOL_REQUEST] locally instead of spending a round trip asking the model."""
+        try:
+            repaired = self.tool_call_repairer.repair(text)
+        except ToolCallRepairError as e:
+            logger.info("Could not repair tool request: %s", e)
+            return None
+        return {
+            "id": str(uuid.uuid4()),
+            "function": {
+                "name": repaired.name,
+                "arguments": json.dumps(repaired.arguments),
+            },
+        }
+
+    def _handle_unparsed_response(self, chat_and_tool_response, error: Exception) -> bool:
+        if isinstance(error, NoToolRequestError):
+            logger.error("Got a message without a tool")
+            message = {
+                "role": "assistant",
+                "content": chat_and_tool_response.content,
+            }
+            self.messages.append(message)
+            self.waiting_for_user = True
+            return False
+
+        self.consecutive_parse_failures += 1
+
+        if isinstance(error, BadToolRequestError):
+            message = {
+                "role": "user",
+                "content": f"Your call was not formatted correctly. You must make a valid tool call. Error: {error}",
+            }
+            logger.error(message)
+            self.messages.append(message)
+            return False
+
+        message = {
+            "role": "assistant",
+            "content": chat_and_tool_response.content,
+        }
+        logger.error(message)
+        self.messages.append(message)
+
+        message = {
+            "role": "user",
+            "content": f"Your tool call was not valid json. Error: {error}",
+        }
+        logger.error(message)
+        self.messages.append(message)
+        return False
+
+    def _execute_tool_calls(self, tool_calls: List[Any]) -> bool:
+        self.consecutive_parse_failures = 0
+        logger.info("Processing %d tool calls", len(tool_calls))
+        calls = []
+        tool_call_ids = []
+        for tool_call in tool_calls:
+            logger.info("tool call: %s", tool_call)
+
+            tool_call_id, tool_call_function_name, tool_call_args = (
+                get_tool_call_fields(tool_call)
+            )
+            tool_call_args = drop_null_arguments(tool_call_args)
+            logger.info(
+                "Invoking tool: %s with args: %s",
+                tool_call_function_name,
+                tool_call_args,
+            )
+            calls.append((tool_call_function_name, tool_call_args))
+            tool_call_ids.append(tool_call_id)
+
+        # read-only calls run concurrently; results are still appended in tool_call_id order
+        outcomes = self.tool_manager.execute_tool_calls(calls, tool_call_ids, cancelled=self._cancelled)
+        for tool_call_id, outcome in zip(tool_call_ids, outcomes):
+            tool_call_function_name, result = outcome.name, outcome.result
+            if isinstance(outcome.error, ToolCallCancelledError):
+                # every tool call still needs its tool message
+                self.messages.append(
+                    {
+                        "role": "tool",
+                        "name": tool_call_function_name,
+                        "tool_call_id": tool_call_id,
+                        "content": str(outcome.error),
+                    }
+                )
+                continue
+            if isinstance(outcome.error, TaskCompleteError):
+                self.metrics.record_tool_call(
+                    tool_call_function_name, outcome.seconds, 0
+                )
+                logger.info("Got TaskComplete!!")
+                logger.info("Final message: %s", outcome.error)
+                self.final_message = outcome.error.message
+                return True
+            if outcome.error is not None:
+                raise outcome.error
+
+            if result is None or result.return_code != 0:
+                self.consecutive_tool_errors += 1
+            else:
+                self.consecutive_tool_errors = 0
+
+            if result is None:
+                tool_response_message = {
+                    "role": "tool",
+                    "name": tool_call_function_name,
+                    "tool_call_id": tool_call_id,
+                    "content": f"Tool '{tool_call_function_name}' not found.",
+                }
+            else:
+                tool_response_message = {
+                    "role": "tool",
+                    "name": tool_call_function_name,
+                    "tool_call_id": tool_call_id,
+                    "content": result.to_llm_message(),
+                }
+            self.metrics.record_tool_call(
+                tool_call_function_name,
+                outcome.seconds,
+                len(tool_response_message["content"]),
+            )
+            logger.info(tool_response_message)
+            self.messages.append(tool_response_message)
+        return False
+
+    def add_user_input(self, user_input: str) -> None:
+        self.waiting_for_user = False
+        # new instructions deserve a fresh plan
+        self.planning = True
+        if self.tool_manager.result_cache is not None:
+            # the user may have changed the workspace in the meantime
+            self.tool_manager.result_cache.clear()
+        message = {"role": "user", "content": user_input}
+        self.messages.append(message)
+        self.checkpoint()
+
+
+async def handle_pytest_query_async(
+    query_text: str,
+    current_working_dir: str,
+    async_llm_client: AsyncLLMClientInterface,
+    ask_user: Optional[Callable[[str], Awaitable[str]]] = None,
+) -> Optional[str]:
+    """
+    asyncio version of handle_pytest_query: awaits the model instead of blocking
+    on it, so one process can run many sessions concurrently.
+
+    Tools still run synchronously, in a worker thread. When the model replies
+    without a tool call, `ask_user` is awaited for the answer; without one the
+    session ends and returns None.
+    """
+    session = await asyncio.to_thread(
+        AgentSession, query_text=query_text, current_working_dir=current_working_dir
+    )
+    try:
+        await run_session_async(session, async_llm_client, ask_user=ask_user)
+    finally:
+        await asyncio.to_thread(session.close)
+    return session.final_message
+
+
+async def run_session_async(
+    session: AgentSession,
+    async_llm_client: AsyncLLMClientInterface,
+    ask_user: Optional[Callable[[str], Awaitable[str]]] = None,
+    max_steps: Optional[int] = None,
+) -> str:
+    """Drive `session` until it finishes, needs an absent user or uses up `max_steps` model replies; returns the status."""
+    while True:
+        session.compact_history()
+        started = time.monotonic()
+        chat_and_tool_response = await async_llm_client.call_chat(
+            messages=session.messages,
+            tool_schema=session.tool_schema,
+        )
+        session.record_llm_call(chat_and_tool_response, time.monotonic() - started)
+
+        if await asyncio.to_thread(session.handle_response, chat_and_tool_response):
+            session.metrics.log_summary()
+            return STATUS_FINISHED
+
+        if session.waiting_for_user:
+            if ask_user is None:
+                session.metrics.log_summary()
+                return STATUS_WAITING_FOR_USER
+            session.add_user_input(await ask_user(chat_and_tool_response.content))
+
+        if max_steps is not None and session.turn >= max_steps:
+            logger.info("Step budget of %d used up", max_steps)
+            session.metrics.log_summary()
+            return STATUS_STEP_BUDGET
+
+
+async def run_batch_task(
+    task: BatchTask,
+    async_llm_client: AsyncLLMClientInterface,
+    default_timeout: Optional[float] = None,
+    default_max_steps: Optional[int] = None,
+) -> BatchResult:
+    """Run one batch task headless: no stdin, approvals refused, bounded by its timeout and step budget."""
+    started = time.monotonic()
+    session = await asyncio.to_thread(
+        AgentSession,
+        query_text=task.prompt,
+        current_working_dir=task.working_dir,
+        interactive=False,
+    )
+    timeout = task.timeout_seconds if task.timeout_seconds is not None else default_timeout
+    max_steps = task.max_steps if task.max_steps is not None else default_max_steps
+    try:
+        status = await asyncio.wait_for(
+            run_session_async(session, async_llm_client, max_steps=max_steps),
+            timeout=timeout,
+        )
+    except asyncio.TimeoutError:
+        # the worker thread applying a reply is not interrupted: let its running
+        # tool finish, skip the rest, and only then read the messages
+        logger.info("Task %s timed out after %ss", task.task_id, timeout)
+        session.cancel()
+        await asyncio.to_thread(session.wait_for_step)
+        status = STATUS_TIMEOUT
+    finally:
+        await asyncio.to_thread(session.close)
+
+    last_message = next(
+        (m.get("content") for m in reversed(session.messages) if m.get("role") == "assistant"),
+        None,
+    )
+    return BatchResult(
+        task_id=task.task_id,
+        status=status,
+        final_message=session.final_message,
+        last_message=last_message,
+        steps=session.turn,
+        seconds=time.monotonic() - started,
+        metrics=session.metrics.summary(),
+    )
+
+
+async def run_concurrent_queries(
+    queries: List[Tuple[str, str]],
+    async_llm_client: AsyncLLMClientInterface,
+    max_concurrency: int = 32,
+) -> List[Any]:
+    """Run (query_text, current_working_dir) sessions concurrently; returns results or exceptions in order."""
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run_one(query_text: str, current_working_dir: str):
+        async with semaphore:
+            return await handle_pytest_query_async(
+                query_text=query_text,
+                current_working_dir=current_working_dir,
+                async_llm_client=async_llm_client,
+            )
+
+    return await asyncio.gather(
+        *(run_one(query_text, cwd) for query_text, cwd in queries),
+        return_exceptions=True,
+    )
@@ -0,0 +1,121 @@
+import asyncio
+import json
+import logging
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+LOGGER_NAME = __name__
+
+STATUS_FINISHED = "finished"
+# the model replied without a tool call; headless runs end there instead of blocking on stdin
+STATUS_WAITING_FOR_USER = "waiting_for_user"
+STATUS_STEP_BUDGET = "step_budget_exhausted"
+STATUS_TIMEOUT = "timeout"
+STATUS_ERROR = "error"
+
+
+class BatchTaskError(Exception):
+    pass
+
+
+@dataclass
+class BatchTask:
+    task_id: str
+    prompt: str
+    working_dir: str
+    timeout_seconds: Optional[float] = None
+    max_steps: Optional[int] = None
+
+
+@dataclass
+class BatchResult:
+    task_id: str
+    status: str
+    final_message: Optional[str] = None
+    # the model's last reply, e.g. the question it was waiting on
+    last_message: Optional[str] = None
+    error: Optional[str] = None
+    steps: int = 0
+    seconds: float = 0.0
+    metrics: Dict[str, Any] = field(default_factory=dict)
+
+
+def parse_task(line: str, line_number: int) -> BatchTask:
+    """One JSONL task: {"id", "prompt", "working_dir", "timeout_seconds", "max_steps"}; only prompt and working_dir are required."""
+    try:
+        raw = json.loads(line)
+    except json.JSONDecodeError as e:
+        raise BatchTaskError(f"Line {line_number}: not valid JSON: {e}")
+    if not isinstance(raw, dict):
+        raise BatchTaskError(f"Line {line_number}: a task must be a JSON object")
+    for required in ("prompt", "working_dir"):
+        if not isinstance(raw.get(required), str) or not raw[required]:
+            raise BatchTaskError(f"Line {line_number}: missing '{required}'")
+    return BatchTask(
+        task_id=str(raw.get("id", line_number)),
+        prompt=raw["prompt"],
+        working_dir=raw["working_dir"],
+        timeout_seconds=raw.get("timeout_seconds"),
+        max_steps=raw.get("max_steps"),
+    )
+
+
+def load_tasks(path: str) -> List[BatchTask]:
+    tasks = []
+    with open(path, encoding="utf-8") as handle:
+        for line_number, line in enumerate(handle, start=1):
+            if line.strip():
+                tasks.append(parse_task(line, line_number))
+    ids = [task.task_id for task in tasks]
+    duplicates = sorted({task_id for task_id in ids if ids.count(task_id) > 1})
+    if duplicates:
+        raise BatchTaskError(f"Duplicate task ids: {', '.join(duplicates)}")
+    return tasks
+
+
+async def run_batch(
+    tasks: List[BatchTask],
+    run_task: Callable[[BatchTask], Awaitable[BatchResult]],
+    output_path: str,
+    concurrency: int = 4,
+) -> List[BatchResult]:
+    """
+    Run tasks on at most `concurrency` concurrent sessions. Each result is
+    appended to `output_path` as soon as its task ends, so a killed batch
+    keeps what it finished. Returns the results in task order.
+    """
+    logger = logging.getLogger(LOGGER_NAME)
+    semaphore = asyncio.Semaphore(concurrency)
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    write_lock = asyncio.Lock()
+
+    with open(output_path, "a", encoding="utf-8") as output:
+
+        async def run_one(task: BatchTask) -> BatchResult:
+            async with semaphore:
+                started = time.monotonic()
+                try:
+                    result = await run_task(task)
+                except Exception as e:
+                    logger.exception("Task %s failed", task.task_id)
+                    result = BatchResult(
+                        task_id=task.task_id,
+                        status=STATUS_ERROR,
+                        error=f"{type(e).__name__}: {e}",
+                        seconds=time.monotonic() - started,
+                    )
+            logger.info("Task %s: %s after %.1fs", task.task_id, result.status, result.seconds)
+            async with write_lock:
+                output.write(json.dumps(asdict(result), default=str) + "\n")
+                output.flush()
+            return result
+
+        results = await asyncio.gather(*(run_one(task) for task in tasks))
+
+    counts: Dict[str, int] = {}
+    for result in results:
+        counts[result.status] = counts.get(result.status, 0) + 1
+    logger.info("Batch of %d tasks done: %s", len(tasks), counts)
+    return list(results)
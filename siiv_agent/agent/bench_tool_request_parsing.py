@@ -0,0 +1,42 @@
+"""
+Parse time of a [TOOL_REQUEST] block against payload size, strict json fast
+path vs the lenient demjson3 parser (when installed).
+
+    python -m agent.bench_tool_request_parsing
+"""
+import json
+import time
+
+from agent.tool_request_parser import demjson3, find_last_tool_request, parse_tool_request_to_llm_format
+
+PAYLOAD_SIZES = [256, 1024, 4096, 16384, 65536]
+REPEATS = 50
+
+
+def make_response(payload_chars: int) -> str:
+    diff = "\n".join(f"-old line {i}\n+new line {i}" for i in range(payload_chars // 30 + 1))[:payload_chars]
+    request = {"name": "replace_in_file", "arguments": {"file_path": "src/app.py", "diff": diff}}
+    return f"I'll apply the change.\n[TOOL_REQUEST]\n{json.dumps(request)}\n[END_TOOL_REQUEST]"
+
+
+def time_per_call(fn, arg) -> float:
+    started = time.perf_counter()
+    for _ in range(REPEATS):
+        fn(arg)
+    return (time.perf_counter() - started) / REPEATS
+
+
+def main():
+    print(f"{'payload':>10} {'strict ms':>10} {'demjson3 ms':>12} {'speedup':>8}")
+    for size in PAYLOAD_SIZES:
+        response = make_response(size)
+        strict = time_per_call(parse_tool_request_to_llm_format, response)
+        if demjson3 is None:
+            print(f"{size:>10} {strict * 1000:>10.3f} {'n/a':>12} {'':>8}")
+            continue
+        lenient = time_per_call(lambda text: demjson3.decode(find_last_tool_request(text)), response)
+        print(f"{size:>10} {strict * 1000:>10.3f} {lenient * 1000:>12.3f} {lenient / strict:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
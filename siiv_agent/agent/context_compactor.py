@@ -0,0 +1,143 @@
+import json
+import logging
+import re
+from typing import Any, Dict, List
+
+from agent.llm_clients.rate_limiter import estimate_tokens
+
+LOGGER_NAME = __name__
+
+DEFAULT_MAX_CONTEXT_TOKENS = 48000
+DEFAULT_KEEP_RECENT_TURNS = 4
+DEFAULT_ELIDED_HEAD_CHARS = 400
+# compact well below the limit so the history, and the cached prefix, stay unchanged for many turns
+DEFAULT_TARGET_RATIO = 0.6
+
+ELIDED_MARKER = "[... earlier tool output elided to save context"
+DROPPED_NOTE = "[{count} earlier turns were removed to save context. Re-run tools if you need their results.]"
+DROPPED_NOTE_PATTERN = re.compile(r"^\[(\d+) earlier turns were removed to save context\.")
+
+# the system prompt and the user's task
+PINNED_MESSAGES = 2
+
+
+def estimate_message_tokens(message: Dict[str, Any]) -> int:
+    content = message.get("content") or ""
+    if not isinstance(content, str):
+        # content parts, e.g. the task's text and image parts
+        content = json.dumps(content, default=str)
+    tokens = estimate_tokens(content)
+    if message.get("tool_calls"):
+        tokens += estimate_tokens(json.dumps(message["tool_calls"], default=str))
+    return tokens
+
+
+class ContextCompactor:
+    """
+    Keeps the conversation sent to the model under `max_tokens`.
+
+    Once over budget, tool outputs older than the last `keep_recent_turns`
+    assistant turns are cut down to their first `elided_head_chars`
+    characters. If that is not enough, whole old turns (an assistant message
+    with its tool results) are dropped, oldest first, until the history is
+    back under `target_ratio` of the budget. The system prompt, the
+    task and the recent turns are always kept verbatim, and a tool result is
+    never kept without the assistant message that requested it.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = DEFAULT_MAX_CONTEXT_TOKENS,
+        keep_recent_turns: int = DEFAULT_KEEP_RECENT_TURNS,
+        elided_head_chars: int = DEFAULT_ELIDED_HEAD_CHARS,
+        target_ratio: float = DEFAULT_TARGET_RATIO,
+    ):
+        self._max_tokens = max_tokens
+        self._keep_recent_turns = keep_recent_turns
+        self._elided_head_chars = elided_head_chars
+        self._target_tokens = int(max_tokens * target_ratio)
+        self._logger = logging.getLogger(LOGGER_NAME)
+
+    def token_counts(self, messages: List[Dict[str, Any]]) -> List[int]:
+        return [estimate_message_tokens(message) for message in messages]
+
+    def compact(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Return `messages` itself when under budget or when nothing could be cut, else a compacted copy."""
+        total = sum(self.token_counts(messages))
+        if total <= self._max_tokens:
+            return messages
+
+        pinned = messages[:PINNED_MESSAGES]
+        rest = messages[PINNED_MESSAGES:]
+        # the note left by an earlier compaction is not a turn; its count carries over
+        previously_dropped = _dropped_count(rest[0]) if rest else 0
+        if previously_dropped:
+            rest = rest[1:]
+        turns = _split_turns(rest)
+        stale_count = max(0, len(turns) - self._keep_recent_turns)
+
+        elided = 0
+        for turn in turns[:stale_count]:
+            for index, message in enumerate(turn):
+                if message.get("role") == "tool":
+                    turn[index] = self._elide(message)
+                    elided += turn[index] is not message
+
+        dropped = 0
+        while dropped < stale_count and self._total(pinned, turns[dropped:]) > self._target_tokens:
+            dropped += 1
+
+        if not elided and not dropped:
+            # already compacted as far as it goes; an unchanged history keeps the cached prefix
+            return messages
+
+        compacted = list(pinned)
+        if previously_dropped + dropped:
+            compacted.append({"role": "user", "content": DROPPED_NOTE.format(count=previously_dropped + dropped)})
+        for turn in turns[dropped:]:
+            compacted.extend(turn)
+
+        self._logger.info(
+            "Compacted context from ~%d to ~%d tokens (%d tool outputs elided, %d turns dropped)",
+            total,
+            sum(self.token_counts(compacted)),
+            elided,
+            dropped,
+        )
+        return compacted
+
+    def _total(self, pinned: List[Dict[str, Any]], turns: List[List[Dict[str, Any]]]) -> int:
+        return sum(self.token_counts(pinned)) + sum(
+            sum(self.token_counts(turn)) for turn in turns
+        )
+
+    def _elide(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        content = message.get("content") or ""
+        if len(content) <= self._elided_head_chars or ELIDED_MARKER in content:
+            return message
+        elided = dict(message)
+        elided["content"] = (
+            content[: self._elided_head_chars]
+            + f"\n{ELIDED_MARKER}: {len(content) - self._elided_head_chars} more characters; call the tool again if you need them]"
+        )
+        return elided
+
+
+def _dropped_count(message: Dict[str, Any]) -> int:
+    """Turns removed by an earlier compaction, if `message` is its note, else 0."""
+    content = message.get("content")
+    if message.get("role") != "user" or not isinstance(content, str):
+        return 0
+    match = DROPPED_NOTE_PATTERN.match(content)
+    return int(match.group(1)) if match else 0
+
+
+def _split_turns(messages: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Group messages so each turn starts at an assistant message and owns the tool results after it."""
+    turns: List[List[Dict[str, Any]]] = []
+    for message in messages:
+        if not turns or message.get("role") == "assistant":
+            turns.append([message])
+        else:
+            turns[-1].append(message)
+    return turns
@@ -1,61 +1,133 @@
 from argparse import ArgumentParser
 from pathlib import Path
-from typing import List
+from typing import Any, Optional, Tuple
 
 import chromadb
-import requests
-from chromadb.config import Settings
 from code_chunker import CodeChunk, extract_code_chunks
+from embedding import EMBEDDING_MODEL, get_lm_studio_embeddings
+from embedding_collections import (EMBEDDING_DIMENSION_KEY,
+                                   EMBEDDING_MODEL_KEY, bump_index_version,
+                                   check_collection_model,
+                                   get_or_create_model_collection,
+                                   read_active_collection,
+                                   write_active_collection)
+from ingestion_log import IngestionLog
 from tqdm import tqdm
 
-LM_STUDIO_ENDPOINT = "http://localhost:1234/v1/embeddings"  # Adjust port if needed
-CHUNK_TEXT = "This is a chunk of text to embed using LM Studio."
-EMBEDDING_MODEL = (
-    "text-embedding-nomic-embed-text-v1.5e04_k_m"  # Use model name you have loaded
-)
-EMBEDDING_MODEL2 = "text-embedding-nomic-embed-text-v1.5e0q.0"
-CHROMA_COLLECTION_NAME = "code_chunks"
+CHROMA_LOCAL_PATH = ".chroma_storage"
+EMBED_BATCH_SIZE = 32
 
 
-def embed_text(text: str) -> list[float]:
-    response = requests.post(
-        LM_STUDIO_ENDPOINT,
-        json={"model": EMBEDDING_MODEL, "input": [text], "encoding_format": "float"},
+def embed_text(text: str, model: str = EMBEDDING_MODEL) -> list[float]:
+    return get_lm_studio_embeddings([text], model=model)[0]
+
+
+def chunk_id(chunk: CodeChunk) -> str:
+    return f"{chunk.file_path}:{chunk.start_line}-{chunk.end_line}"
+
+
+def open_collection(chroma_path: str = CHROMA_LOCAL_PATH, model: str = EMBEDDING_MODEL):
+    chroma_client = chromadb.PersistentClient(path=chroma_path)
+    dimension = len(embed_text("dimension probe", model=model))
+    collection = get_or_create_model_collection(
+        chroma_client, model=model, dimension=dimension
     )
+    if read_active_collection(chroma_path) is None:
+        write_active_collection(
+            chroma_path,
+            collection_name=collection.name,
+            model=model,
+            dimension=dimension,
+        )
+    return collection
+
+
+def open_active_collection(chroma_path: str = CHROMA_LOCAL_PATH) -> Tuple[Any, str]:
+    """
+    Return (collection, model) for the collection serving queries, i.e. the
+    one a migration switched to, else the default model's collection.
+    """
+    active = read_active_collection(chroma_path)
+    if active is None:
+        return open_collection(chroma_path), EMBEDDING_MODEL
+    chroma_client = chromadb.PersistentClient(path=chroma_path)
+    collection = chroma_client.get_collection(name=active["collection"])
+    model = active[EMBEDDING_MODEL_KEY]
+    check_collection_model(collection, model=model, dimension=active[EMBEDDING_DIMENSION_KEY])
+    return collection, model
+
+
+def embed_file(
+    collection,
+    file: Path,
+    model: str = EMBEDDING_MODEL,
+    batch_size: int = EMBED_BATCH_SIZE,
+    chroma_path: str = CHROMA_LOCAL_PATH,
+    ingestion_log: Optional[IngestionLog] = None,
+) -> int:
+    """
+    (Re-)index one file: upsert its current chunks in embedding batches, then
+    drop chunks that no longer exist. A missing file just has its chunks removed.
 
-    response.raise_for_status()
-    return response.json()["data"][0]["embedding"]
+    With an `ingestion_log` the writes are only logged here and applied to the
+    collection in bulk by the log's flusher. Chunks are keyed by the resolved
+    path, so relative and absolute spellings of a file share its chunks.
+    """
+    file = Path(file).resolve()
+    chunks = list(extract_code_chunks(file)) if file.exists() else []
+
+    for start in range(0, len(chunks), batch_size):
+        batch = chunks[start : start + batch_size]
+        try:
+            embeddings = get_lm_studio_embeddings(
+                [chunk.code for chunk in batch], model=model
+            )
+            target = ingestion_log if ingestion_log is not None else collection
+            target.upsert(
+                documents=[chunk.code for chunk in batch],
+                embeddings=embeddings,
+                metadatas=[chunk.to_metadata_dict() for chunk in batch],
+                ids=[chunk_id(chunk) for chunk in batch],
+            )
+        except Exception as e:
+            print(
+                f"⚠️ Failed to process chunks {chunk_id(batch[0])} .. {chunk_id(batch[-1])}: {e}"
+            )
+            raise
+
+    current_ids = {chunk_id(chunk) for chunk in chunks}
+    if ingestion_log is not None:
+        # after the upserts, so the flusher never sees the file with no chunks at all
+        ingestion_log.delete_where_except({"file_path": str(file)}, sorted(current_ids))
+        return len(chunks)
+
+    existing_ids = collection.get(where={"file_path": str(file)}, include=[])["ids"]
+    stale_ids = [doc_id for doc_id in existing_ids if doc_id not in current_ids]
+    if stale_ids:
+        collection.delete(ids=stale_ids)
+
+    bump_index_version(chroma_path, collection.name)
+    return len(chunks)
 
 
 def process_repo(
     repo_path: Path,
+    model: str = EMBEDDING_MODEL,
 ):
-    chroma_client = chromadb.Client(Settings(persist_directory=str(chroma_path)))
-    chroma_client = chromadb.PersistentClient(path=".chroma_storage")
-    collection = chroma_client.get_or_create_collection(name=CHROMA_COLLECTION_NAME)
+    collection = open_collection(CHROMA_LOCAL_PATH, model=model)
+    ingestion_log = IngestionLog(
+        collection,
+        log_path=f"{CHROMA_LOCAL_PATH}/{collection.name}.ingest.log",
+        chroma_path=CHROMA_LOCAL_PATH,
+    )
+    ingestion_log.start()
 
     py_files = list(repo_path.rglob("*.py"))
-    for file in tqdm(py_files, desc="🗃 Processing files"):
-        for chunk in extract_code_chunks(file):
-            try:
-                embedding = embed_text(chunk.code)
-                metadata = chunk.to_metadata_dict()
-                # print(f"chunk: {chunk.code}")
-                # print(f"chunk.code: {chunk.code}")
-                # print(f"embedding: {embedding}")
-
-                collection.add(
-                    documents=[chunk.code],
-                    embeddings=[embedding],
-                    metadatas=[metadata],
-                    ids=[f"{chunk.file_path}:{chunk.start_line}-{chunk.end_line}"],
-                )
-            except Exception as e:
-                print(
-                    f"⚠️ Failed to process chunk in {chunk.file_path}:{chunk.start_line}-{chunk.end_line}: {e}"
-                )
-                print(chunk)
-                raise
+    try:
+        for file in tqdm(py_files, desc="🗃 Processing files"):
+            embed_file(collection, file, model=model, ingestion_log=ingestion_log)
+    finally:
+        ingestion_log.close()
 
     print("✅ All chunks embedded and stored.")
 
@@ -70,8 +142,14 @@ if __name__ == "__main__":
         required=True,
         help="Path to the root of the Python repository",
     )
+    parser.add_argument(
+        "--model",
+        default=EMBEDDING_MODEL,
+        help="Embedding model; vectors go to that model's own collection",
+    )
     args = parser.parse_args()
 
     process_repo(
         repo_path=args.repo,
+        model=args.model,
     )
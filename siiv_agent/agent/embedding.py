@@ -1,40 +1,51 @@
-from argparse import ArgumentParser
-from pathlib import Path
-from typing import List
+import logging
+from typing import List, Optional
 
-import chromadb
 import requests
-from chromadb.config import Settings
-from tqdm import tqdm
 
 LOGGER_NAME = __name__
 
 LM_STUDIO_ENDPOINT = "http://localhost:1234/v1/embeddings"
 
-# ensure lm-studio is running the same embedding model used to load
-# the vector store
+# The one place the embedding model is configured. Every collection records
+# the model and dimension it was built with (see embedding_collections.py),
+# so changing this value points the tools at a different collection instead
+# of silently mixing vectors from two models.
 EMBEDDING_MODEL = "text-embedding-nomic-embed-text-v1.5@e9.0"
 EMBEDDING_MODE = "lm-studio ignores this and just uses whatever is loaded"
 CHROMA_COLLECTION_NAME = "code_chunks"
 
 
 # get lf embedding from LM Studio
-def get_lm_studio_embedding(text: str) -> List[float]:
+def get_lm_studio_embedding(
+    text: str, model: str = EMBEDDING_MODEL
+) -> Optional[List[float]]:
     logger = logging.getLogger(LOGGER_NAME)
     logger.info("Calling lm-studio API to embed text: '%s'", text)
 
-    payload = {"model": EMBEDDING_MODEL, "input": [text], "encoding_format": "float"}
     try:
-        response = requests.post(LM_STUDIO_ENDPOINT, json=payload)
-        response.raise_for_status()
-        embedding = response.json()["data"][0]["embedding"]
+        embedding = get_lm_studio_embeddings([text], model=model)[0]
         logger.info("First 5 values: %s", embedding[:5])
-        return response.json()["data"][0]["embedding"]
+        return embedding
     except requests.RequestException as e:
         print(f"Error fetching embedding: {e}")
         return None
 
 
+def get_lm_studio_embeddings(
+    texts: List[str], model: str = EMBEDDING_MODEL
+) -> List[List[float]]:
+    """Embed a batch of texts in a single request, preserving input order."""
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.info("Calling lm-studio API to embed %d texts with %s", len(texts), model)
+
+    payload = {"model": model, "input": texts, "encoding_format": "float"}
+    response = requests.post(LM_STUDIO_ENDPOINT, json=payload)
+    response.raise_for_status()
+    data = sorted(response.json()["data"], key=lambda item: item.get("index", 0))
+    return [item["embedding"] for item in data]
+
+
 # Main execution
 if __name__ == "__main__":
     import sys
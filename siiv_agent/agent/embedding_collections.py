@@ -0,0 +1,173 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from embedding import CHROMA_COLLECTION_NAME, EMBEDDING_MODEL
+
+try:
+    import fcntl
+except ImportError:  # not unix; bumps are then only serialized within the process
+    fcntl = None
+
+LOGGER_NAME = __name__
+
+EMBEDDING_MODEL_KEY = "embedding_model"
+EMBEDDING_DIMENSION_KEY = "embedding_dimension"
+ACTIVE_COLLECTIONS_FILENAME = "active_collections.json"
+
+# chroma collection names: 3-63 chars of [a-zA-Z0-9._-], alphanumeric at both ends
+MAX_COLLECTION_NAME_LENGTH = 63
+
+# serializes index version bumps between threads; a file lock covers other processes
+_index_version_lock = threading.Lock()
+
+
+class EmbeddingModelMismatchError(Exception):
+    pass
+
+
+def collection_name_for_model(
+    model: str, base_name: str = CHROMA_COLLECTION_NAME
+) -> str:
+    """Return the collection name that holds vectors built with `model`."""
+    digest = hashlib.sha1(model.encode("utf-8")).hexdigest()[:8]
+    slug = re.sub(r"[^a-zA-Z0-9_-]+", "_", model).strip("_-")
+    room = MAX_COLLECTION_NAME_LENGTH - len(base_name) - len(digest) - 2
+    slug = slug[: max(room, 0)].strip("_-")
+    parts = [base_name, slug, digest] if slug else [base_name, digest]
+    return "-".join(parts)
+
+
+def check_collection_model(
+    collection: Any, model: str, dimension: Optional[int] = None
+) -> None:
+    """Refuse to use a collection built with a different model or dimension."""
+    metadata = collection.metadata or {}
+    recorded_model = metadata.get(EMBEDDING_MODEL_KEY)
+    recorded_dimension = metadata.get(EMBEDDING_DIMENSION_KEY)
+
+    if recorded_model is None:
+        raise EmbeddingModelMismatchError(
+            f"Collection '{collection.name}' does not record an embedding model; "
+            f"re-embed it with '{model}' before querying"
+        )
+    if recorded_model != model:
+        raise EmbeddingModelMismatchError(
+            f"Collection '{collection.name}' was built with '{recorded_model}', "
+            f"not '{model}'"
+        )
+    if dimension is not None and recorded_dimension != dimension:
+        raise EmbeddingModelMismatchError(
+            f"Collection '{collection.name}' holds {recorded_dimension}-d vectors, "
+            f"got a {dimension}-d vector"
+        )
+
+
+def get_or_create_model_collection(
+    chroma_client: Any,
+    model: str,
+    dimension: int,
+    base_name: str = CHROMA_COLLECTION_NAME,
+) -> Any:
+    """Open the collection for `model`, creating it with model metadata if needed."""
+    logger = logging.getLogger(LOGGER_NAME)
+    name = collection_name_for_model(model, base_name=base_name)
+    logger.info("Opening collection %s for model %s (%d-d)", name, model, dimension)
+    collection = chroma_client.get_or_create_collection(
+        name=name,
+        metadata={EMBEDDING_MODEL_KEY: model, EMBEDDING_DIMENSION_KEY: dimension},
+    )
+    check_collection_model(collection, model=model, dimension=dimension)
+    return collection
+
+
+def _active_collections_path(chroma_path: str) -> Path:
+    return Path(chroma_path) / ACTIVE_COLLECTIONS_FILENAME
+
+
+def read_active_collection(
+    chroma_path: str, base_name: str = CHROMA_COLLECTION_NAME
+) -> Optional[Dict[str, Any]]:
+    """Return the collection currently serving queries for `base_name`, if any."""
+    path = _active_collections_path(chroma_path)
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as handle:
+        return json.load(handle).get(base_name)
+
+
+def resolve_active_collection(
+    chroma_path: str, base_name: str = CHROMA_COLLECTION_NAME
+) -> Tuple[str, str]:
+    """Return (collection name, model): the migrated-to collection if any, else EMBEDDING_MODEL's."""
+    active = read_active_collection(chroma_path, base_name=base_name)
+    if active:
+        return active["collection"], active[EMBEDDING_MODEL_KEY]
+    return collection_name_for_model(EMBEDDING_MODEL, base_name=base_name), EMBEDDING_MODEL
+
+
+def write_active_collection(
+    chroma_path: str,
+    collection_name: str,
+    model: str,
+    dimension: int,
+    base_name: str = CHROMA_COLLECTION_NAME,
+) -> None:
+    """Atomically point `base_name` at a collection (write temp file, then rename)."""
+    logger = logging.getLogger(LOGGER_NAME)
+    path = _active_collections_path(chroma_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    active = {}
+    if path.exists():
+        with open(path, "r", encoding="utf-8") as handle:
+            active = json.load(handle)
+
+    active[base_name] = {
+        "collection": collection_name,
+        EMBEDDING_MODEL_KEY: model,
+        EMBEDDING_DIMENSION_KEY: dimension,
+    }
+
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as handle:
+        json.dump(active, handle, indent=2)
+    os.replace(tmp_path, path)
+    logger.info("Active collection for %s is now %s", base_name, collection_name)
+
+
+def _index_version_path(chroma_path: str, collection_name: str) -> Path:
+    return Path(chroma_path) / f"{collection_name}.version"
+
+
+def read_index_version(chroma_path: str, collection_name: str) -> int:
+    """Return the write counter for a collection (0 if it was never bumped)."""
+    try:
+        return int(_index_version_path(chroma_path, collection_name).read_text())
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def bump_index_version(chroma_path: str, collection_name: str) -> int:
+    """Record a write to a collection; query caches keyed on the old version go stale."""
+    path = _index_version_path(chroma_path, collection_name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with _index_version_lock, open(path.parent / f"{path.name}.lock", "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        version = read_index_version(chroma_path, collection_name) + 1
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f"{path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as handle:
+                handle.write(str(version))
+            os.replace(tmp_name, path)
+        except BaseException:
+            os.unlink(tmp_name)
+            raise
+    return version
@@ -0,0 +1,246 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, List, Optional
+
+from chromadb.errors import NotFoundError
+from embedding import CHROMA_COLLECTION_NAME, get_lm_studio_embeddings
+from embedding_collections import (EMBEDDING_DIMENSION_KEY,
+                                   get_or_create_model_collection,
+                                   resolve_active_collection,
+                                   write_active_collection)
+
+LOGGER_NAME = __name__
+
+
+def open_source_collection(
+    chroma_client: Any,
+    chroma_path: str,
+    name: Optional[str] = None,
+    base_name: str = CHROMA_COLLECTION_NAME,
+) -> Any:
+    """
+    The collection to migrate from: `name` if given, else the active one,
+    else the legacy unnamespaced `base_name` collection built before
+    collections recorded their model.
+    """
+    logger = logging.getLogger(LOGGER_NAME)
+    if name:
+        return chroma_client.get_collection(name=name)
+    current, _ = resolve_active_collection(chroma_path, base_name=base_name)
+    for candidate in (current, base_name):
+        try:
+            collection = chroma_client.get_collection(name=candidate)
+        except NotFoundError:
+            continue
+        logger.info("Migrating from collection %s", candidate)
+        return collection
+    raise NotFoundError(f"Neither {current} nor the legacy {base_name} collection exists")
+
+
+class EmbeddingMigration:
+    """
+    Re-embeds every document of a collection with a new model, in the background.
+
+    Documents are copied in pages into the new model's collection at no more
+    than `docs_per_second` (None: unthrottled), so the embedding server keeps
+    serving queries.
+    The old collection stays active until the copy is complete and a
+    catch-up pass has applied the adds, updates and deletes made to it
+    meanwhile; then the active-collection pointer is swapped in one rename and `on_switch`
+    callbacks (e.g. VectorClient.switch_collection) are invoked.
+    """
+
+    def __init__(
+        self,
+        chroma_client: Any,
+        source_collection: Any,
+        target_model: str,
+        chroma_path: str,
+        docs_per_second: Optional[float] = 20.0,
+        batch_size: int = 32,
+        base_name: str = CHROMA_COLLECTION_NAME,
+    ):
+        if docs_per_second is not None and docs_per_second <= 0:
+            raise ValueError(f"docs_per_second must be positive or None (unthrottled), got {docs_per_second}")
+        self._chroma_client = chroma_client
+        self._source = source_collection
+        self._target_model = target_model
+        self._chroma_path = chroma_path
+        self._docs_per_second = docs_per_second
+        self._batch_size = batch_size
+        self._base_name = base_name
+        self._on_switch: List[Callable[[Any, str], None]] = []
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._logger = logging.getLogger(LOGGER_NAME)
+
+        self.target_collection = None
+        self.migrated_count = 0
+        self.error: Optional[Exception] = None
+
+    def on_switch(self, callback: Callable[[Any, str], None]) -> None:
+        """Register a callback(collection, model) run after the switch."""
+        self._on_switch.append(callback)
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._run_safely, name="embedding-migration", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        if self._thread:
+            self._thread.join(timeout=timeout)
+
+    def _run_safely(self) -> None:
+        try:
+            self.run()
+        except Exception as e:
+            self._logger.error("Embedding migration failed: %s", e)
+            self.error = e
+
+    def run(self) -> None:
+        self._logger.info(
+            "Migrating %s to model %s", self._source.name, self._target_model
+        )
+        offset = 0
+        while not self._stop_event.is_set():
+            page = self._source.get(
+                limit=self._batch_size,
+                offset=offset,
+                include=["documents", "metadatas"],
+            )
+            if not page["ids"]:
+                break
+            self._copy(page["ids"], page["documents"], page["metadatas"])
+            offset += len(page["ids"])
+
+        if self._stop_event.is_set():
+            self._logger.info("Migration stopped after %d documents", self.migrated_count)
+            return
+
+        # carry over what was written to the source while the main pass was running
+        self._catch_up()
+        if self._stop_event.is_set():
+            return
+        self._switch()
+
+    def _copy(self, ids: List[str], documents: List[str], metadatas: List[dict]) -> None:
+        started = time.monotonic()
+        embeddings = get_lm_studio_embeddings(documents, model=self._target_model)
+
+        if self.target_collection is None:
+            self.target_collection = get_or_create_model_collection(
+                self._chroma_client,
+                model=self._target_model,
+                dimension=len(embeddings[0]),
+                base_name=self._base_name,
+            )
+
+        self.target_collection.upsert(
+            ids=ids,
+            documents=documents,
+            embeddings=embeddings,
+            metadatas=metadatas,
+        )
+        self.migrated_count += len(ids)
+        self._logger.info("Migrated %d documents", self.migrated_count)
+
+        # throttle: never exceed docs_per_second averaged over each batch
+        if self._docs_per_second is None:
+            return
+        min_duration = len(ids) / self._docs_per_second
+        remaining = min_duration - (time.monotonic() - started)
+        if remaining > 0:
+            self._stop_event.wait(remaining)
+
+    def _catch_up(self) -> None:
+        """Copy documents added or changed in the source since they were read; drop deleted ones."""
+        if self.target_collection is None:
+            return
+        source_ids = set(self._source.get(include=[])["ids"])
+        target_ids = set(self.target_collection.get(include=[])["ids"])
+
+        deleted = sorted(target_ids - source_ids)
+        if deleted:
+            self.target_collection.delete(ids=deleted)
+
+        stale = sorted(source_ids - target_ids)
+        shared = sorted(source_ids & target_ids)
+        for start in range(0, len(shared), self._batch_size):
+            ids = shared[start : start + self._batch_size]
+            include = ["documents", "metadatas"]
+            source = _by_id(self._source.get(ids=ids, include=include))
+            target = _by_id(self.target_collection.get(ids=ids, include=include))
+            stale.extend(doc_id for doc_id in ids if source[doc_id] != target[doc_id])
+        self._logger.info("Catch-up pass: %d deleted, %d new or changed documents", len(deleted), len(stale))
+
+        for start in range(0, len(stale), self._batch_size):
+            if self._stop_event.is_set():
+                return
+            page = self._source.get(
+                ids=stale[start : start + self._batch_size],
+                include=["documents", "metadatas"],
+            )
+            self._copy(page["ids"], page["documents"], page["metadatas"])
+
+    def _switch(self) -> None:
+        if self.target_collection is None:
+            self._logger.info("Source collection is empty; nothing to switch")
+            return
+        dimension = self.target_collection.metadata[EMBEDDING_DIMENSION_KEY]
+        write_active_collection(
+            self._chroma_path,
+            collection_name=self.target_collection.name,
+            model=self._target_model,
+            dimension=dimension,
+            base_name=self._base_name,
+        )
+        for callback in self._on_switch:
+            callback(self.target_collection, self._target_model)
+
+
+def _by_id(page: dict) -> dict:
+    return {
+        doc_id: (document, metadata)
+        for doc_id, document, metadata in zip(page["ids"], page["documents"], page["metadatas"])
+    }
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    import chromadb
+    import my_logging
+    from retrieval import CHROMA_LOCAL_PATH
+
+    my_logging.init_logging()
+
+    parser = ArgumentParser(
+        description="Re-embed the active collection with a new embedding model"
+    )
+    parser.add_argument("--model", required=True, help="Target embedding model")
+    parser.add_argument("--chroma-path", default=CHROMA_LOCAL_PATH)
+    parser.add_argument(
+        "--source",
+        help=f"Collection to migrate from (default: the active one, else the legacy '{CHROMA_COLLECTION_NAME}')",
+    )
+    parser.add_argument("--docs-per-second", type=float, default=20.0)
+    args = parser.parse_args()
+
+    client = chromadb.PersistentClient(args.chroma_path)
+    migration = EmbeddingMigration(
+        chroma_client=client,
+        source_collection=open_source_collection(client, args.chroma_path, name=args.source),
+        target_model=args.model,
+        chroma_path=args.chroma_path,
+        docs_per_second=args.docs_per_second,
+    )
+    migration.start()
+    migration.join()
+    if migration.error:
+        raise migration.error
@@ -0,0 +1,207 @@
+import contextlib
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Set, Tuple
+
+from embed_pipeline import (CHROMA_LOCAL_PATH, embed_file,
+                            open_active_collection, open_collection)
+from embedding import EMBEDDING_MODEL
+
+try:
+    from inotify_simple import INotify
+    from inotify_simple import flags as inotify_flags
+except (ImportError, OSError):  # not linux, or inotify_simple not installed
+    INotify = None
+
+LOGGER_NAME = __name__
+
+IGNORED_DIRS = {".git", "__pycache__", "venv", ".venv", ".chroma_storage", ".mypy_cache"}
+
+
+def _is_ignored(path: Path) -> bool:
+    return any(part in IGNORED_DIRS for part in path.parts)
+
+
+class IndexWatcher:
+    """
+    Keeps the vector index in step with edits to a repo.
+
+    Changed .py files are collected, and once no new change has arrived for
+    `debounce_seconds` only those files are re-chunked and upserted through
+    embed_pipeline.embed_file. Uses inotify when available, otherwise an
+    mtime scan every `poll_interval` seconds.
+
+    Without an explicit `collection` the writes go to the active collection,
+    re-read before every flush so a finished migration is followed.
+    """
+
+    def __init__(
+        self,
+        repo_path: Path,
+        collection=None,
+        model: Optional[str] = None,
+        chroma_path: str = CHROMA_LOCAL_PATH,
+        debounce_seconds: float = 1.0,
+        poll_interval: float = 1.0,
+        use_inotify: bool = True,
+    ):
+        self._repo_path = Path(repo_path).resolve()
+        self._collection = collection
+        self._model = model
+        self._chroma_path = chroma_path
+        self._debounce_seconds = debounce_seconds
+        self._poll_interval = poll_interval
+        self._use_inotify = use_inotify and INotify is not None
+        self._stop_event = threading.Event()
+        self._pending: Set[Path] = set()
+        self._last_change = 0.0
+        self._logger = logging.getLogger(LOGGER_NAME)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def run_forever(self) -> None:
+        if self._use_inotify:
+            self._logger.info("Watching %s with inotify", self._repo_path)
+            self._watch_inotify()
+        else:
+            self._logger.info(
+                "Watching %s by polling every %.1fs", self._repo_path, self._poll_interval
+            )
+            self._watch_polling()
+
+    def _mark_changed(self, path: Path) -> None:
+        if path.suffix != ".py" or _is_ignored(path):
+            return
+        self._pending.add(path)
+        self._last_change = time.monotonic()
+
+    def _target(self) -> Tuple[Any, str]:
+        if self._collection is not None:
+            return self._collection, self._model or EMBEDDING_MODEL
+        return open_active_collection(self._chroma_path)
+
+    def _flush_if_quiet(self) -> None:
+        if not self._pending:
+            return
+        if time.monotonic() - self._last_change < self._debounce_seconds:
+            return
+
+        paths, self._pending = sorted(self._pending), set()
+        try:
+            collection, model = self._target()
+        except Exception as e:
+            self._logger.error("Cannot open the index collection: %s", e)
+            self._pending.update(paths)
+            self._last_change = time.monotonic()
+            return
+        for path in paths:
+            try:
+                count = embed_file(
+                    collection,
+                    path,
+                    model=model,
+                    chroma_path=self._chroma_path,
+                )
+                self._logger.info("Re-indexed %s (%d chunks)", path, count)
+            except Exception as e:
+                # keep watching; the next edit to the file will retry it
+                self._logger.error("Failed to re-index %s: %s", path, e)
+
+    def _watch_polling(self) -> None:
+        mtimes = self._scan_mtimes()
+        while not self._stop_event.wait(self._poll_interval):
+            current = self._scan_mtimes()
+            for path in current.keys() | mtimes.keys():
+                if current.get(path) != mtimes.get(path):
+                    self._mark_changed(path)
+            mtimes = current
+            self._flush_if_quiet()
+
+    def _scan_mtimes(self) -> Dict[Path, float]:
+        mtimes = {}
+        for path in self._repo_path.rglob("*.py"):
+            if _is_ignored(path):
+                continue
+            with contextlib.suppress(FileNotFoundError):
+                mtimes[path] = path.stat().st_mtime
+        return mtimes
+
+    def _add_watch(
+        self, inotify, mask: int, watch_dirs: Dict[int, Path], directory: Path, scan: bool = False
+    ) -> None:
+        """Watch `directory` and its subdirectories; with `scan`, index the files already in them."""
+        if _is_ignored(directory):
+            return
+        try:
+            watch_dirs[inotify.add_watch(str(directory), mask)] = directory
+            children = list(directory.iterdir())
+        except FileNotFoundError:
+            # removed before we got to it, e.g. a short-lived tmp or build directory
+            self._logger.info("%s disappeared before it could be watched", directory)
+            return
+        # files created in a new directory before its watch existed sent no event
+        for child in children:
+            if child.is_dir():
+                self._add_watch(inotify, mask, watch_dirs, child, scan=scan)
+            elif scan:
+                self._mark_changed(child)
+
+    def _watch_inotify(self) -> None:
+        inotify = INotify()
+        mask = (
+            inotify_flags.CLOSE_WRITE
+            | inotify_flags.CREATE
+            | inotify_flags.DELETE
+            | inotify_flags.MOVED_FROM
+            | inotify_flags.MOVED_TO
+        )
+        watch_dirs: Dict[int, Path] = {}
+        self._add_watch(inotify, mask, watch_dirs, self._repo_path)
+        try:
+            while not self._stop_event.is_set():
+                timeout_ms = int(min(self._debounce_seconds, 0.5) * 1000)
+                for event in inotify.read(timeout=timeout_ms):
+                    directory = watch_dirs.get(event.wd)
+                    if directory is None or not event.name:
+                        continue
+                    path = directory / event.name
+                    if event.mask & inotify_flags.ISDIR:
+                        if event.mask & (inotify_flags.CREATE | inotify_flags.MOVED_TO):
+                            self._add_watch(inotify, mask, watch_dirs, path, scan=True)
+                        continue
+                    self._mark_changed(path)
+                self._flush_if_quiet()
+        finally:
+            inotify.close()
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    import my_logging
+
+    my_logging.init_logging()
+
+    parser = ArgumentParser(description="Keep the code index up to date as files change")
+    parser.add_argument("--repo", type=Path, required=True)
+    parser.add_argument(
+        "--model", help="Write to this model's collection instead of the active one"
+    )
+    parser.add_argument("--debounce", type=float, default=1.0)
+    parser.add_argument("--poll", action="store_true", help="Force mtime polling")
+    args = parser.parse_args()
+
+    watcher = IndexWatcher(
+        repo_path=args.repo,
+        collection=open_collection(CHROMA_LOCAL_PATH, model=args.model) if args.model else None,
+        model=args.model,
+        debounce_seconds=args.debounce,
+        use_inotify=not args.poll,
+    )
+    try:
+        watcher.run_forever()
+    except KeyboardInterrupt:
+        watcher.stop()
@@ -0,0 +1,263 @@
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from embedding_collections import bump_index_version
+
+LOGGER_NAME = __name__
+
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+
+class IngestionLog:
+    """
+    Append-only write-ahead log in front of a chroma collection.
+
+    add/update/upsert/delete only append a JSON line to the log and return; a
+    background thread applies pending operations to the collection in bulk
+    (one delete, and one upsert per document shape, per batch; last operation
+    per id wins) every `flush_interval` seconds or once `batch_size`
+    operations are waiting.
+    The sequence number of the last applied operation is checkpointed, and
+    anything after it is replayed on start() after a crash.
+    """
+
+    def __init__(
+        self,
+        collection: Any,
+        log_path: str,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        chroma_path: Optional[str] = None,
+        fsync: bool = False,
+    ):
+        self._collection = collection
+        self._log_path = Path(log_path)
+        self._checkpoint_path = Path(f"{log_path}.checkpoint")
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._chroma_path = chroma_path
+        self._fsync = fsync
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pending: List[Dict[str, Any]] = []
+        self._seq = 0
+        self._handle = None
+        self._logger = logging.getLogger(LOGGER_NAME)
+
+    def start(self) -> None:
+        """Replay unapplied operations from a previous run, then start the flusher."""
+        self._log_path.parent.mkdir(parents=True, exist_ok=True)
+        applied_seq = self._read_checkpoint()
+        self._seq = applied_seq
+        for entry in self._read_log():
+            self._seq = max(self._seq, entry["seq"])
+            if entry["seq"] > applied_seq:
+                self._pending.append(entry)
+        if self._pending:
+            self._logger.info("Replaying %d logged operations", len(self._pending))
+
+        # kept open for the appends of the whole run; close() releases it
+        self._handle = open(self._log_path, "a", encoding="utf-8")  # noqa: SIM115
+        self._thread = threading.Thread(
+            target=self._run, name="ingestion-log-flusher", daemon=True
+        )
+        self._thread.start()
+
+    def close(self) -> None:
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread:
+            self._thread.join()
+        self.flush()
+        if self._handle:
+            self._handle.close()
+            self._handle = None
+
+    def add(
+        self,
+        ids: List[str],
+        documents: List[str],
+        embeddings: Optional[List[List[float]]] = None,
+        metadatas: Optional[List[dict]] = None,
+    ) -> None:
+        """Logged as an upsert: an existing id is overwritten, not refused."""
+        self._append("upsert", ids, documents, embeddings, metadatas)
+
+    def update(
+        self,
+        ids: List[str],
+        documents: List[str],
+        embeddings: Optional[List[List[float]]] = None,
+        metadatas: Optional[List[dict]] = None,
+    ) -> None:
+        self._append("upsert", ids, documents, embeddings, metadatas)
+
+    def upsert(
+        self,
+        ids: List[str],
+        documents: List[str],
+        embeddings: Optional[List[List[float]]] = None,
+        metadatas: Optional[List[dict]] = None,
+    ) -> None:
+        self._append("upsert", ids, documents, embeddings, metadatas)
+
+    def delete(self, ids: List[str]) -> None:
+        self._append("delete", ids, None, None, None)
+
+    def delete_where(self, where: Dict[str, Any]) -> None:
+        """Delete every document whose metadata equals all key/values in `where`."""
+        self._append("delete_where", [], None, None, None, where=where)
+
+    def delete_where_except(self, where: Dict[str, Any], keep_ids: List[str]) -> None:
+        """
+        Delete the documents matching `where` other than `keep_ids`, once
+        everything logged before this call is applied. Logged after a file's
+        upserts, it removes stale chunks without the file ever vanishing from
+        the index in between.
+        """
+        self._append("delete_stale", keep_ids, None, None, None, where=where)
+
+    def _append(self, op, ids, documents, embeddings, metadatas, where=None) -> None:
+        with self._lock:
+            self._seq += 1
+            entry = {
+                "seq": self._seq,
+                "op": op,
+                "ids": ids,
+                "documents": documents,
+                "embeddings": embeddings,
+                "metadatas": metadatas,
+                "where": where,
+            }
+            self._handle.write(json.dumps(entry) + "\n")
+            self._handle.flush()
+            if self._fsync:
+                os.fsync(self._handle.fileno())
+            self._pending.append(entry)
+            if len(self._pending) >= self._batch_size:
+                self._wake_event.set()
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            self._wake_event.wait(self._flush_interval)
+            self._wake_event.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                # operations stay pending and are retried on the next tick
+                self._logger.error("Failed to flush ingestion log: %s", e)
+
+    def flush(self) -> int:
+        """Apply every pending operation now; returns how many were applied."""
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._pending)
+            if not batch:
+                return 0
+
+            self._apply(batch)
+
+            with self._lock:
+                del self._pending[: len(batch)]
+                self._write_checkpoint(batch[-1]["seq"])
+                if not self._pending and self._handle:
+                    # everything is applied; start the log over
+                    self._handle.truncate(0)
+                    self._handle.seek(0)
+
+            if self._chroma_path:
+                bump_index_version(self._chroma_path, self._collection.name)
+            self._logger.info("Applied %d logged operations", len(batch))
+            return len(batch)
+
+    def _apply(self, batch: List[Dict[str, Any]]) -> None:
+        # last operation per id wins; dict keeps first-seen order
+        latest: Dict[str, tuple] = {}
+        delete_wheres = []
+        # where (as json) -> (where, ids to keep); the last one logged per where wins
+        delete_stales: Dict[str, tuple] = {}
+        for entry in batch:
+            if entry["op"] == "delete_where":
+                # run before this batch's upserts, so drop the upserts it would have deleted
+                delete_wheres.append(entry["where"])
+                for doc_id, (e, i) in list(latest.items()):
+                    if e["op"] == "upsert" and _matches(e["metadatas"], i, entry["where"]):
+                        del latest[doc_id]
+                continue
+            if entry["op"] == "delete_stale":
+                key = json.dumps(entry["where"], sort_keys=True)
+                delete_stales[key] = (entry["where"], set(entry["ids"]))
+                continue
+            for index, doc_id in enumerate(entry["ids"]):
+                latest.pop(doc_id, None)
+                latest[doc_id] = (entry, index)
+                if entry["op"] == "upsert":
+                    # upserted after a delete_stale, so newer than what it meant to delete
+                    for _, keep_ids in delete_stales.values():
+                        keep_ids.add(doc_id)
+
+        for where in delete_wheres:
+            self._collection.delete(where=where)
+
+        upserts = [(doc_id, e, i) for doc_id, (e, i) in latest.items() if e["op"] == "upsert"]
+        deletes = [doc_id for doc_id, (e, _) in latest.items() if e["op"] == "delete"]
+
+        if deletes:
+            self._collection.delete(ids=deletes)
+        # one upsert per shape, so entries without embeddings/metadata do not blank out the others
+        shapes: Dict[tuple, list] = {}
+        for doc_id, e, i in upserts:
+            shapes.setdefault((bool(e["embeddings"]), bool(e["metadatas"])), []).append((doc_id, e, i))
+        for (has_embeddings, has_metadatas), group in shapes.items():
+            self._collection.upsert(
+                ids=[doc_id for doc_id, _, _ in group],
+                documents=[e["documents"][i] for _, e, i in group],
+                embeddings=[e["embeddings"][i] for _, e, i in group] if has_embeddings else None,
+                metadatas=[e["metadatas"][i] for _, e, i in group] if has_metadatas else None,
+            )
+
+        for where, keep_ids in delete_stales.values():
+            existing = self._collection.get(where=where, include=[])["ids"]
+            stale = [doc_id for doc_id in existing if doc_id not in keep_ids]
+            if stale:
+                self._collection.delete(ids=stale)
+
+    def _read_checkpoint(self) -> int:
+        try:
+            return int(self._checkpoint_path.read_text())
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _write_checkpoint(self, seq: int) -> None:
+        tmp_path = self._checkpoint_path.with_suffix(".tmp")
+        tmp_path.write_text(str(seq))
+        os.replace(tmp_path, self._checkpoint_path)
+
+    def _read_log(self) -> List[Dict[str, Any]]:
+        if not self._log_path.exists():
+            return []
+        entries = []
+        with open(self._log_path, "r", encoding="utf-8") as handle:
+            for line in handle:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # torn final line from a crash mid-write
+                    self._logger.warning("Skipping unreadable ingestion log line")
+        return entries
+
+
+def _matches(metadatas: Optional[List[dict]], index: int, where: Dict[str, Any]) -> bool:
+    if not metadatas:
+        return False
+    metadata = metadatas[index]
+    return all(metadata.get(key) == value for key, value in where.items())
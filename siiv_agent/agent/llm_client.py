@@ -1,11 +1,12 @@
-import json
 import logging
+import time
 from dataclasses import dataclass
-from datetime import datetime
 from typing import Any, List, Optional
 
 import requests
 
+from agent.llm_clients.trace_writer import trace_llm_call
+
 # from agent.tools.tool_manager import ToolManager
 
 
@@ -53,14 +54,8 @@ class LLMClient:
             "tool_choice": "auto",
         }
 
-        now = datetime.now()
-        timestamp = now.strftime("%Y%m%d_%H%M%S") + f"_{now.microsecond // 1000:03d}"
-
-        with open(f"_llm_request_{timestamp}.log", "w", encoding="utf-8") as handle:
-            as_string = json.dumps(payload, indent=2)
-            handle.write(as_string)
-
         # del payload['max_tokens']
+        started = time.monotonic()
         response = requests.post(self._url, headers=headers, json=payload)
 
         if response.status_code != 200:
@@ -70,10 +65,15 @@ class LLMClient:
             raise Exception(f"LLM call failed: {response.status_code} {response.text}")
 
         data = response.json()
-
-        with open(f"_llm_response_{timestamp}.log", "w", encoding="utf-8") as handle:
-            as_string = json.dumps(data, indent=2)
-            handle.write(as_string)
+        trace_llm_call(
+            client="lm-studio",
+            model=self._model,
+            messages=messages,
+            tool_schema=payload["tools"],
+            response=data,
+            latency_seconds=time.monotonic() - started,
+            usage=data.get("usage"),
+        )
 
         try:
             content = data["choices"][0]["message"].get("content")
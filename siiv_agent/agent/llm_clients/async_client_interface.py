@@ -0,0 +1,16 @@
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Optional
+
+class AsyncLLMClientInterface(ABC):
+    """asyncio counterpart of LLMClientInterface, so one process can drive many sessions."""
+
+    @abstractmethod
+    async def call_chat(self, messages: list, tool_schema: dict, temperature: float = 0.8, max_tokens: int = 8192):
+        pass
+
+    @abstractmethod
+    async def call_chat_stream(self, messages: list, tool_schema: dict, on_content: Optional[Callable[[str], None]] = None, on_tool_call: Optional[Callable[[Dict[str, Any]], None]] = None, temperature: float = 0.8, max_tokens: int = 8192):
+        pass
+
+    async def aclose(self):
+        pass
@@ -0,0 +1,57 @@
+import logging
+from typing import List
+import httpx
+from agent.llm_clients.async_client_interface import AsyncLLMClientInterface
+from agent.llm_clients.http_session import DEFAULT_CONNECT_TIMEOUT, DEFAULT_POOL_SIZE, DEFAULT_READ_TIMEOUT
+from agent.llm_clients.llm_client import LM_API_KEY, LM_MODEL, LM_STUDIO_URL, ChatAndToolResponse, build_chat_payload, build_headers, usage_with_cache_hits
+from agent.llm_clients.retry import LLMCallError, LLMResponseError
+from agent.llm_clients.streaming import SSE_DONE, StreamAccumulator, decode_sse_line
+
+LOGGER_NAME = __name__
+
+class AsyncLLMClient(AsyncLLMClientInterface):
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE, connect_timeout: float = DEFAULT_CONNECT_TIMEOUT, read_timeout: float = DEFAULT_READ_TIMEOUT):
+        self._model = LM_MODEL
+        self._url = LM_STUDIO_URL
+        self._api_key = LM_API_KEY
+        self._logger = logging.getLogger(LOGGER_NAME)
+        # every session driven by this client shares one keep-alive pool
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    async def call_chat(self, messages: List[dict], tool_schema=dict, temperature=0.8, max_tokens=8192):
+        payload = build_chat_payload(self._model, messages, temperature, max_tokens)
+        response = await self._client.post(self._url, headers=build_headers(self._api_key), json=payload)
+        if response.status_code != 200:
+            self._logger.error("LLM call failed: %s %s", response.status_code, response.text)
+            raise LLMCallError(response.status_code, response.text)
+
+        data = response.json()
+        try:
+            message = data["choices"][0]["message"]
+        except (KeyError, IndexError, TypeError) as e:
+            raise LLMResponseError(f"Unexpected chat completion body: {data}") from e
+        return ChatAndToolResponse(content=message.get("content"), tool_calls=message.get("tool_calls"), usage=usage_with_cache_hits(data), model=self._model)
+
+    async def call_chat_stream(self, messages: List[dict], tool_schema=dict, on_content=None, on_tool_call=None, temperature=0.8, max_tokens=8192):
+        payload = build_chat_payload(self._model, messages, temperature, max_tokens, stream=True)
+        accumulator = StreamAccumulator(on_content=on_content, on_tool_call=on_tool_call)
+        async with self._client.stream("POST", self._url, headers=build_headers(self._api_key), json=payload) as response:
+            if response.status_code != 200:
+                body = await response.aread()
+                self._logger.error("LLM call failed: %s %s", response.status_code, body)
+                raise LLMCallError(response.status_code, body.decode("utf-8", "replace"))
+            async for line in response.aiter_lines():
+                chunk = decode_sse_line(line)
+                if chunk is SSE_DONE:
+                    break
+                if chunk is not None:
+                    accumulator.add_chunk(chunk)
+
+        content, tool_calls, metrics = accumulator.finish()
+        return ChatAndToolResponse(content=content, tool_calls=tool_calls, metrics=metrics, usage=accumulator.usage, model=self._model)
+
+    async def aclose(self):
+        await self._client.aclose()
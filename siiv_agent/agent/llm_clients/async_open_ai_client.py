@@ -0,0 +1,59 @@
+import logging
+import os
+from typing import List
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletionMessageToolCall
+from agent.llm_clients.async_client_interface import AsyncLLMClientInterface
+from agent.llm_clients.chat_response import create_completion_async
+from agent.llm_clients.llm_client import ChatAndToolResponse
+from agent.llm_clients.rate_limiter import get_shared_rate_limiter
+from agent.llm_clients.streaming import StreamAccumulator
+
+LOGGER_NAME = __name__
+
+class AsyncOpenAiClient(AsyncLLMClientInterface):
+    def __init__(self, model: str = "gpt-4o-mini"):
+        load_dotenv()
+        api_key = os.getenv("OPENAI_API_KEY")
+        # retries and backoff are left to AsyncRetryingLLMClient
+        self._client = AsyncOpenAI(api_key=api_key, max_retries=0)
+        self._logger = logging.getLogger(LOGGER_NAME)
+        self._model = model
+        self._max_tokens = 8192
+        self._temperature = 0.8
+        # same limiter as the sync OpenAiClient for this model
+        self._rate_limiter = get_shared_rate_limiter(f"openai:{self._model}")
+
+    async def call_chat(self, messages: List[dict], tool_schema=List[dict]):
+        kwargs = {"model": self._model, "messages": messages, "temperature": self._temperature}
+        if tool_schema:
+            kwargs["tools"] = tool_schema
+            kwargs["tool_choice"] = "auto"
+
+        response = await self._create_completion(**kwargs)
+        choice = response.choices[0]
+        return ChatAndToolResponse(content=choice.message.content, tool_calls=choice.message.tool_calls, usage=response.usage.model_dump() if response.usage else None, model=self._model)
+
+    async def call_chat_stream(self, messages: List[dict], tool_schema=List[dict], on_content=None, on_tool_call=None):
+        kwargs = {"model": self._model, "messages": messages, "temperature": self._temperature, "stream": True, "stream_options": {"include_usage": True}}
+        if tool_schema:
+            kwargs["tools"] = tool_schema
+            kwargs["tool_choice"] = "auto"
+
+        accumulator = StreamAccumulator(on_content=on_content, on_tool_call=on_tool_call)
+        async for chunk in await self._create_completion(**kwargs):
+            accumulator.add_chunk(chunk.model_dump())
+        content, tool_calls, metrics = accumulator.finish()
+
+        if tool_calls:
+            tool_calls = [ChatCompletionMessageToolCall.model_validate(t) for t in tool_calls]
+        return ChatAndToolResponse(content=content, tool_calls=tool_calls, metrics=metrics, usage=accumulator.usage, model=self._model)
+
+    async def _create_completion(self, **kwargs):
+        return await create_completion_async(
+            self._rate_limiter, self._client.chat.completions.with_raw_response.create, **kwargs
+        )
+
+    async def aclose(self):
+        await self._client.close()
@@ -0,0 +1,67 @@
+import json
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from agent.llm_clients.rate_limiter import RateLimiter, estimate_tokens
+from agent.llm_clients.streaming import StreamMetrics
+
+
+@dataclass
+class ChatAndToolResponse:
+    content: Optional[str]
+    tool_calls: List[Any]
+    metrics: Optional[StreamMetrics] = None
+    # provider usage block (prompt/completion tokens etc.), when the provider sent one
+    usage: Optional[Dict[str, Any]] = None
+    model: Optional[str] = None
+
+
+def create_completion(rate_limiter: RateLimiter, create: Callable[..., Any], **kwargs) -> Any:
+    """
+    Call `create` (an OpenAI-style chat.completions.with_raw_response.create),
+    waiting only if a known rate limit requires it, and teach `rate_limiter`
+    from the response headers and usage. Returns the parsed response, or the
+    chunk stream when kwargs ask for one.
+    """
+    estimated_tokens = _estimate_request_tokens(kwargs)
+    rate_limiter.acquire(tokens=estimated_tokens)
+    try:
+        raw_response = create(**kwargs)
+    except Exception as e:
+        _learn_from_rate_limit_error(rate_limiter, e)
+        raise
+    return _parse_completion(rate_limiter, raw_response, estimated_tokens, kwargs.get("stream", False))
+
+
+async def create_completion_async(rate_limiter: RateLimiter, create: Callable[..., Awaitable[Any]], **kwargs) -> Any:
+    """create_completion() for an async `create`; waits without blocking the event loop."""
+    estimated_tokens = _estimate_request_tokens(kwargs)
+    await rate_limiter.acquire_async(tokens=estimated_tokens)
+    try:
+        raw_response = await create(**kwargs)
+    except Exception as e:
+        _learn_from_rate_limit_error(rate_limiter, e)
+        raise
+    return _parse_completion(rate_limiter, raw_response, estimated_tokens, kwargs.get("stream", False))
+
+
+def _estimate_request_tokens(kwargs: Dict[str, Any]) -> int:
+    return estimate_tokens(json.dumps(kwargs["messages"], default=str))
+
+
+def _learn_from_rate_limit_error(rate_limiter: RateLimiter, error: Exception) -> None:
+    # a 429 carries the limits and the retry-after hint in its headers
+    response = getattr(error, "response", None)
+    if getattr(error, "status_code", None) == 429 and response is not None:
+        rate_limiter.update_from_headers(response.headers)
+
+
+def _parse_completion(rate_limiter: RateLimiter, raw_response: Any, estimated_tokens: int, stream: bool) -> Any:
+    rate_limiter.update_from_headers(raw_response.headers)
+    response = raw_response.parse()
+    if stream:
+        # usage arrives in the last chunk; the estimate stands
+        return response
+    actual_tokens = response.usage.total_tokens if response.usage else None
+    rate_limiter.record_usage(estimated_tokens, actual_tokens)
+    return response
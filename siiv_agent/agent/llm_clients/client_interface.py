@@ -1,6 +1,12 @@
 from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Optional
 
 class LLMClientInterface(ABC):
     @abstractmethod
     def call_chat(self, messages: list, tool_schema: dict, temperature: float = 0.8, max_tokens: int = 8192):
         pass
+
+    @abstractmethod
+    def call_chat_stream(self, messages: list, tool_schema: dict, on_content: Optional[Callable[[str], None]] = None, on_tool_call: Optional[Callable[[Dict[str, Any]], None]] = None, temperature: float = 0.8, max_tokens: int = 8192):
+        """Like call_chat, but streams the completion; the response carries StreamMetrics."""
+        pass
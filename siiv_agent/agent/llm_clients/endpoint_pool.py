@@ -0,0 +1,176 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Optional, Sequence
+
+LOGGER_NAME = __name__
+
+STRATEGY_LEAST_OUTSTANDING = "least_outstanding"
+STRATEGY_LATENCY = "latency"
+STRATEGIES = (STRATEGY_LEAST_OUTSTANDING, STRATEGY_LATENCY)
+
+DEFAULT_UNHEALTHY_SECONDS = 30.0
+DEFAULT_HEALTH_CHECK_INTERVAL = 15.0
+MAX_STICKY_SESSIONS = 10000
+# weight of the newest sample in the latency moving average
+LATENCY_EWMA_ALPHA = 0.3
+
+
+@dataclass
+class Endpoint:
+    url: str
+    model: str
+    api_key: Optional[str] = None
+    outstanding: int = 0
+    ewma_latency: Optional[float] = None
+    unhealthy_until: float = 0.0
+
+
+def parse_endpoints(spec: str, default_model: str, api_key: Optional[str] = None) -> List[Endpoint]:
+    """Parse "url|model,url,..." (model optional) into endpoints."""
+    endpoints = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        url, _, model = item.partition("|")
+        endpoints.append(Endpoint(url=url.strip(), model=model.strip() or default_model, api_key=api_key))
+    return endpoints
+
+
+def session_key_for(messages: List[dict]) -> str:
+    """
+    Sticky routing key for a conversation: the hash of its first two messages
+    (system prompt and task), which do not change as the conversation grows.
+    """
+    return hashlib.sha1(json.dumps(messages[:2], sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class EndpointPool:
+    """
+    Chooses which inference server handles each request.
+
+    Requests of one conversation stick to the server that served it before,
+    so that server's KV cache for the shared prefix is reused. New
+    conversations go to the healthy server with the fewest requests in
+    flight, or with the lowest average latency. A server that fails is
+    skipped for `unhealthy_seconds`, or until a health check passes.
+    """
+
+    def __init__(
+        self,
+        endpoints: Sequence[Endpoint],
+        strategy: str = STRATEGY_LEAST_OUTSTANDING,
+        unhealthy_seconds: float = DEFAULT_UNHEALTHY_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if not endpoints:
+            raise ValueError("EndpointPool needs at least one endpoint")
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown routing strategy {strategy!r}; expected one of {STRATEGIES}")
+        self.endpoints = list(endpoints)
+        self._strategy = strategy
+        self._unhealthy_seconds = unhealthy_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._sticky: "OrderedDict[str, Endpoint]" = OrderedDict()
+        self._health_thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._logger = logging.getLogger(LOGGER_NAME)
+
+    def is_healthy(self, endpoint: Endpoint) -> bool:
+        return endpoint.unhealthy_until <= self._clock()
+
+    def choose(self, session_key: Optional[str] = None, exclude: Sequence[Endpoint] = ()) -> Endpoint:
+        with self._lock:
+            candidates = [e for e in self.endpoints if all(e is not x for x in exclude)] or self.endpoints
+            healthy = [e for e in candidates if self.is_healthy(e)]
+
+            sticky = self._sticky.get(session_key) if session_key else None
+            if sticky is not None and any(sticky is e for e in healthy):
+                self._sticky.move_to_end(session_key)
+                return sticky
+
+            if healthy:
+                endpoint = min(healthy, key=self._score)
+            else:
+                # everything is down: try whichever comes back first
+                endpoint = min(candidates, key=lambda e: e.unhealthy_until)
+
+            if session_key:
+                self._sticky[session_key] = endpoint
+                self._sticky.move_to_end(session_key)
+                while len(self._sticky) > MAX_STICKY_SESSIONS:
+                    self._sticky.popitem(last=False)
+            return endpoint
+
+    def _score(self, endpoint: Endpoint) -> tuple:
+        if self._strategy == STRATEGY_LATENCY:
+            # untried servers first, then expected wait: latency times queue depth
+            latency = endpoint.ewma_latency
+            if latency is None:
+                return (0, endpoint.outstanding)
+            return (1, latency * (endpoint.outstanding + 1))
+        return (endpoint.outstanding, endpoint.ewma_latency or 0.0)
+
+    @contextmanager
+    def track(self, endpoint: Endpoint) -> Iterator[Endpoint]:
+        """Count a request against `endpoint` while it is in flight and record its latency."""
+        with self._lock:
+            endpoint.outstanding += 1
+        started = self._clock()
+        try:
+            yield endpoint
+        finally:
+            latency = self._clock() - started
+            with self._lock:
+                endpoint.outstanding -= 1
+                if endpoint.ewma_latency is None:
+                    endpoint.ewma_latency = latency
+                else:
+                    endpoint.ewma_latency += LATENCY_EWMA_ALPHA * (latency - endpoint.ewma_latency)
+
+    def mark_unhealthy(self, endpoint: Endpoint) -> None:
+        with self._lock:
+            endpoint.unhealthy_until = self._clock() + self._unhealthy_seconds
+        self._logger.warning("Endpoint %s marked unhealthy for %.0fs", endpoint.url, self._unhealthy_seconds)
+
+    def mark_healthy(self, endpoint: Endpoint) -> None:
+        with self._lock:
+            endpoint.unhealthy_until = 0.0
+
+    def check_health(self, probe: Callable[[Endpoint], bool]) -> None:
+        for endpoint in self.endpoints:
+            try:
+                healthy = probe(endpoint)
+            except Exception as e:
+                self._logger.info("Health check of %s failed: %s", endpoint.url, e)
+                healthy = False
+            if healthy:
+                self.mark_healthy(endpoint)
+            else:
+                self.mark_unhealthy(endpoint)
+
+    def start_health_checks(self, probe: Callable[[Endpoint], bool], interval: float = DEFAULT_HEALTH_CHECK_INTERVAL) -> None:
+        if self._health_thread is not None:
+            return
+        self._stop_event.clear()
+
+        def run():
+            while not self._stop_event.is_set():
+                self.check_health(probe)
+                self._stop_event.wait(interval)
+
+        self._health_thread = threading.Thread(target=run, name="llm-endpoint-health", daemon=True)
+        self._health_thread.start()
+
+    def stop_health_checks(self) -> None:
+        self._stop_event.set()
+        if self._health_thread is not None:
+            self._health_thread.join()
+            self._health_thread = None
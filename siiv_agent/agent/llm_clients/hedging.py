@@ -0,0 +1,227 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from agent.llm_clients.client_interface import LLMClientInterface
+from agent.session_metrics import percentile
+
+LOGGER_NAME = __name__
+
+DEFAULT_HEDGE_PERCENTILE = 95.0
+DEFAULT_MIN_SAMPLES = 20
+DEFAULT_WINDOW = 200
+DEFAULT_MIN_HEDGE_DELAY = 0.5
+
+
+class HedgeCancelledError(Exception):
+    """Raised inside the losing stream's callback to abort it."""
+
+
+class LatencyWindow:
+    """The most recent `size` latencies, for percentile lookups."""
+
+    def __init__(self, size: int = DEFAULT_WINDOW):
+        self._values: Deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._values.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        with self._lock:
+            return percentile(list(self._values), pct)
+
+
+class HedgingLLMClient(LLMClientInterface):
+    """
+    Sends a duplicate request to `hedge` when `primary` is slower than the
+    `hedge_percentile` of its recent latencies, and returns whichever good
+    answer arrives first.
+
+    Hedging starts once `min_samples` latencies are known. A losing stream is
+    aborted at its next token; a losing non-streaming call cannot be
+    interrupted, so it finishes in the background and its answer is
+    dropped. stats() compares the p99 callers saw with the p99 the primary
+    alone would have given.
+    """
+
+    def __init__(
+        self,
+        primary: LLMClientInterface,
+        hedge: LLMClientInterface,
+        hedge_percentile: float = DEFAULT_HEDGE_PERCENTILE,
+        min_samples: int = DEFAULT_MIN_SAMPLES,
+        min_hedge_delay: float = DEFAULT_MIN_HEDGE_DELAY,
+        window: int = DEFAULT_WINDOW,
+        max_workers: int = 8,
+    ):
+        self._primary = primary
+        self._hedge = hedge
+        self._hedge_percentile = hedge_percentile
+        self._min_samples = min_samples
+        self._min_hedge_delay = min_hedge_delay
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-hedge")
+        self._logger = logging.getLogger(LOGGER_NAME)
+
+        # what the primary alone takes (to the answer, or to the first streamed token)
+        self._primary_latencies = LatencyWindow(window)
+        self._primary_ttfts = LatencyWindow(window)
+        # what callers actually waited
+        self._observed_latencies = LatencyWindow(window)
+        self._stats_lock = threading.Lock()
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def _hedge_delay(self, latencies: LatencyWindow) -> Optional[float]:
+        if len(latencies) < self._min_samples:
+            return None
+        return max(self._min_hedge_delay, latencies.percentile(self._hedge_percentile))
+
+    def call_chat(self, messages: list, tool_schema: dict, **params):
+        started = time.monotonic()
+
+        def run(client: LLMClientInterface) -> Any:
+            return client.call_chat(messages=messages, tool_schema=tool_schema, **params)
+
+        def record_primary(future: Future) -> None:
+            if not future.cancelled() and future.exception() is None:
+                self._primary_latencies.add(time.monotonic() - started)
+
+        primary = self._executor.submit(run, self._primary)
+        primary.add_done_callback(record_primary)
+        result = self._race(primary, lambda: self._executor.submit(run, self._hedge), self._hedge_delay(self._primary_latencies))
+        self._observed_latencies.add(time.monotonic() - started)
+        return result
+
+    def call_chat_stream(self, messages: list, tool_schema: dict, on_content=None, on_tool_call=None, **params):
+        started = time.monotonic()
+        lock = threading.Lock()
+        winner: List[Optional[str]] = [None]
+        primary_first_token = threading.Event()
+
+        def gated(name: str, callback: Optional[Callable[[Any], None]]) -> Callable[[Any], None]:
+            # the first stream to produce a token owns the callbacks; the other is aborted
+            def forward(value: Any) -> None:
+                with lock:
+                    if winner[0] is None:
+                        winner[0] = name
+                    elif winner[0] != name:
+                        raise HedgeCancelledError()
+                if name == "primary":
+                    primary_first_token.set()
+                if callback:
+                    callback(value)
+
+            return forward
+
+        def run(name: str, client: LLMClientInterface) -> Any:
+            return client.call_chat_stream(
+                messages=messages,
+                tool_schema=tool_schema,
+                on_content=gated(name, on_content),
+                on_tool_call=gated(name, on_tool_call),
+                **params,
+            )
+
+        def record_primary(future: Future) -> None:
+            if future.cancelled() or future.exception() is not None:
+                return
+            # an aborted primary is not counted, so stats() understates the gain
+            self._primary_latencies.add(time.monotonic() - started)
+            if future.result().metrics:
+                ttft = future.result().metrics.time_to_first_token
+                if ttft is not None:
+                    self._primary_ttfts.add(ttft)
+
+        primary = self._executor.submit(run, "primary", self._primary)
+        primary.add_done_callback(record_primary)
+        result = self._race(
+            primary,
+            lambda: self._executor.submit(run, "hedge", self._hedge),
+            self._hedge_delay(self._primary_ttfts),
+            first_token=primary_first_token,
+            preferred=lambda futures: futures[0] if winner[0] == "primary" else futures[-1] if winner[0] == "hedge" else None,
+        )
+        self._observed_latencies.add(time.monotonic() - started)
+        return result
+
+    def _race(
+        self,
+        primary: Future,
+        start_hedge: Callable[[], Future],
+        delay: Optional[float],
+        first_token: Optional[threading.Event] = None,
+        preferred: Optional[Callable[[List[Future]], Optional[Future]]] = None,
+    ) -> Any:
+        """
+        Wait for primary; past `delay` start the hedge and return the first good
+        result. For streams, `first_token` is set when the primary streams its
+        first token, and that (not the whole answer) has to arrive within `delay`.
+        """
+        with self._stats_lock:
+            self.calls += 1
+        if first_token is None:
+            done, _ = wait([primary], timeout=delay)
+            on_time = primary in done
+        else:
+            # a primary that ends (e.g. fails) before its first token also stops the wait
+            primary.add_done_callback(lambda _: first_token.set())
+            on_time = first_token.wait(delay)
+        if on_time:
+            return primary.result()
+
+        with self._stats_lock:
+            self.hedged += 1
+        self._logger.info("LLM call slower than %.2fs; sending hedge request", delay)
+        futures = [primary, start_hedge()]
+        pending = set(futures)
+        while pending:
+            chosen = preferred(futures) if preferred else None
+            if chosen is not None:
+                # a stream already emitted tokens: its result is the answer, good or bad
+                return self._finish(chosen, futures)
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in futures:
+                if future in done and future.exception() is None:
+                    chosen = preferred(futures) if preferred else None
+                    return self._finish(chosen or future, futures)
+        # both failed; surface the primary's error
+        return primary.result()
+
+    def _finish(self, winner: Future, futures: List[Future]) -> Any:
+        if winner is not futures[0]:
+            with self._stats_lock:
+                self.hedge_wins += 1
+        for future in futures:
+            if future is not winner:
+                future.cancel()
+        return winner.result()
+
+    def stats(self) -> Dict[str, Any]:
+        unhedged_p99 = self._primary_latencies.percentile(99)
+        observed_p99 = self._observed_latencies.percentile(99)
+        with self._stats_lock:
+            calls, hedged, hedge_wins = self.calls, self.hedged, self.hedge_wins
+        return {
+            "calls": calls,
+            "hedged": hedged,
+            "hedge_wins": hedge_wins,
+            "primary_p99": unhedged_p99,
+            "observed_p99": observed_p99,
+            "p99_improvement": (
+                unhedged_p99 - observed_p99
+                if unhedged_p99 is not None and observed_p99 is not None
+                else None
+            ),
+        }
+
+    def log_stats(self) -> None:
+        self._logger.info("Hedging stats: %s", self.stats())
@@ -0,0 +1,37 @@
+import threading
+from typing import Dict, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 5.0
+# local models can take minutes to generate a long completion
+DEFAULT_READ_TIMEOUT = 300.0
+
+_sessions: Dict[Tuple[str, int], requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+def get_shared_session(url: str, pool_size: int = DEFAULT_POOL_SIZE) -> requests.Session:
+    """
+    Return the process-wide keep-alive session for the server hosting `url`.
+
+    Every client talking to the same inference server reuses one connection
+    pool of up to `pool_size` connections instead of opening a new TCP
+    connection per request.
+    """
+    parts = urlsplit(url)
+    origin = f"{parts.scheme}://{parts.netloc}"
+    key = (origin, pool_size)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=1, pool_maxsize=pool_size, pool_block=True
+            )
+            session.mount(f"{origin}/", adapter)
+            _sessions[key] = session
+        return session
@@ -1,60 +1,153 @@
-import json
 import logging
-from dataclasses import dataclass
-from datetime import datetime
-from typing import Any, List, Optional
-import requests
+import os
+import time
+from typing import Any, Callable, List, Optional
+from agent.llm_clients.chat_response import ChatAndToolResponse
 from agent.llm_clients.client_interface import LLMClientInterface
+from agent.llm_clients.endpoint_pool import DEFAULT_HEALTH_CHECK_INTERVAL, STRATEGY_LEAST_OUTSTANDING, Endpoint, EndpointPool, parse_endpoints, session_key_for
+from agent.llm_clients.http_session import DEFAULT_CONNECT_TIMEOUT, DEFAULT_POOL_SIZE, DEFAULT_READ_TIMEOUT, get_shared_session
+from agent.llm_clients.retry import LLMCallError, LLMResponseError, classify_error
+from agent.llm_clients.streaming import StreamAccumulator, iter_sse_chunks
+from agent.llm_clients.structured_output import parse_step, step_response_format
+from agent.llm_clients.trace_writer import trace_llm_call
 
 LOGGER_NAME = __name__
 LM_STUDIO_URL = "http://localhost:1234/v1/chat/completions"
 LM_MODEL = "gemma-2-9b-tf"
 LM_API_KEY = "whatever"
 
-@dataclass
-class ChatAndToolResponse:
-    content: Optional[str]
-    tool_calls: List[Any]
+def build_headers(api_key: Optional[str]) -> dict:
+    headers = {}
+    if api_key:
+        headers["Authorization"] = f"Bearer {api_key}"
+    return headers
+
+def build_chat_payload(model: str, messages: List[dict], temperature: float, max_tokens: int, stream: bool = False) -> dict:
+    payload = {"model": model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens, "n": 1, "tools": [], "tool_choice": "auto"}
+    if stream:
+        payload["stream"] = True
+        payload["stream_options"] = {"include_usage": True}
+    return payload
+
+def usage_with_cache_hits(data: dict) -> Optional[dict]:
+    """The usage block, with llama.cpp's reused KV-cache tokens (timings.cache_n) reported as cached prompt tokens."""
+    usage = data.get("usage")
+    cache_n = (data.get("timings") or {}).get("cache_n")
+    if usage is None or cache_n is None or "prompt_tokens_details" in usage:
+        return usage
+    return {**usage, "prompt_tokens_details": {"cached_tokens": cache_n}}
 
 class LLMClient(LLMClientInterface):
-    def __init__(self):
-        self._model = LM_MODEL
-        self._url = LM_STUDIO_URL
-        self._api_key = LM_API_KEY
+    """
+    Chat client for one or more LM Studio / llama.cpp servers.
+
+    With several endpoints (argument, or SIIV_LM_ENDPOINTS="url|model,url|model"),
+    each request is routed by an EndpointPool: a conversation sticks to one
+    server for KV-cache reuse, and a server that errors is skipped while the
+    request fails over to the next one.
+
+    With `structured_output`, the server decodes every reply against a JSON
+    schema of the available tools (LM Studio / llama.cpp response_format), so
+    tool calls always parse.
+    """
+
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE, connect_timeout: float = DEFAULT_CONNECT_TIMEOUT, read_timeout: float = DEFAULT_READ_TIMEOUT, endpoints: Optional[List[Endpoint]] = None, strategy: str = STRATEGY_LEAST_OUTSTANDING, health_check_interval: Optional[float] = DEFAULT_HEALTH_CHECK_INTERVAL, structured_output: bool = False):
+        if endpoints is None:
+            endpoints = parse_endpoints(os.getenv("SIIV_LM_ENDPOINTS", LM_STUDIO_URL), default_model=LM_MODEL, api_key=LM_API_KEY)
+        self._pool = EndpointPool(endpoints, strategy=strategy)
+        self._model = endpoints[0].model
+        # the circuit breaker in RetryingLLMClient is keyed on this
+        self._url = ",".join(endpoint.url for endpoint in endpoints)
         self._logger = logging.getLogger(LOGGER_NAME)
+        # one keep-alive pool per server, shared by every LLMClient in the process
+        self._sessions = {endpoint.url: get_shared_session(endpoint.url, pool_size=pool_size) for endpoint in endpoints}
+        self._timeout = (connect_timeout, read_timeout)
+        self._structured_output = structured_output
+        if len(endpoints) > 1 and health_check_interval:
+            self._pool.start_health_checks(self._probe, interval=health_check_interval)
 
-    def call_chat(self, messages: List[dict], tool_schema=dict, temperature=0.8, max_tokens=8192):
-        headers = {}
-        if self._api_key:
-            headers["Authorization"] = f"Bearer {self._api_key}"
+    def _probe(self, endpoint: Endpoint) -> bool:
+        models_url = endpoint.url.rsplit("/chat/completions", 1)[0] + "/models"
+        response = self._sessions[endpoint.url].get(models_url, headers=build_headers(endpoint.api_key), timeout=self._timeout[0])
+        return response.status_code == 200
 
-        payload = {"model": self._model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens, "n": 1, "tools": [], "tool_choice": "auto"}
+    def _with_failover(self, messages: List[dict], send: Callable[[Endpoint], Any]) -> Any:
+        """Call send(endpoint) on the chosen endpoint, moving on to the others if it fails transiently."""
+        session_key = session_key_for(messages)
+        tried: List[Endpoint] = []
+        while True:
+            endpoint = self._pool.choose(session_key=session_key, exclude=tried)
+            tried.append(endpoint)
+            try:
+                with self._pool.track(endpoint):
+                    return send(endpoint)
+            except Exception as e:
+                classification = classify_error(e)
+                if not classification.retryable or len(tried) >= len(self._pool.endpoints):
+                    raise
+                if classification.kind != "rate_limited":
+                    self._pool.mark_unhealthy(endpoint)
+                self._logger.warning("LLM call to %s failed (%s); failing over", endpoint.url, classification.kind)
 
-        now = datetime.now()
-        timestamp = now.strftime("%Y%m%d_%H%M%S") + f"_{now.microsecond // 1000:03d}"
+    def call_chat(self, messages: List[dict], tool_schema=dict, temperature=0.8, max_tokens=8192):
+        return self._with_failover(messages, lambda endpoint: self._call_chat(endpoint, messages, tool_schema, temperature, max_tokens))
 
-        with open(f"_llm_request_{timestamp}.log", "w", encoding="utf-8") as handle:
-            as_string = json.dumps(payload, indent=2)
-            handle.write(as_string)
+    def _build_payload(self, endpoint: Endpoint, messages: List[dict], tool_schema, temperature, max_tokens, stream: bool = False) -> dict:
+        payload = build_chat_payload(endpoint.model, messages, temperature, max_tokens, stream=stream)
+        if self._structured_output and tool_schema:
+            payload["response_format"] = step_response_format(tool_schema)
+        return payload
 
-        response = requests.post(self._url, headers=headers, json=payload)
+    def _call_chat(self, endpoint: Endpoint, messages: List[dict], tool_schema, temperature, max_tokens):
+        headers = build_headers(endpoint.api_key)
+        payload = self._build_payload(endpoint, messages, tool_schema, temperature, max_tokens)
+
+        started = time.monotonic()
+        response = self._sessions[endpoint.url].post(endpoint.url, headers=headers, json=payload, timeout=self._timeout)
         if response.status_code != 200:
             self._logger.error("LLM call failed: %s %s", response.status_code, response.text)
-            raise Exception(f"LLM call failed: {response.status_code} {response.text}")
+            raise LLMCallError(response.status_code, response.text)
 
         data = response.json()
-
-        with open(f"_llm_response_{timestamp}.log", "w", encoding="utf-8") as handle:
-            as_string = json.dumps(data, indent=2)
-            handle.write(as_string)
+        trace_llm_call(client="lm-studio", model=endpoint.model, messages=messages, tool_schema=payload["tools"], response=data, latency_seconds=time.monotonic() - started, usage=data.get("usage"))
 
         try:
-            content = data["choices"][0]["message"].get("content")
-            tool_calls = data["choices"][0]["message"].get("tool_calls")
-            return ChatAndToolResponse(content=content, tool_calls=tool_calls)
-        except Exception:
-            print("Exception!!!!")
-            print(data)
+            message = data["choices"][0]["message"]
+        except (KeyError, IndexError, TypeError) as e:
+            raise LLMResponseError(f"Unexpected chat completion body: {data}") from e
+        content, tool_calls = message.get("content"), message.get("tool_calls")
+        if "response_format" in payload:
+            content, tool_calls = parse_step(content)
+        return ChatAndToolResponse(content=content, tool_calls=tool_calls, usage=usage_with_cache_hits(data), model=endpoint.model)
+
+    def call_chat_stream(self, messages: List[dict], tool_schema=dict, on_content=None, on_tool_call=None, temperature=0.8, max_tokens=8192):
+        return self._with_failover(messages, lambda endpoint: self._call_chat_stream(endpoint, messages, tool_schema, on_content, on_tool_call, temperature, max_tokens))
+
+    def _call_chat_stream(self, endpoint: Endpoint, messages: List[dict], tool_schema, on_content, on_tool_call, temperature, max_tokens):
+        headers = build_headers(endpoint.api_key)
+        payload = self._build_payload(endpoint, messages, tool_schema, temperature, max_tokens, stream=True)
+        structured = "response_format" in payload
+
+        started = time.monotonic()
+        # a structured reply is JSON until it is complete, so nothing is streamed to the callbacks
+        accumulator = StreamAccumulator(on_content=None if structured else on_content, on_tool_call=None if structured else on_tool_call)
+        with self._sessions[endpoint.url].post(endpoint.url, headers=headers, json=payload, stream=True, timeout=self._timeout) as response:
+            if response.status_code != 200:
+                self._logger.error("LLM call failed: %s %s", response.status_code, response.text)
+                raise LLMCallError(response.status_code, response.text)
+            for chunk in iter_sse_chunks(response.iter_lines()):
+                accumulator.add_chunk(chunk)
+
+        content, tool_calls, metrics = accumulator.finish()
+        trace_llm_call(client="lm-studio", model=endpoint.model, messages=messages, tool_schema=payload["tools"], response={"content": content, "tool_calls": tool_calls}, latency_seconds=time.monotonic() - started, usage={"completion_tokens": metrics.completion_tokens})
+        if structured:
+            content, tool_calls = parse_step(content)
+            if content and on_content:
+                on_content(content)
+            for tool_call in tool_calls or []:
+                if on_tool_call:
+                    on_tool_call(tool_call)
+        return ChatAndToolResponse(content=content, tool_calls=tool_calls, metrics=metrics, usage=accumulator.usage, model=endpoint.model)
 
 if __name__ == "__main__":
     messages = [{"role": "system", "content": "You are a cheerful and helpful agent. Provide answers as complete sentences and include fun emojis. Don't use a tool if you already know the answer. The only tool available is onnect_to_file. Do not use that tool unless instructed to."}, {"role": "user", "content": "What is the wisest thing anyone has ever said?"}]
@@ -0,0 +1,98 @@
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from agent.llm_clients.client_interface import LLMClientInterface
+
+LOGGER_NAME = __name__
+
+TIER_SMALL = "small"
+TIER_LARGE = "large"
+
+REASON_DEFAULT = "default"
+REASON_PLANNING = "planning"
+REASON_PARSE_FAILURE = "parse_failure"
+REASON_TOOL_ERRORS = "tool_errors"
+
+
+@dataclass
+class RoutingSignals:
+    """What the agent session knows about the turn it is about to take."""
+
+    turn: int
+    # the model has not acted on the task or on new user input yet
+    planning: bool = False
+    consecutive_parse_failures: int = 0
+    consecutive_tool_errors: int = 0
+
+
+@dataclass
+class RoutingPolicy:
+    escalate_planning: bool = True
+    parse_failures_to_escalate: int = 1
+    tool_errors_to_escalate: int = 2
+
+    def decide(self, signals: RoutingSignals) -> Tuple[str, str]:
+        """Return (tier, reason) for the next turn."""
+        if self.escalate_planning and signals.planning:
+            return TIER_LARGE, REASON_PLANNING
+        if signals.consecutive_parse_failures >= self.parse_failures_to_escalate:
+            return TIER_LARGE, REASON_PARSE_FAILURE
+        if signals.consecutive_tool_errors >= self.tool_errors_to_escalate:
+            return TIER_LARGE, REASON_TOOL_ERRORS
+        return TIER_SMALL, REASON_DEFAULT
+
+
+class ModelRouter:
+    """
+    Picks the client (small or large model) for each agent turn.
+
+    Routine turns go to the small model; planning turns, malformed tool calls
+    and runs of failing tool calls are escalated to the large one. Every
+    decision is logged, and record() keeps per-tier latency and cost so
+    summary() shows what routing saved.
+    """
+
+    def __init__(self, clients: Dict[str, LLMClientInterface], policy: Optional[RoutingPolicy] = None):
+        for tier in (TIER_SMALL, TIER_LARGE):
+            if tier not in clients:
+                raise ValueError(f"ModelRouter needs a client for the {tier!r} tier")
+        self._clients = clients
+        self._policy = policy or RoutingPolicy()
+        self._lock = threading.Lock()
+        self._stats: Dict[Tuple[str, str], Dict[str, float]] = {}
+        self._logger = logging.getLogger(LOGGER_NAME)
+
+    def choose(self, signals: RoutingSignals) -> Tuple[str, str, LLMClientInterface]:
+        tier, reason = self._policy.decide(signals)
+        self._logger.info("Routing turn %d to %s model (%s)", signals.turn, tier, reason)
+        return tier, reason, self._clients[tier]
+
+    def record(self, tier: str, reason: str, latency_seconds: float, cost_usd: float) -> None:
+        with self._lock:
+            stats = self._stats.setdefault((tier, reason), {"calls": 0, "seconds": 0.0, "cost_usd": 0.0})
+            stats["calls"] += 1
+            stats["seconds"] += latency_seconds
+            stats["cost_usd"] += cost_usd
+
+    def summary(self) -> Dict[str, Any]:
+        """Calls, total and mean latency, and cost per (tier, reason)."""
+        with self._lock:
+            return {
+                f"{tier}/{reason}": {
+                    **stats,
+                    "mean_seconds": stats["seconds"] / stats["calls"],
+                }
+                for (tier, reason), stats in sorted(self._stats.items())
+            }
+
+    def log_summary(self) -> None:
+        for key, stats in self.summary().items():
+            self._logger.info(
+                "Routing %s: %d calls, %.2fs mean, $%.4f",
+                key,
+                stats["calls"],
+                stats["mean_seconds"],
+                stats["cost_usd"],
+            )
@@ -1,32 +1,42 @@
-import json
 import logging
 import os
 import pprint
 import time
-from datetime import datetime
 from typing import List
 from dotenv import load_dotenv
 from openai import OpenAI
+from openai.types.chat import ChatCompletionMessageToolCall
 from agent.llm_clients.client_interface import LLMClientInterface
-from agent.llm_client import ChatAndToolResponse
+from agent.llm_clients.chat_response import create_completion
+from agent.llm_clients.llm_client import ChatAndToolResponse
+from agent.llm_clients.rate_limiter import get_shared_rate_limiter
+from agent.llm_clients.streaming import StreamAccumulator
+from agent.llm_clients.structured_output import strict_tool_schema
+from agent.llm_clients.trace_writer import trace_llm_call
 
 LOGGER_NAME = __name__
 
 class OpenAiClient(LLMClientInterface):
-    def __init__(self):
+    def __init__(self, model: str = "gpt-4o-mini", strict_tools: bool = False):
         load_dotenv()
         api_key = os.getenv("OPENAI_API_KEY")
-        self._client = OpenAI(api_key=api_key)
+        # retries and backoff are left to RetryingLLMClient
+        self._client = OpenAI(api_key=api_key, max_retries=0)
         self._logger = logging.getLogger(LOGGER_NAME)
-        self._model = "gpt-4o-mini"
+        self._model = model
         self._max_tokens = 8192
         self._temperature = 0.8
+        # strict function schemas: the API only generates arguments that match them
+        self._strict_tools = strict_tools
+        # shared by every client for this model in the process
+        self._rate_limiter = get_shared_rate_limiter(f"openai:{self._model}")
 
     def call_chat(self, messages: List[dict], tool_schema=List[dict]):
-        time.sleep(5)
-
+        started = time.monotonic()
         if tool_schema:
-            response = self._client.chat.completions.create(
+            if self._strict_tools:
+                tool_schema = strict_tool_schema(tool_schema)
+            response = self._create_completion(
                 model=self._model,
                 messages=messages,
                 temperature=self._temperature,
@@ -34,28 +44,45 @@ class OpenAiClient(LLMClientInterface):
                 tool_choice="auto",
             )
         else:
-            response = self._client.chat.completions.create(
+            response = self._create_completion(
                 model=self._model,
                 messages=messages,
                 temperature=self._temperature,
             )
 
-        now = datetime.now()
-        timestamp = now.strftime("%Y%m%d_%H%M%S") + f"_{now.microsecond // 1000:03d}"
-
-        with open(f"_openai_response_{timestamp}.log", "w", encoding="utf-8") as handle:
-            as_string = json.dumps(response.to_json(), indent=2)
-            handle.write(as_string)
+        trace_llm_call(client="openai", model=self._model, messages=messages, tool_schema=tool_schema, response=response, latency_seconds=time.monotonic() - started, usage=response.usage.model_dump() if response.usage else None)
 
         try:
             choice = response.choices[0]
             content = choice.message.content
             tool_calls = choice.message.tool_calls
-            return ChatAndToolResponse(content=content, tool_calls=tool_calls)
+            return ChatAndToolResponse(content=content, tool_calls=tool_calls, usage=response.usage.model_dump() if response.usage else None, model=self._model)
         except Exception as e:
             self._logger.error("Error parsing response: %s", e)
             raise
 
+    def call_chat_stream(self, messages: List[dict], tool_schema=List[dict], on_content=None, on_tool_call=None):
+        kwargs = {"model": self._model, "messages": messages, "temperature": self._temperature, "stream": True, "stream_options": {"include_usage": True}}
+        if tool_schema:
+            kwargs["tools"] = strict_tool_schema(tool_schema) if self._strict_tools else tool_schema
+            kwargs["tool_choice"] = "auto"
+
+        started = time.monotonic()
+        accumulator = StreamAccumulator(on_content=on_content, on_tool_call=on_tool_call)
+        for chunk in self._create_completion(**kwargs):
+            accumulator.add_chunk(chunk.model_dump())
+        content, tool_calls, metrics = accumulator.finish()
+        trace_llm_call(client="openai", model=self._model, messages=messages, tool_schema=tool_schema, response={"content": content, "tool_calls": tool_calls}, latency_seconds=time.monotonic() - started, usage={"completion_tokens": metrics.completion_tokens})
+
+        # same tool call objects as the non-streaming path returns
+        if tool_calls:
+            tool_calls = [ChatCompletionMessageToolCall.model_validate(t) for t in tool_calls]
+        return ChatAndToolResponse(content=content, tool_calls=tool_calls, metrics=metrics, usage=accumulator.usage, model=self._model)
+
+    def _create_completion(self, **kwargs):
+        """Call the chat completions API, waiting only if a known rate limit requires it."""
+        return create_completion(self._rate_limiter, self._client.chat.completions.with_raw_response.create, **kwargs)
+
 if __name__ == "__main__":
     from agent.my_logging import init_logging
     init_logging()
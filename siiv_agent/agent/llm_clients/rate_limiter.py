@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import re
+import threading
+import time
+from typing import Callable, Dict, Mapping, Optional
+
+LOGGER_NAME = __name__
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_SECONDS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_reset_duration(value: str) -> Optional[float]:
+    """Parse OpenAI style reset values ("1s", "6m0s", "20ms", "0.5") into seconds."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(number) * _DURATION_SECONDS[unit] for number, unit in parts)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) used before the real usage is known."""
+    return max(1, len(text) // 4)
+
+
+class TokenBucket:
+    """A bucket of `capacity` units refilled evenly over one minute."""
+
+    def __init__(self, capacity: float, now: float):
+        self.capacity = capacity
+        self.level = capacity
+        self.updated_at = now
+
+    @property
+    def rate_per_second(self) -> float:
+        return self.capacity / 60.0
+
+    def refill(self, now: float) -> None:
+        elapsed = max(0.0, now - self.updated_at)
+        self.level = min(self.capacity, self.level + elapsed * self.rate_per_second)
+        self.updated_at = now
+
+    def seconds_until(self, amount: float) -> float:
+        # never wait for more than a full bucket; an oversized request just drains it
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate_per_second
+
+
+class RateLimiter:
+    """
+    Client-side requests/min and tokens/min limiter.
+
+    Limits start unknown (no waiting) and are learned from the provider's
+    x-ratelimit-* headers, or can be configured up front. A retry-after hint
+    blocks every caller until it has passed. acquire() only sleeps when a
+    limit actually requires it.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._logger = logging.getLogger(LOGGER_NAME)
+
+        now = clock()
+        self._requests = TokenBucket(requests_per_minute, now) if requests_per_minute else None
+        self._tokens = TokenBucket(tokens_per_minute, now) if tokens_per_minute else None
+        self._blocked_until = 0.0
+
+    def acquire(self, tokens: int = 0) -> float:
+        """Block until one request of `tokens` tokens fits; returns seconds waited."""
+        waited = 0.0
+        while True:
+            wait = self._try_reserve(tokens)
+            if wait <= 0:
+                return waited
+            self._logger.info("Rate limit reached; waiting %.2fs", wait)
+            self._sleep(wait)
+            waited += wait
+
+    async def acquire_async(self, tokens: int = 0) -> float:
+        """acquire() for asyncio callers: waits without blocking the event loop."""
+        waited = 0.0
+        while True:
+            wait = self._try_reserve(tokens)
+            if wait <= 0:
+                return waited
+            self._logger.info("Rate limit reached; waiting %.2fs", wait)
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def _try_reserve(self, tokens: int) -> float:
+        """Consume budget for one request and return 0, or return how long to wait."""
+        with self._lock:
+            now = self._clock()
+            wait = max(0.0, self._blocked_until - now)
+            for bucket, amount in ((self._requests, 1), (self._tokens, tokens)):
+                if bucket is not None:
+                    bucket.refill(now)
+                    wait = max(wait, bucket.seconds_until(amount))
+            if wait <= 0:
+                if self._requests is not None:
+                    self._requests.level -= 1
+                if self._tokens is not None:
+                    self._tokens.level -= tokens
+            return wait
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        """Correct the token bucket once the real usage of a request is known."""
+        if actual_tokens is None or self._tokens is None:
+            return
+        with self._lock:
+            self._tokens.level -= actual_tokens - estimated_tokens
+
+    def block_for(self, seconds: float) -> None:
+        """Honour a retry-after hint: nobody sends until it has passed."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, self._clock() + seconds)
+        self._logger.info("Provider asked us to retry after %.2fs", seconds)
+
+    def update_from_headers(self, headers: Mapping[str, str]) -> None:
+        """Learn limits and remaining budget from rate-limit response headers."""
+        headers = {key.lower(): value for key, value in dict(headers).items()}
+
+        retry_after = _retry_after_seconds(headers)
+        if retry_after:
+            self.block_for(retry_after)
+
+        with self._lock:
+            now = self._clock()
+            self._requests = self._update_bucket(self._requests, headers, "requests", now)
+            self._tokens = self._update_bucket(self._tokens, headers, "tokens", now)
+
+    def _update_bucket(
+        self, bucket: Optional[TokenBucket], headers: Dict[str, str], kind: str, now: float
+    ) -> Optional[TokenBucket]:
+        limit = headers.get(f"x-ratelimit-limit-{kind}")
+        remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+        reset = parse_reset_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+
+        if limit is not None:
+            if bucket is None:
+                bucket = TokenBucket(float(limit), now)
+            bucket.refill(now)
+            bucket.capacity = float(limit)
+        if bucket is not None and remaining is not None:
+            bucket.refill(now)
+            bucket.level = min(bucket.level, float(remaining))
+            if float(remaining) <= 0 and reset:
+                self._blocked_until = max(self._blocked_until, now + reset)
+        return bucket
+
+
+def _retry_after_seconds(headers: Dict[str, str]) -> Optional[float]:
+    if "retry-after-ms" in headers:
+        try:
+            return float(headers["retry-after-ms"]) / 1000.0
+        except ValueError:
+            pass
+    if "retry-after" in headers:
+        return parse_reset_duration(headers["retry-after"])
+    return None
+
+
+_shared_limiters: Dict[str, RateLimiter] = {}
+_shared_limiters_lock = threading.Lock()
+
+
+def get_shared_rate_limiter(key: str, **kwargs) -> RateLimiter:
+    """Return the process-wide limiter for `key` (e.g. provider + model), creating it once."""
+    with _shared_limiters_lock:
+        if key not in _shared_limiters:
+            _shared_limiters[key] = RateLimiter(**kwargs)
+        return _shared_limiters[key]
@@ -0,0 +1,229 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from agent.llm_clients.chat_response import ChatAndToolResponse
+from agent.llm_clients.client_interface import LLMClientInterface
+
+LOGGER_NAME = __name__
+
+CACHE_MODE_OFF = "off"
+CACHE_MODE_RECORD = "record"  # serve hits, call the model and store on misses
+CACHE_MODE_REPLAY = "replay"  # serve hits, fail on misses; never calls the model
+CACHE_MODES = (CACHE_MODE_OFF, CACHE_MODE_RECORD, CACHE_MODE_REPLAY)
+
+DEFAULT_CACHE_DIR = ".llm_cache"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+# "Current time: 2025-01-31 12:00:00" from the task message; different on every run
+CURRENT_TIME_PATTERN = re.compile(r"(Current time: )\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}")
+VOLATILE_TIME = r"\1<now>"
+
+
+class CacheMissError(Exception):
+    pass
+
+
+def to_jsonable(value: Any) -> Any:
+    # OpenAI SDK objects (e.g. tool calls echoed back in messages) are pydantic models
+    if hasattr(value, "model_dump"):
+        return value.model_dump(exclude_none=True)
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _stable_text(value: Any, ids: Dict[str, str]) -> Any:
+    if isinstance(value, str):
+        value = CURRENT_TIME_PATTERN.sub(VOLATILE_TIME, value)
+        for volatile_id, stable_id in ids.items():
+            value = value.replace(volatile_id, stable_id)
+        return value
+    if isinstance(value, list):
+        return [
+            {**part, "text": _stable_text(part["text"], ids)} if isinstance(part, dict) and "text" in part else part
+            for part in value
+        ]
+    return value
+
+
+def stable_messages(messages: List[dict]) -> List[dict]:
+    """
+    Messages without the parts that change from run to run: the current time
+    and generated tool call ids, which are replaced by their position
+    (call_0, call_1, ...), so a re-run of the same session hashes the same.
+    """
+    messages = json.loads(json.dumps(messages, default=to_jsonable))
+    ids: Dict[str, str] = {}
+
+    def stable_id(tool_call_id: str) -> str:
+        return ids.setdefault(tool_call_id, f"call_{len(ids)}")
+
+    for message in messages:
+        for tool_call in message.get("tool_calls") or []:
+            if isinstance(tool_call, dict) and "id" in tool_call:
+                tool_call["id"] = stable_id(tool_call["id"])
+        if "tool_call_id" in message:
+            message["tool_call_id"] = stable_id(message["tool_call_id"])
+    # ids also show up in text, e.g. tool results that refer back to an earlier call
+    for message in messages:
+        if "content" in message:
+            message["content"] = _stable_text(message["content"], ids)
+    return messages
+
+
+def canonical_request_hash(
+    model: str,
+    messages: List[dict],
+    tool_schema: Any,
+    params: Dict[str, Any],
+) -> str:
+    """sha256 of the request in a canonical form (sorted keys, no whitespace, volatile fields masked)."""
+    request = {
+        "model": model,
+        "messages": stable_messages(messages),
+        "tools": tool_schema or [],
+        "params": params,
+    }
+    as_string = json.dumps(
+        request, sort_keys=True, separators=(",", ":"), default=to_jsonable
+    )
+    return hashlib.sha256(as_string.encode("utf-8")).hexdigest()
+
+
+class DiskResponseCache:
+    """One JSON file per request hash; least recently used files are evicted past `max_bytes`."""
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self._directory = Path(directory)
+        self._directory.mkdir(parents=True, exist_ok=True)
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._logger = logging.getLogger(LOGGER_NAME)
+
+    def _path(self, key: str) -> Path:
+        return self._directory / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as handle:
+                entry = json.load(handle)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        os.utime(path)  # mark as recently used
+        return entry
+
+    def put(self, key: str, entry: Dict[str, Any]) -> None:
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as handle:
+            json.dump(entry, handle, default=to_jsonable)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self) -> None:
+        with self._lock:
+            files = [(p.stat(), p) for p in self._directory.glob("*.json")]
+            total = sum(stat.st_size for stat, _ in files)
+            for stat, path in sorted(files, key=lambda item: item[0].st_mtime):
+                if total <= self._max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= stat.st_size
+                self._logger.info("Evicted cached LLM response %s", path.name)
+
+
+def response_to_entry(response: ChatAndToolResponse) -> Dict[str, Any]:
+    tool_calls = response.tool_calls
+    if tool_calls:
+        tool_calls = [
+            t if isinstance(t, dict) else to_jsonable(t) for t in tool_calls
+        ]
+    # usage and model are replayed too, so cost accounting sees the recorded call
+    return {
+        "content": response.content,
+        "tool_calls": tool_calls,
+        "usage": response.usage,
+        "model": response.model,
+    }
+
+
+class CachingLLMClient(LLMClientInterface):
+    """
+    Wraps another client and answers repeated requests from a DiskResponseCache.
+
+    In replay mode nothing reaches the model: a request that was not recorded
+    raises CacheMissError, which makes re-runs instant and deterministic.
+    Cached tool calls come back as OpenAI-format dicts.
+    """
+
+    def __init__(
+        self,
+        client: LLMClientInterface,
+        cache: DiskResponseCache,
+        mode: str = CACHE_MODE_RECORD,
+        model: Optional[str] = None,
+    ):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode '{mode}', expected one of {CACHE_MODES}")
+        self._client = client
+        self._cache = cache
+        self._mode = mode
+        self._model = model or getattr(client, "_model", type(client).__name__)
+        self._logger = logging.getLogger(LOGGER_NAME)
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, messages, tool_schema, params) -> tuple:
+        key = canonical_request_hash(self._model, messages, tool_schema, params)
+        if self._mode == CACHE_MODE_OFF:
+            return key, None
+        entry = self._cache.get(key)
+        if entry is not None:
+            self.hits += 1
+            self._logger.info("LLM response cache hit %s", key[:12])
+            return key, ChatAndToolResponse(
+                content=entry["content"],
+                tool_calls=entry["tool_calls"],
+                usage=entry.get("usage"),
+                model=entry.get("model"),
+            )
+        self.misses += 1
+        if self._mode == CACHE_MODE_REPLAY:
+            raise CacheMissError(f"No recorded response for request {key}")
+        return key, None
+
+    def _store(self, key: str, response: ChatAndToolResponse) -> None:
+        if self._mode == CACHE_MODE_RECORD and response is not None:
+            self._cache.put(key, response_to_entry(response))
+
+    def call_chat(self, messages: list, tool_schema: dict, **params):
+        key, cached = self._lookup(messages, tool_schema, params)
+        if cached is not None:
+            return cached
+        response = self._client.call_chat(messages=messages, tool_schema=tool_schema, **params)
+        self._store(key, response)
+        return response
+
+    def call_chat_stream(self, messages: list, tool_schema: dict, on_content=None, on_tool_call=None, **params):
+        key, cached = self._lookup(messages, tool_schema, params)
+        if cached is not None:
+            if on_content and cached.content:
+                on_content(cached.content)
+            for tool_call in (cached.tool_calls or []) if on_tool_call else []:
+                on_tool_call(tool_call)
+            return cached
+        response = self._client.call_chat_stream(
+            messages=messages,
+            tool_schema=tool_schema,
+            on_content=on_content,
+            on_tool_call=on_tool_call,
+            **params,
+        )
+        self._store(key, response)
+        return response
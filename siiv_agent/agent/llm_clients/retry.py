@@ -0,0 +1,346 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from agent.llm_clients.async_client_interface import AsyncLLMClientInterface
+from agent.llm_clients.client_interface import LLMClientInterface
+from agent.llm_clients.rate_limiter import parse_reset_duration
+
+LOGGER_NAME = __name__
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+# matched by name so this module does not need requests/openai/httpx to classify their errors
+_RETRYABLE_ERROR_NAMES = {
+    "APIConnectionError",
+    "APITimeoutError",
+    "ConnectionError",
+    "ConnectTimeout",
+    "ConnectError",
+    "ReadTimeout",
+    "ReadError",
+    "RemoteProtocolError",
+    "Timeout",
+    "TimeoutException",
+    "ChunkedEncodingError",
+}
+
+
+class LLMCallError(Exception):
+    """The inference server answered with a non-200 status."""
+
+    def __init__(self, status_code: int, body: str):
+        super().__init__(f"LLM call failed: {status_code} {body}")
+        self.status_code = status_code
+        self.body = body
+
+
+class LLMResponseError(Exception):
+    """The inference server answered 200 with a body we could not use."""
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, endpoint: str, retry_in: float):
+        super().__init__(f"Circuit for {endpoint} is open; retry in {retry_in:.1f}s")
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+
+@dataclass
+class AttemptFailure:
+    attempt: int
+    endpoint: str
+    kind: str
+    retryable: bool
+    status_code: Optional[int]
+    error: str
+    delay: Optional[float] = None
+
+
+class RetriesExhaustedError(Exception):
+    def __init__(self, failures: List[AttemptFailure]):
+        last = failures[-1]
+        super().__init__(
+            f"LLM call to {last.endpoint} failed after {len(failures)} attempts: {last.error}"
+        )
+        self.failures = failures
+
+
+@dataclass
+class ErrorClassification:
+    kind: str
+    retryable: bool
+    status_code: Optional[int] = None
+    retry_after: Optional[float] = None
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        response = getattr(error, "response", None)
+        status_code = getattr(response, "status_code", None)
+    return status_code if isinstance(status_code, int) else None
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        value = headers.get("retry-after") or headers.get("Retry-After")
+    except AttributeError:
+        return None
+    return parse_reset_duration(value) if value else None
+
+
+def classify_error(error: Exception) -> ErrorClassification:
+    """Decide whether an exception from a chat call is worth retrying."""
+    if isinstance(error, CircuitOpenError):
+        return ErrorClassification("circuit_open", True, retry_after=error.retry_in)
+    if isinstance(error, LLMResponseError):
+        return ErrorClassification("bad_response", True)
+
+    status_code = _status_code(error)
+    if status_code is not None:
+        kind = "rate_limited" if status_code == 429 else f"http_{status_code}"
+        return ErrorClassification(
+            kind,
+            status_code in RETRYABLE_STATUS_CODES or status_code >= 500,
+            status_code=status_code,
+            retry_after=_retry_after(error),
+        )
+
+    if isinstance(error, (ConnectionError, TimeoutError)) or any(
+        cls.__name__ in _RETRYABLE_ERROR_NAMES for cls in type(error).__mro__
+    ):
+        return ErrorClassification("connection", True)
+
+    return ErrorClassification(type(error).__name__, False)
+
+
+@dataclass
+class RetryPolicy:
+    max_attempts: int = 5
+    base_delay: float = 1.0
+    max_delay: float = 30.0
+
+    def delay_for(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Exponential backoff with full jitter; a server retry-after hint is a floor."""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+
+class CircuitBreaker:
+    """
+    Stops calling an endpoint after `failure_threshold` consecutive failures.
+
+    After `reset_timeout` seconds one trial call is let through (half-open);
+    success closes the circuit again, failure re-opens it.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.endpoint = endpoint
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._consecutive_failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self._clock() - self._opened_at >= self._reset_timeout:
+                return "half_open"
+            return "open"
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self._opened_at is None:
+                return
+            remaining = self._reset_timeout - (self._clock() - self._opened_at)
+            if remaining > 0 or self._trial_in_flight:
+                raise CircuitOpenError(self.endpoint, max(remaining, 0.0))
+            self._trial_in_flight = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._consecutive_failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._consecutive_failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._consecutive_failures >= self._failure_threshold:
+                self._opened_at = self._clock()
+                logging.getLogger(LOGGER_NAME).warning("Circuit for %s opened", self.endpoint)
+
+    def record_neutral(self) -> None:
+        """An attempt that says nothing about the endpoint's health (a 4xx, a cancelled hedge) only frees the trial slot."""
+        with self._lock:
+            self._trial_in_flight = False
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(endpoint: str, **kwargs) -> CircuitBreaker:
+    """Process-wide breaker for `endpoint`, shared by every client that calls it."""
+    with _breakers_lock:
+        if endpoint not in _breakers:
+            _breakers[endpoint] = CircuitBreaker(endpoint, **kwargs)
+        return _breakers[endpoint]
+
+
+def _after_failure(
+    error: Exception,
+    attempt: int,
+    policy: RetryPolicy,
+    breaker: CircuitBreaker,
+    failures: List[AttemptFailure],
+) -> float:
+    """Record a failed attempt; return the delay before the next one, or raise."""
+    classification = classify_error(error)
+    if classification.kind == "circuit_open":
+        pass
+    elif classification.retryable:
+        breaker.record_failure()
+    else:
+        # a bad request or a hedge we cancelled ourselves must not open the circuit
+        breaker.record_neutral()
+
+    failure = AttemptFailure(
+        attempt=attempt,
+        endpoint=breaker.endpoint,
+        kind=classification.kind,
+        retryable=classification.retryable,
+        status_code=classification.status_code,
+        error=str(error),
+    )
+    failures.append(failure)
+
+    if not classification.retryable:
+        raise error
+    if attempt >= policy.max_attempts:
+        raise RetriesExhaustedError(failures) from error
+
+    failure.delay = policy.delay_for(attempt, classification.retry_after)
+    logging.getLogger(LOGGER_NAME).warning("LLM call failed, retrying: %s", asdict(failure))
+    return failure.delay
+
+
+def call_with_retry(
+    call: Callable[[], Any],
+    policy: RetryPolicy,
+    breaker: CircuitBreaker,
+    sleep: Callable[[float], None] = time.sleep,
+) -> Any:
+    failures: List[AttemptFailure] = []
+    for attempt in range(1, policy.max_attempts + 1):
+        try:
+            breaker.before_call()
+            result = call()
+        except Exception as e:
+            sleep(_after_failure(e, attempt, policy, breaker, failures))
+            continue
+        breaker.record_success()
+        return result
+
+
+async def call_with_retry_async(
+    call: Callable[[], Any],
+    policy: RetryPolicy,
+    breaker: CircuitBreaker,
+) -> Any:
+    failures: List[AttemptFailure] = []
+    for attempt in range(1, policy.max_attempts + 1):
+        try:
+            breaker.before_call()
+            result = await call()
+        except Exception as e:
+            await asyncio.sleep(_after_failure(e, attempt, policy, breaker, failures))
+            continue
+        breaker.record_success()
+        return result
+
+
+def _endpoint_of(client: Any) -> str:
+    return getattr(client, "_url", None) or f"{type(client).__name__}:{getattr(client, '_model', '')}"
+
+
+class RetryingLLMClient(LLMClientInterface):
+    """Retries transient failures of another client with backoff, behind a per-endpoint circuit breaker."""
+
+    def __init__(self, client: LLMClientInterface, policy: Optional[RetryPolicy] = None):
+        self._client = client
+        self._policy = policy or RetryPolicy()
+        self._breaker = get_circuit_breaker(_endpoint_of(client))
+
+    def call_chat(self, messages: list, tool_schema: dict, **params):
+        return call_with_retry(
+            lambda: self._client.call_chat(messages=messages, tool_schema=tool_schema, **params),
+            self._policy,
+            self._breaker,
+        )
+
+    def call_chat_stream(self, messages: list, tool_schema: dict, on_content=None, on_tool_call=None, **params):
+        # a retried stream re-sends already emitted content to on_content
+        return call_with_retry(
+            lambda: self._client.call_chat_stream(
+                messages=messages,
+                tool_schema=tool_schema,
+                on_content=on_content,
+                on_tool_call=on_tool_call,
+                **params,
+            ),
+            self._policy,
+            self._breaker,
+        )
+
+
+class AsyncRetryingLLMClient(AsyncLLMClientInterface):
+    """RetryingLLMClient for AsyncLLMClientInterface clients."""
+
+    def __init__(self, client: AsyncLLMClientInterface, policy: Optional[RetryPolicy] = None):
+        self._client = client
+        self._policy = policy or RetryPolicy()
+        self._breaker = get_circuit_breaker(_endpoint_of(client))
+
+    async def call_chat(self, messages: list, tool_schema: dict, **params):
+        return await call_with_retry_async(
+            lambda: self._client.call_chat(messages=messages, tool_schema=tool_schema, **params),
+            self._policy,
+            self._breaker,
+        )
+
+    async def call_chat_stream(self, messages: list, tool_schema: dict, on_content=None, on_tool_call=None, **params):
+        return await call_with_retry_async(
+            lambda: self._client.call_chat_stream(
+                messages=messages,
+                tool_schema=tool_schema,
+                on_content=on_content,
+                on_tool_call=on_tool_call,
+                **params,
+            ),
+            self._policy,
+            self._breaker,
+        )
+
+    async def aclose(self):
+        await self._client.aclose()
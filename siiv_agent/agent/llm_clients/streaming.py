@@ -0,0 +1,157 @@
+import json
+import logging
+import time
+from dataclasses import dataclass
+from typing import (Any, Callable, Dict, Iterable, Iterator, List, Optional,
+                    Tuple)
+
+LOGGER_NAME = __name__
+
+
+@dataclass
+class StreamMetrics:
+    time_to_first_token: Optional[float]
+    total_seconds: float
+    completion_tokens: int
+    tokens_per_second: Optional[float]
+
+
+class StreamAccumulator:
+    """
+    Assembles OpenAI-format chat completion chunks (dicts) into a full response.
+
+    `on_content` receives each content delta as it arrives. `on_tool_call`
+    receives each tool call (OpenAI dict format) as soon as it is complete,
+    i.e. when the model moves on to the next tool call or the stream ends.
+    """
+
+    def __init__(
+        self,
+        on_content: Optional[Callable[[str], None]] = None,
+        on_tool_call: Optional[Callable[[Dict[str, Any]], None]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._on_content = on_content
+        self._on_tool_call = on_tool_call
+        self._clock = clock
+        self._started_at = clock()
+        self._first_token_at: Optional[float] = None
+        self._content_parts: List[str] = []
+        self._tool_calls: Dict[int, Dict[str, Any]] = {}
+        self._emitted: set = set()
+        self._delta_count = 0
+        self._usage_completion_tokens: Optional[int] = None
+        self.usage: Optional[Dict[str, Any]] = None
+
+    def add_chunk(self, chunk: Dict[str, Any]) -> None:
+        usage = chunk.get("usage")
+        if usage:
+            self.usage = usage
+        if usage and usage.get("completion_tokens") is not None:
+            self._usage_completion_tokens = usage["completion_tokens"]
+
+        for choice in chunk.get("choices") or []:
+            delta = choice.get("delta") or {}
+            content = delta.get("content")
+            if content:
+                self._mark_token()
+                self._content_parts.append(content)
+                if self._on_content:
+                    self._on_content(content)
+            for tool_call_delta in delta.get("tool_calls") or []:
+                self._mark_token()
+                self._add_tool_call_delta(tool_call_delta)
+
+    def _mark_token(self) -> None:
+        self._delta_count += 1
+        if self._first_token_at is None:
+            self._first_token_at = self._clock()
+
+    def _add_tool_call_delta(self, tool_call_delta: Dict[str, Any]) -> None:
+        index = tool_call_delta.get("index", 0)
+        if index not in self._tool_calls:
+            # a new tool call means every earlier one is finished
+            for earlier in sorted(self._tool_calls):
+                self._emit(earlier)
+            self._tool_calls[index] = {
+                "id": None,
+                "type": "function",
+                "function": {"name": "", "arguments": ""},
+            }
+
+        tool_call = self._tool_calls[index]
+        if tool_call_delta.get("id"):
+            tool_call["id"] = tool_call_delta["id"]
+        function_delta = tool_call_delta.get("function") or {}
+        if function_delta.get("name"):
+            tool_call["function"]["name"] += function_delta["name"]
+        if function_delta.get("arguments"):
+            tool_call["function"]["arguments"] += function_delta["arguments"]
+
+    def _emit(self, index: int) -> None:
+        if index in self._emitted:
+            return
+        self._emitted.add(index)
+        if self._on_tool_call:
+            self._on_tool_call(self._tool_calls[index])
+
+    def finish(self) -> Tuple[Optional[str], Optional[List[Dict[str, Any]]], StreamMetrics]:
+        for index in sorted(self._tool_calls):
+            self._emit(index)
+
+        finished_at = self._clock()
+        completion_tokens = (
+            self._usage_completion_tokens
+            if self._usage_completion_tokens is not None
+            else self._delta_count
+        )
+        tokens_per_second = None
+        if self._first_token_at is not None and finished_at > self._first_token_at:
+            tokens_per_second = completion_tokens / (finished_at - self._first_token_at)
+
+        metrics = StreamMetrics(
+            time_to_first_token=(
+                self._first_token_at - self._started_at
+                if self._first_token_at is not None
+                else None
+            ),
+            total_seconds=finished_at - self._started_at,
+            completion_tokens=completion_tokens,
+            tokens_per_second=tokens_per_second,
+        )
+        logging.getLogger(LOGGER_NAME).info(
+            "stream finished: ttft=%s total=%.2fs tokens=%d tokens/s=%s",
+            f"{metrics.time_to_first_token:.2f}s" if metrics.time_to_first_token is not None else "n/a",
+            metrics.total_seconds,
+            metrics.completion_tokens,
+            f"{tokens_per_second:.1f}" if tokens_per_second is not None else "n/a",
+        )
+
+        content = "".join(self._content_parts) or None
+        tool_calls = [self._tool_calls[index] for index in sorted(self._tool_calls)] or None
+        return content, tool_calls, metrics
+
+
+SSE_DONE = "[DONE]"
+
+
+def decode_sse_line(line: Any) -> Optional[Any]:
+    """Return the chunk dict of a `data: {...}` line, SSE_DONE at the end, else None."""
+    if isinstance(line, bytes):
+        line = line.decode("utf-8")
+    if not line or not line.startswith("data:"):
+        return None
+    data = line[len("data:") :].strip()
+    if data == SSE_DONE:
+        return SSE_DONE
+    return json.loads(data)
+
+
+def iter_sse_chunks(lines: Iterable[Any]) -> Iterator[Dict[str, Any]]:
+    """Decode `data: {...}` server-sent-event lines into chunk dicts, stopping at [DONE]."""
+    for line in lines:
+        chunk = decode_sse_line(line)
+        if chunk is SSE_DONE:
+            return
+        if chunk is not None:
+            yield chunk
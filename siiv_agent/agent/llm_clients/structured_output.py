@@ -0,0 +1,123 @@
+import copy
+import json
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from agent.llm_clients.retry import LLMResponseError
+
+STEP_SCHEMA_NAME = "agent_step"
+
+# JSON-schema keywords the constrained decoders reject
+_UNSUPPORTED_KEYWORDS = ("default",)
+
+
+class StructuredOutputError(LLMResponseError):
+    pass
+
+
+def _parameters(function: Dict[str, Any]) -> Dict[str, Any]:
+    parameters = function.get("parameters")
+    if parameters is None and "properties" in function:
+        # tolerate schemas that put properties/required next to the function name
+        parameters = {"type": "object", "properties": function["properties"], "required": function.get("required", [])}
+    return parameters or {"type": "object", "properties": {}}
+
+
+def strict_parameters(parameters: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Make an object schema acceptable to strict decoding: every property
+    required, no additional properties. Optional properties become nullable;
+    callers drop null arguments before invoking the tool.
+    """
+    parameters = copy.deepcopy(parameters)
+    properties = parameters.get("properties", {})
+    optional = set(properties) - set(parameters.get("required", []))
+    for name, prop in properties.items():
+        for keyword in _UNSUPPORTED_KEYWORDS:
+            prop.pop(keyword, None)
+        if name in optional and "type" in prop:
+            prop["type"] = [prop["type"], "null"] if isinstance(prop["type"], str) else [*prop["type"], "null"]
+    parameters["type"] = "object"
+    parameters["properties"] = properties
+    parameters["required"] = list(properties)
+    parameters["additionalProperties"] = False
+    return parameters
+
+
+def strict_tool_schema(tool_schema: List[dict]) -> List[dict]:
+    """OpenAI tool definitions with `strict: true`, so the API only generates arguments matching the schema."""
+    strict_tools = []
+    for tool in tool_schema:
+        function = {
+            key: value
+            for key, value in tool["function"].items()
+            if key not in ("parameters", "properties", "required")
+        }
+        function["parameters"] = strict_parameters(_parameters(tool["function"]))
+        function["strict"] = True
+        strict_tools.append({"type": "function", "function": function})
+    return strict_tools
+
+
+def step_schema(tool_schema: List[dict]) -> Dict[str, Any]:
+    """
+    JSON schema for one agent step in plain-text chat: a message plus either a
+    call to one of the tools (name and arguments checked against that tool's
+    parameters) or null when the model wants to talk to the user.
+    """
+    tool_variants = [
+        {
+            "type": "object",
+            "properties": {
+                "name": {"type": "string", "enum": [tool["function"]["name"]]},
+                "arguments": strict_parameters(_parameters(tool["function"])),
+            },
+            "required": ["name", "arguments"],
+            "additionalProperties": False,
+        }
+        for tool in tool_schema
+    ]
+    return {
+        "type": "object",
+        "properties": {
+            "message": {"type": "string"},
+            "tool_call": {"anyOf": [*tool_variants, {"type": "null"}]},
+        },
+        "required": ["message", "tool_call"],
+        "additionalProperties": False,
+    }
+
+
+def step_response_format(tool_schema: List[dict]) -> Dict[str, Any]:
+    """response_format for OpenAI-compatible servers (LM Studio, llama.cpp) that decode against a JSON schema."""
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": STEP_SCHEMA_NAME, "strict": True, "schema": step_schema(tool_schema)},
+    }
+
+
+def parse_step(content: str) -> Tuple[Optional[str], Optional[List[Dict[str, Any]]]]:
+    """Turn a schema-constrained step into (message, tool_calls in OpenAI dict format)."""
+    try:
+        step = json.loads(content)
+        message = step.get("message") or None
+        tool_call = step.get("tool_call")
+    except (json.JSONDecodeError, TypeError, AttributeError) as e:
+        raise StructuredOutputError(f"Structured step is not valid JSON: {e}") from e
+    if not tool_call:
+        return message, None
+    return message, [
+        {
+            "id": str(uuid.uuid4()),
+            "type": "function",
+            "function": {
+                "name": tool_call["name"],
+                "arguments": json.dumps(tool_call.get("arguments") or {}),
+            },
+        }
+    ]
+
+
+def drop_null_arguments(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """Strict schemas send omitted optional arguments as null; let the tool's defaults apply instead."""
+    return {key: value for key, value in arguments.items() if value is not None}
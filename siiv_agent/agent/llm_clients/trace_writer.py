@@ -0,0 +1,151 @@
+import atexit
+import datetime
+import gzip
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from agent.llm_clients.response_cache import canonical_request_hash, to_jsonable
+
+LOGGER_NAME = __name__
+
+DEFAULT_TRACE_DIR = ".llm_traces"
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+_STOP = object()
+
+
+class TraceWriter:
+    """
+    Records LLM calls to size-rotated, gzip-compressed JSONL files.
+
+    record() only puts the call on a queue; hashing, serializing and
+    compressing happen on a background thread, off the request path. Each
+    line holds latency, token usage and a hash of the request; the full
+    request and response are included only when `capture_payloads` is on.
+    """
+
+    def __init__(
+        self,
+        directory: str = DEFAULT_TRACE_DIR,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        capture_payloads: bool = True,
+    ):
+        self._directory = Path(directory)
+        self._max_bytes = max_bytes
+        self._capture_payloads = capture_payloads
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._raw_handle = None
+        self._handle = None
+        self._logger = logging.getLogger(LOGGER_NAME)
+        self._thread = threading.Thread(target=self._run, name="llm-trace-writer", daemon=True)
+        self._thread.start()
+
+    def record(
+        self,
+        client: str,
+        model: str,
+        messages: list,
+        tool_schema: Any,
+        response: Any,
+        latency_seconds: float,
+        usage: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+    ) -> None:
+        self._queue.put(
+            {
+                "ts": time.time(),
+                "client": client,
+                "model": model,
+                # copy: the caller keeps appending to its message list
+                "messages": list(messages),
+                "tool_schema": tool_schema,
+                "response": response,
+                "latency_seconds": latency_seconds,
+                "usage": usage,
+                "error": error,
+            }
+        )
+
+    def close(self) -> None:
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                self._close_file()
+                return
+            try:
+                self._write(self._to_line(item))
+                if self._queue.empty() and self._handle:
+                    self._handle.flush()
+            except Exception as e:
+                self._logger.error("Failed to write LLM trace: %s", e)
+
+    def _to_line(self, item: Dict[str, Any]) -> str:
+        messages = item.pop("messages")
+        tool_schema = item.pop("tool_schema")
+        response = item.pop("response")
+        item["request_ref"] = canonical_request_hash(item["model"], messages, tool_schema, {})
+        item["message_count"] = len(messages)
+        if self._capture_payloads:
+            item["request"] = {"messages": messages, "tools": tool_schema}
+            item["response"] = response
+        return json.dumps(item, default=to_jsonable) + "\n"
+
+    def _write(self, line: str) -> None:
+        if self._handle is None or self._raw_handle.tell() >= self._max_bytes:
+            self._open_new_file()
+        self._handle.write(line.encode("utf-8"))
+
+    def _open_new_file(self) -> None:
+        self._close_file()
+        self._directory.mkdir(parents=True, exist_ok=True)
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        path = self._directory / f"llm_trace_{timestamp}_{os.getpid()}.jsonl.gz"
+        # rotated by size rather than closed per write; _close_file() releases it
+        self._raw_handle = open(path, "wb")  # noqa: SIM115
+        self._handle = gzip.GzipFile(fileobj=self._raw_handle, mode="wb")
+
+    def _close_file(self) -> None:
+        if self._handle:
+            self._handle.close()
+            self._raw_handle.close()
+            self._handle = None
+            self._raw_handle = None
+
+
+_trace_writer: Optional[TraceWriter] = None
+_trace_writer_lock = threading.Lock()
+
+
+def get_trace_writer() -> Optional[TraceWriter]:
+    """
+    Process-wide TraceWriter configured from the environment, or None when
+    SIIV_TRACE=0. SIIV_TRACE_PAYLOADS=0 keeps only metadata, no messages.
+    """
+    global _trace_writer
+    if os.getenv("SIIV_TRACE", "1") == "0":
+        return None
+    with _trace_writer_lock:
+        if _trace_writer is None:
+            _trace_writer = TraceWriter(
+                directory=os.getenv("SIIV_TRACE_DIR", DEFAULT_TRACE_DIR),
+                capture_payloads=os.getenv("SIIV_TRACE_PAYLOADS", "1") != "0",
+            )
+            atexit.register(_trace_writer.close)
+        return _trace_writer
+
+
+def trace_llm_call(**kwargs) -> None:
+    """TraceWriter.record on the shared writer, if tracing is enabled."""
+    trace_writer = get_trace_writer()
+    if trace_writer is not None:
+        trace_writer.record(**kwargs)
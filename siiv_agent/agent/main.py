@@ -1,93 +1,81 @@
-import datetime
-import json
+import argparse
+import asyncio
 import logging
-import pprint
-import re
+import os
 import sys
-import uuid
-from typing import Any, Dict
-
-import demjson3
-
-from agent.llm_clients.llm_client import LLMClient
+import time
+from typing import Optional
+
+from agent.agent_session import AgentSession, run_batch_task
+from agent.batch_runner import load_tasks, run_batch
+from agent.llm_clients.async_open_ai_client import AsyncOpenAiClient
+from agent.llm_clients.chat_response import ChatAndToolResponse
+from agent.llm_clients.client_interface import LLMClientInterface
+from agent.llm_clients.hedging import HedgingLLMClient
+from agent.llm_clients.model_router import TIER_LARGE, TIER_SMALL, ModelRouter
 from agent.llm_clients.open_ai_client import OpenAiClient
-from agent.prompts import get_system_message, get_user_task_message
-from agent.tools.finish_task_tool import TaskCompleteError
-from agent.tools.tool_manager import ToolManager
-
-llm_client = LLMClient()
-llm_client = OpenAiClient()
-
-LOGGER_NAME = __name__
-
-logger = logging.getLogger(LOGGER_NAME)
-
+from agent.llm_clients.response_cache import (CACHE_MODE_OFF,
+                                              CachingLLMClient,
+                                              DiskResponseCache)
+from agent.llm_clients.retry import (AsyncRetryingLLMClient, RetryingLLMClient,
+                                     RetryPolicy)
+from agent.session_log import DEFAULT_SESSION_DIR, SessionLog, new_session_id
 
-class BadToolRequestError(Exception):
-    pass
+# "record" serves repeated requests from disk, "replay" also fails on anything not recorded
+LLM_CACHE_MODE = os.getenv("SIIV_LLM_CACHE_MODE", CACHE_MODE_OFF)
 
+SMALL_MODEL = os.getenv("SIIV_SMALL_MODEL", "gpt-4o-mini")
+LARGE_MODEL = os.getenv("SIIV_LARGE_MODEL", "gpt-4o")
 
-class NoToolRequestError(Exception):
-    pass
+# schema-constrained tool calls, so replies never need a "your tool call was not valid json" round trip
+STRUCTURED_OUTPUT = os.getenv("SIIV_STRUCTURED_OUTPUT", "1") != "0"
 
+# every session is logged as it runs, so `--resume <session_id>` can continue it after a crash or Ctrl-C
+SESSION_LOG = os.getenv("SIIV_SESSION_LOG", "1") != "0"
+SESSION_DIR = os.getenv("SIIV_SESSION_DIR", DEFAULT_SESSION_DIR)
 
-class InvalidCommandJson(Exception):
-    pass
 
+def build_llm_client(model: str) -> LLMClientInterface:
+    llm_client = OpenAiClient(model=model, strict_tools=STRUCTURED_OUTPUT)
+    if os.getenv("SIIV_LLM_HEDGE", "0") != "0":
+        # a duplicate request to the same API usually lands on a different, less loaded replica
+        llm_client = HedgingLLMClient(
+            llm_client, OpenAiClient(model=model, strict_tools=STRUCTURED_OUTPUT)
+        )
+    # transient 429/5xx/connection errors are retried instead of ending the session
+    llm_client = RetryingLLMClient(
+        llm_client,
+        policy=RetryPolicy(max_attempts=int(os.getenv("SIIV_LLM_MAX_ATTEMPTS", "5"))),
+    )
+    if LLM_CACHE_MODE != CACHE_MODE_OFF:
+        llm_client = CachingLLMClient(
+            llm_client,
+            cache=DiskResponseCache(os.getenv("SIIV_LLM_CACHE_DIR", ".llm_cache")),
+            mode=LLM_CACHE_MODE,
+            model=model,
+        )
+    return llm_client
 
-def parse_tool_request_to_llm_format(text: str) -> dict:
-    """
-    Converts the last TOOL_REQUEST block into an LLM-style tool call dict.
-
-    Args:
-        text (str): The input string with [TOOL_REQUEST] JSON block.
-
-    Returns:
-        ... dict: Tool call in LLM function format.
-    """
-    logger = logging.getLogger(LOGGER_NAME)
-    logger.info("looking for TOOL_REQUEST block in text")
-
-    end_idx = text.find("[END_TOOL_REQUEST]")
-    if end_idx == -1:
-        end_idx = text.rfind("[/TOOL_REQUEST]")
 
-    if end_idx == -1:
-        logger.info("No END_TOOL_REQUEST tag found")
-        raise NoToolRequestError("Missing [END_TOOL_REQUEST] tag")
+llm_client = build_llm_client(SMALL_MODEL)
 
-    start_tag = "[TOOL_REQUEST]"
-    start_idx = text.rfind(start_tag, 0, end_idx)
-    if start_idx == -1:
-        logger.info("No TOOL_REQUEST tag found before END_TOOL_REQUEST")
-        raise BadToolRequestError(
-            "Missing [TOOL_REQUEST] tag before [/END_TOOL_REQUEST]"
-        )
+# small model for routine turns, large one for planning and recovering from mistakes
+model_router: Optional[ModelRouter] = None
+if os.getenv("SIIV_MODEL_ROUTING", "0") != "0":
+    model_router = ModelRouter(
+        {TIER_SMALL: llm_client, TIER_LARGE: build_llm_client(LARGE_MODEL)}
+    )
 
-    block = text[start_idx + len(start_tag) : end_idx].strip()
-    logger.info("We are trying to parse a tool request: %s", block)
-    block = re.sub(r"\s*({", "{", block)  # Allow optional whitespace before '{'
+LOGGER_NAME = __name__
 
-    # Log the content of block for debugging
-    logger.info("Content of block before parsing: %s", block)
+# print the model's reply as it is generated instead of waiting for all of it
+STREAM_RESPONSES = True
 
-    try:
-        logger.info("Attempting to parse json block: %s", block)
-        raw_json = demjson3.decode(block)
-    except Exception as e:
-        logger.error("Failed to parse TOOL_REQUEST JSON: %s", block)
-        raise InvalidCommandJson(f"Invalid json provided for tool request: {e}")
+logger = logging.getLogger(LOGGER_NAME)
 
-    tool_call = {
-        "id": str(uuid.uuid4()),
-        "function": {
-            "name": raw_json["name"],
-            "arguments": json.dumps(raw_json["arguments"]),
-        },
-    }
 
-    logger.info("Found tool call: %s", tool_call)
-    return tool_call
+def print_stream_delta(text: str) -> None:
+    print(text, end="", flush=True)
 
 
 def write_contents_to_file(filepath: str, content: str) -> str:
@@ -98,151 +86,113 @@ def write_contents_to_file(filepath: str, content: str) -> str:
 
 def handle_pytest_query(query_text: str, current_working_dir: str):
 
-    # related_code_chunks = vector_client.retrieve(query_text=query_text, top_k=10)
-    # context_string = vector_client.build_context_string(code_chunks=related_code_chunks)
-
-    current_time = datetime.datetime.now()
-
-    messages = [
-        get_system_message(
-            full_current_working_dir=current_working_dir,
-            default_shell="bin/zsh",
-            home_dir="/Users/matthewflood",
-            operating_system="macOS",
-        ),
-        get_user_task_message(
-            task=query_text,
-            full_current_working_dir=current_working_dir,
-            current_time=current_time,
-        ),
-    ]
-
-    tool_manager = ToolManager.default(root_dir=current_working_dir)
-    tool_schema = tool_manager.get_tools_schema_list()
-
-    logger.info("----------- START INVOCATION -------------")
-    for message in messages:
-        logger.info(
-            "------- %s message %s ------",
-            message["role"],
-            message.get("tool_call_id", ""),
-        )
-        pprint.pprint(message)
-
-    logger.info("----------- END INVOCATION -------------")
-
+    session_log = None
+    if SESSION_LOG:
+        session_log = SessionLog(SESSION_DIR, new_session_id())
+        session_log.start(query_text, current_working_dir)
+    session = AgentSession(
+        query_text=query_text,
+        current_working_dir=current_working_dir,
+        session_log=session_log,
+    )
+    session.log_invocation()
+    return run_session(session)
+
+
+def resume_pytest_query(session_id: str):
+    """Continue a logged session from its last completed step."""
+    session_log = SessionLog(SESSION_DIR, session_id)
+    replay = session_log.load()
+    if replay.finished:
+        logger.info("Session %s already finished", session_id)
+        return replay.final_message
+
+    session = AgentSession(
+        query_text=replay.query_text,
+        current_working_dir=replay.current_working_dir,
+        session_log=session_log,
+    )
+    session.restore(replay)
+    logger.info(
+        "Resuming session %s at turn %d with %d messages",
+        session_id,
+        session.turn,
+        len(session.messages),
+    )
+    if replay.pending_response is not None:
+        # the model already answered; only its tool calls have to be run again
+        logger.info("Re-applying the logged reply of turn %d", session.turn + 1)
+        if session.handle_response(ChatAndToolResponse(**replay.pending_response)):
+            session.close()
+            return session.final_message
+    if session.waiting_for_user:
+        session.add_user_input(read_user_input(session.messages[-1].get("content")))
+    return run_session(session)
+
+
+def read_user_input(agent_message: Optional[str]) -> str:
+    print(agent_message)
+
+    print(
+        "\n***** The agent is waiting for a response from you. Press Ctrl-D or Ctrl-Z (Windows) when done.)\n"
+    )
+    user_input = sys.stdin.read()
+
+    print("proceeding...")
+    return user_input
+
+
+def run_session(session: AgentSession):
+    try:
+        return _run_session(session)
+    except KeyboardInterrupt:
+        if session.session_log is not None:
+            print(f"\nInterrupted. Continue with --resume {session.session_log.session_id}")
+        raise
+    finally:
+        session.close()
+        if session.session_log is not None:
+            session.session_log.close()
+
+
+def _run_session(session: AgentSession):
     while True:
 
-        chat_and_tool_response = llm_client.call_chat(
-            messages=messages,
-            tool_schema=tool_schema,
-        )
+        session.compact_history()
 
-        tool_calls = []
-        if chat_and_tool_response.tool_calls:
-            tool_calls = chat_and_tool_response.tool_calls
-            logger.info(
-                "The LLM response included %d explicit tool calls", len(tool_calls)
+        client = llm_client
+        if model_router is not None:
+            tier, reason, client = model_router.choose(session.routing_signals())
+
+        started = time.monotonic()
+        if STREAM_RESPONSES:
+            chat_and_tool_response = client.call_chat_stream(
+                messages=session.messages,
+                tool_schema=session.tool_schema,
+                on_content=print_stream_delta,
             )
-            logger.info("Processing %d tool calls", len(tool_calls))
-            assistant_message = {
-                "role": "assistant",
-                "tool_calls": chat_and_tool_response.tool_calls,
-            }
-            logger.info(assistant_message)
-            messages.append(assistant_message)
-
-            for tool_call in tool_calls:
-                logger.info("tool call: %s", tool_call)
-
-                # open ai
-                if True:
-                    tool_call_id = tool_call.id
-                    tool_call_function_name = tool_call.function.name
-                    tool_call_args = json.loads(tool_call.function.arguments)
-                # lm-studio
-                else:
-                    tool_call_id = tool_call["id"]
-                    tool_call_function_name = tool_call["function"]["name"]
-                    tool_call_args = json.loads(tool_call["function"]["arguments"])
-                logger.info(
-                    "Invoking tool: %s with args: %s",
-                    tool_call_function_name,
-                    tool_call_args,
-                )
-
-                try:
-                    result = tool_manager.execute_tool_by_name(
-                        tool_call_function_name, tool_call_args
-                    )
-                except TaskCompleteError as e:
-                    logger.info("Got TaskComplete!!")
-                    logger.info("Final message: %s", e)
-                    return
-
-                if result is None:
-                    tool_response_message = {
-                        "role": "tool",
-                        "name": tool_call_function_name,
-                        "tool_call_id": tool_call_id,
-                        "content": f"Tool '{tool_call_function_name}' not found.",
-                    }
-                else:
-                    tool_response_message = {
-                        "role": "tool",
-                        "name": tool_call_function_name,
-                        "tool_call_id": tool_call_id,
-                        "content": result.to_llm_message(),
-                    }
-                logger.info(tool_response_message)
-                messages.append(tool_response_message)
         else:
-            try:
-                tool_call = parse_tool_request_to_llm_format(
-                    text=chat_and_tool_response.content
-                )
-                tool_calls = [tool_call]
-            except NoToolRequestError:
-                logger.error("Got a message without a tool")
-                message = {
-                    "role": "assistant",
-                    "content": chat_and_tool_response.content,
-                }
-                messages.append(message)
-
-                print(chat_and_tool_response.content)
-
-                print(
-                    "\n***** The agent is waiting for a response from you. Press Ctrl-D or Ctrl-Z (Windows) when done.)\n"
-                )
-                user_input = sys.stdin.read()
-
-                print("proceeding...")
-                message = {"role": "user", "content": user_input}
-                messages.append(message)
-
-            except BadToolRequestError as e:
-                message = {
-                    "role": "user",
-                    "text": f"Your call was not formatted correctly. You must make a valid tool call. Error: {e}",
-                }
-                logger.error(message)
-                messages.append(message)
-            except InvalidCommandJson as e:
-
-                message = {
-                    "role": "assistant",
-                    "content": chat_and_tool_response.content,
-                }
-                logger.error(message)
-                messages.append(message)
-
-                message = {
-                    "role": "user",
-                    "content": f"Your tool call was not valid json. Error: {e}",
-                }
-                logger.error(message)
-                messages.append(message)
+            chat_and_tool_response = client.call_chat(
+                messages=session.messages,
+                tool_schema=session.tool_schema,
+            )
+
+        latency = time.monotonic() - started
+        call_record = session.record_llm_call(chat_and_tool_response, latency)
+        if model_router is not None:
+            model_router.record(tier, reason, latency, call_record.cost_usd)
+
+        if session.handle_response(chat_and_tool_response):
+            print(session.metrics.format_table())
+            logger.info("Tool call repair: %s", session.tool_call_repairer.stats())
+            if session.tool_manager.result_cache is not None:
+                logger.info("Tool result cache: %s", session.tool_manager.result_cache.stats())
+            if model_router is not None:
+                model_router.log_summary()
+            return session.final_message
+
+        if session.waiting_for_user:
+            session.add_user_input(read_user_input(chat_and_tool_response.content))
 
 
 if __name__ == "__main__":
@@ -250,6 +200,45 @@ if __name__ == "__main__":
 
     init_logging()
 
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--resume",
+        metavar="SESSION_ID",
+        help=f"continue a logged session from {SESSION_DIR}",
+    )
+    parser.add_argument(
+        "--batch",
+        metavar="TASKS_JSONL",
+        help="run the tasks in this file headless; one JSON object per line with prompt and working_dir",
+    )
+    parser.add_argument("--output", default="batch_results.jsonl", help="where --batch writes its results")
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent --batch sessions")
+    parser.add_argument("--timeout", type=float, help="default per-task timeout in seconds")
+    parser.add_argument("--max-steps", type=int, help="default per-task budget of model replies")
+    args = parser.parse_args()
+    if args.resume:
+        resume_pytest_query(args.resume)
+        sys.exit(0)
+    if args.batch:
+        async_llm_client = AsyncRetryingLLMClient(
+            AsyncOpenAiClient(model=SMALL_MODEL),
+            policy=RetryPolicy(max_attempts=int(os.getenv("SIIV_LLM_MAX_ATTEMPTS", "5"))),
+        )
+        asyncio.run(
+            run_batch(
+                load_tasks(args.batch),
+                lambda task: run_batch_task(
+                    task,
+                    async_llm_client,
+                    default_timeout=args.timeout,
+                    default_max_steps=args.max_steps,
+                ),
+                output_path=args.output,
+                concurrency=args.concurrency,
+            )
+        )
+        sys.exit(0)
+
     if False:
         current_working_dir = (
             "/Users/matthewflood/workspace/language_mirror/Language Mirror"
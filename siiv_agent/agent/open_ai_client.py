@@ -1,15 +1,16 @@
-import json
 import logging
 import os
 import pprint
 import time
-from datetime import datetime
 from typing import List
 
 from dotenv import load_dotenv
 from openai import OpenAI
 
 from agent.llm_client import ChatAndToolResponse
+from agent.llm_clients.chat_response import create_completion
+from agent.llm_clients.rate_limiter import get_shared_rate_limiter
+from agent.llm_clients.trace_writer import trace_llm_call
 
 LOGGER_NAME = __name__
 
@@ -26,11 +27,13 @@ class OpenAiClient:
         self._model = "gpt-4o-mini"
         self._max_tokens = 8192
         self._temperature = 0.8
+        # shared by every client for this model in the process
+        self._rate_limiter = get_shared_rate_limiter(f"openai:{self._model}")
 
     def call_chat(self, messages: List[dict], tool_schema=List[dict]):
 
-        time.sleep(5)
-        response = self._client.chat.completions.create(
+        started = time.monotonic()
+        response = self._create_completion(
             model=self._model,
             messages=messages,
             temperature=self._temperature,
@@ -38,13 +41,15 @@ class OpenAiClient:
             tool_choice="auto",
         )
 
-        now = datetime.now()
-        timestamp = now.strftime("%Y%m%d_%H%M%S") + f"_{now.microsecond // 1000:03d}"
-
-        with open(f"_openai_response_{timestamp}.log", "w", encoding="utf-8") as handle:
-
-            as_string = json.dumps(response.to_json(), indent=2)
-            handle.write(as_string)
+        trace_llm_call(
+            client="openai",
+            model=self._model,
+            messages=messages,
+            tool_schema=tool_schema,
+            response=response,
+            latency_seconds=time.monotonic() - started,
+            usage=response.usage.model_dump() if response.usage else None,
+        )
 
         try:
             choice = response.choices[0]
@@ -55,6 +60,12 @@ class OpenAiClient:
             self._logger.error("Error parsing response: %s", e)
             raise
 
+    def _create_completion(self, **kwargs):
+        """Call the chat completions API, waiting only if a known rate limit requires it."""
+        return create_completion(
+            self._rate_limiter, self._client.chat.completions.with_raw_response.create, **kwargs
+        )
+
 
 if __name__ == "__main__":
 
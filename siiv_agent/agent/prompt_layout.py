@@ -0,0 +1,39 @@
+import hashlib
+import json
+import logging
+from typing import Any, Dict, List
+
+LOGGER_NAME = __name__
+
+
+def canonicalize_tool_schema(tool_schema: List[dict]) -> List[dict]:
+    """
+    Tool schemas sorted by function name with every dict's keys sorted, so the
+    serialized tools block is byte-identical however the tools were built.
+    """
+    canonical = json.loads(json.dumps(tool_schema, sort_keys=True))
+    return sorted(canonical, key=lambda tool: tool.get("function", {}).get("name", ""))
+
+
+def canonicalize_message(message: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalize line endings and trailing whitespace of a text message."""
+    content = message.get("content")
+    if not isinstance(content, str):
+        return message
+    lines = content.replace("\r\n", "\n").split("\n")
+    return {**message, "content": "\n".join(line.rstrip() for line in lines).strip() + "\n"}
+
+
+def prefix_fingerprint(prefix_messages: List[Dict[str, Any]], tool_schema: List[dict]) -> str:
+    """Short hash of the cacheable prefix; when it changes between sessions, provider caches miss."""
+    payload = json.dumps({"tools": tool_schema, "messages": prefix_messages}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:12]
+
+
+def log_prefix(prefix_messages: List[Dict[str, Any]], tool_schema: List[dict]) -> None:
+    logging.getLogger(LOGGER_NAME).info(
+        "Stable prompt prefix %s (%d tools, %d messages)",
+        prefix_fingerprint(prefix_messages, tool_schema),
+        len(tool_schema),
+        len(prefix_messages),
+    )
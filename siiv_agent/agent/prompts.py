@@ -38,8 +38,16 @@ def get_current_working_dir_filelist(full_current_working_dir: str) -> str:
 
 
 def get_user_task_message(
-    task: str, full_current_working_dir: str, current_time: datetime.datetime
+    task: str,
+    full_current_working_dir: str,
+    current_time: datetime.datetime,
+    stable_prefix_first: bool = False,
 ):
+    """
+    With `stable_prefix_first`, the parts that are the same for every session in
+    a directory (cwd and file listing) come first and the task and time last, so
+    provider prompt caches can reuse everything up to the task.
+    """
 
     formatted_current_time = current_time.strftime("%Y-%m-%d %H:%M:%S")
 
@@ -47,6 +55,27 @@ def get_user_task_message(
         full_current_working_dir
     )
 
+    if stable_prefix_first:
+        env_details = textwrap.dedent(
+            f"""
+        Current working directory: {full_current_working_dir}
+        Current working directory filelist: {current_working_dir_filelist}
+        """
+        )
+        return {
+            "role": "user",
+            "content": [
+                {
+                    "type": "text",
+                    "text": f"<environment_details>\n{env_details}\n</environment_details>",
+                },
+                {
+                    "type": "text",
+                    "text": f"<task>\n{task}\n</task>\nCurrent time: {formatted_current_time}",
+                },
+            ],
+        }
+
     env_details = textwrap.dedent(
         f"""
     Current working directory: {full_current_working_dir}
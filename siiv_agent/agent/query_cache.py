@@ -0,0 +1,93 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+LOGGER_NAME = __name__
+
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_TTL_SECONDS = 15 * 60
+
+
+def normalize_query(query_text: str) -> str:
+    """Lowercase and collapse whitespace so trivially different queries share an entry."""
+    return " ".join(query_text.lower().split())
+
+
+def make_cache_key(
+    query_text: str,
+    top_k: int,
+    filters: Optional[Dict[str, Any]],
+    index_version: Hashable,
+) -> Tuple:
+    filter_key = repr(sorted(filters.items())) if filters else ""
+    return (normalize_query(query_text), top_k, filter_key, index_version)
+
+
+class QueryResultCache:
+    """
+    Thread-safe LRU cache with a per-entry TTL for vector query results.
+
+    Keys should include an index version that changes on every write (see
+    make_cache_key), so stale results are never served after the index changes;
+    old-version entries simply age out of the LRU.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+    ):
+        self._max_entries = max_entries
+        self._ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._logger = logging.getLogger(LOGGER_NAME)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self._ttl_seconds:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -1,12 +1,11 @@
+import chromadb
 import requests
 from chromadb.config import Settings
+from embedding import EMBEDDING_MODEL, LM_STUDIO_ENDPOINT
+from embedding_collections import get_or_create_model_collection
 
 # Configuration
-LM_STUDIO_ENDPOINT = "http://localhost:1234/v1/embeddings"  # Adjust port if needed
 CHUNK_TEXT = "This is a sample chunk of text to embed using LM Studio."
-EMBEDDING_MODEL = (
-    "text-embedding-nomic-embed-text-v1.5qeq4_k_m"  # Use model name you have loaded
-)
 CHROMA_COLLECTION_NAME = "my_collection"
 
 
@@ -23,12 +22,19 @@ def get_embedding(text: str, model: str):
 
 
 # Step 2: Add to Chroma DB
-def store_in_chroma(text: str, embedding: list, collection_name: str = "my_collection"):
+def store_in_chroma(
+    text: str,
+    embedding: list,
+    model: str = EMBEDDING_MODEL,
+    collection_name: str = CHROMA_COLLECTION_NAME,
+):
     # Initialize Chroma client
     client = chromadb.PersistentClient(path="./chroma_storage")
 
     # client = chromadb.Client(Settings(anonymized_telemetry=False))
-    collection = client.get_or_create_collection(name=collection_name)
+    collection = get_or_create_model_collection(
+        client, model=model, dimension=len(embedding), base_name=collection_name
+    )
 
     # Add document with embedding
     collection.add(
@@ -43,4 +49,4 @@ def store_in_chroma(text: str, embedding: list, collection_name: str = "my_colle
 if __name__ == "__main__":
     vector = get_embedding(CHUNK_TEXT, EMBEDDING_MODEL)
     if vector:
-        store_in_chroma(CHUNK_TEXT, vector)
+        store_in_chroma(CHUNK_TEXT, vector, model=EMBEDDING_MODEL)
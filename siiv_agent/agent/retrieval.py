@@ -1,27 +1,22 @@
-from argparse import ArgumentParser
-from pathlib import Path
-from typing import List
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
 
 import chromadb
-import requests
-from chromadb.config import Settings
-from tqdm import tqdm
-
-LM_STUDIO_ENDPOINT = "http://localhost:1234/v1/embeddings" # Adjust port if needed
-CHUNK_TEXT = "This is a sample chunk of text to embed using LM Studio."
-# EMBEDDING_MODEL = "text-embedding-nomic-embed-text-v1.5e4q_k_m" # Use model name you have loaded
-EMBEDDING_MODEL = "text-embedding-nomic-embed-text-v1.5e4q_b" 
+from embedding import EMBEDDING_MODEL, get_lm_studio_embedding
+from embedding_collections import (bump_index_version, check_collection_model,
+                                   read_index_version,
+                                   resolve_active_collection)
+from query_cache import QueryResultCache, make_cache_key
 
 CHROMA_LOCAL_PATH = "/Users/matthew.flood/workspace/ai_dev_assistant/chroma_storage"
-CHROMA_COLLECTION_NAME = "code_chunks"
 # chroma_client = chromadb.Client(Settings(persist_directory=str(chroma_path)))
 
-import logging
-
 LOGGER_NAME = __name__
-from dataclasses import dataclass
 
-from embedding import get_lm_studio_embedding
+# shared by every VectorClient in the process, so agent sessions reuse each other's results
+SHARED_QUERY_CACHE = QueryResultCache()
 
 
 @dataclass
@@ -50,27 +45,56 @@ class CodeChunk:
 
 class VectorClient():
 
-    def __init__(self, chroma_collection: chromadb.PersistentClient):
+    def __init__(
+        self,
+        chroma_collection: Any,
+        embedding_model: str = EMBEDDING_MODEL,
+        chroma_local_path: str = CHROMA_LOCAL_PATH,
+        query_cache: Optional[QueryResultCache] = SHARED_QUERY_CACHE,
+    ):
+        check_collection_model(chroma_collection, model=embedding_model)
         self._chroma_collection = chroma_collection
+        self._embedding_model = embedding_model
+        self._chroma_local_path = chroma_local_path
+        self._query_cache = query_cache
+        self._lock = threading.Lock()
         self._logger = logging.getLogger(LOGGER_NAME)
 
     @classmethod
-    def factory(cls) -> VectorClient:
+    def factory(cls, chroma_local_path: str = CHROMA_LOCAL_PATH) -> "VectorClient":
         logger = logging.getLogger(LOGGER_NAME)
-        chroma.info(f'building chromadb client for collection %s at path '%s'', CHROMA_COLLECTION_NAME, CHROMA_LOCAL_PATH)
-        chroma_client = chromadb.PersistentClient(CHROMA_LOCAL_PATH)
-        chroma_collection = chroma_client.get_or_create_collection(name=CHROMA_COLLECTION_NAME)
+        chroma_client = chromadb.PersistentClient(chroma_local_path)
+        collection_name, model = resolve_active_collection(chroma_local_path)
+        logger.info("building chromadb client for collection %s at path '%s'", collection_name, chroma_local_path)
+        chroma_collection = chroma_client.get_collection(name=collection_name)
 
         logger.info('testing access to chroma collection')
         chroma_collection.get(limit=1)
         logger.info('access successful')
-        return cls(chroma_collection=chroma_collection)
+        return cls(
+            chroma_collection=chroma_collection,
+            embedding_model=model,
+            chroma_local_path=chroma_local_path,
+        )
+
+    def switch_collection(self, chroma_collection: Any, embedding_model: str) -> None:
+        """Atomically start serving queries from another collection/model pair."""
+        check_collection_model(chroma_collection, model=embedding_model)
+        with self._lock:
+            self._chroma_collection = chroma_collection
+            self._embedding_model = embedding_model
+        self._logger.info("now serving queries from %s (%s)", chroma_collection.name, embedding_model)
+
+    def _snapshot(self):
+        with self._lock:
+            return self._chroma_collection, self._embedding_model
 
-    def list_ids(self, self, limit: int) -> List[str]:
+    def list_ids(self, limit: int) -> List[str]:
         """List all object/document IDs in the collection."""
-        self._logger.info(f'Listing %d document ids from chroma db collection', limit)
-        try:   
-            results = self._chroma_collection.get(limit=limit)
+        self._logger.info('Listing %d document ids from chroma db collection', limit)
+        collection, _ = self._snapshot()
+        try:
+            results = collection.get(limit=limit)
             ids = results['ids']
             print(f' All document IDs: {ids}')
             return ids
@@ -79,32 +103,59 @@ class VectorClient():
             return []
 
     def delete_document(self, doc_id):
-        self._chroma_collection.delete(ids=[doc_id])
+        collection, _ = self._snapshot()
+        collection.delete(ids=[doc_id])
+        bump_index_version(self._chroma_local_path, collection.name)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss/eviction counters of the query result cache."""
+        return self._query_cache.stats() if self._query_cache else {}
 
     def read_document(self, doc_id: str):
         """Read/retrieve a document by ID."""
+        collection, _ = self._snapshot()
         try:
-            include: documents, embeddings, metadatas, distances, uris, data, got metadata in query.
-            result = self._chroma_collection.get(ids=[doc_id], include=["documents", "metadatas"])
+            # include: documents, embeddings, metadatas, distances, uris, data, got metadata in query.
+            result = collection.get(ids=[doc_id], include=["documents", "metadatas"])
             return result
         except Exception as e:
-            print(f‘X Failed to read document: {e}’)
+            print(f"X Failed to read document: {e}")
 
-    def _embed_query(self, query_text) -> List[float]:
-        self._logger.info(f‘converting query text to embedding vector’)
-        return get_lmstudio_embedding(query_text)
+    def _embed_query(self, query_text, embedding_model: str) -> List[float]:
+        self._logger.info('converting query text to embedding vector')
+        return get_lm_studio_embedding(query_text, model=embedding_model)
 
-    def retrieve(self, query_text, top_k: int) -> List[CodeChunk]:
+    def retrieve(self, query_text, top_k: int, filters: Optional[Dict[str, Any]] = None) -> List[CodeChunk]:
         self._logger.info("retrieving top %d documents from chromadb matching '%s'", top_k, query_text)
 
-        query_embedding = self._embed_query(query_text=query_text)
+        # a migration may switch collections mid-call; use one consistent pair
+        collection, embedding_model = self._snapshot()
+
+        cache_key = None
+        if self._query_cache is not None:
+            index_version = (
+                collection.name,
+                embedding_model,
+                read_index_version(self._chroma_local_path, collection.name),
+            )
+            cache_key = make_cache_key(query_text, top_k, filters, index_version)
+            cached = self._query_cache.get(cache_key)
+            if cached is not None:
+                self._logger.info("query cache hit (%d chunks)", len(cached))
+                return list(cached)
+
+        query_embedding = self._embed_query(query_text=query_text, embedding_model=embedding_model)
+        if query_embedding is None:
+            return []
+        check_collection_model(collection, model=embedding_model, dimension=len(query_embedding))
 
         # include: documents, embeddings, metadatas, distances, uris, data, got metadata in query.
 
-        results = self._chroma_collection.query(
+        results = collection.query(
             query_embeddings=[query_embedding],
             n_results=top_k,
-            include=("documents", "metadatas"),
+            where=filters,
+            include=["documents", "metadatas"],
         )
 
         documents = results["documents"][0]
@@ -112,6 +163,8 @@ class VectorClient():
 
         items = list(zip(documents, metadatas))
         code_chunks = [CodeChunk.from_tuple(f) for f in items]
+        if cache_key is not None:
+            self._query_cache.put(cache_key, tuple(code_chunks))
         return code_chunks
 
     def build_context_string(self, code_chunks: List[CodeChunk]):
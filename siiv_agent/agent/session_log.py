@@ -0,0 +1,154 @@
+import datetime
+import json
+import logging
+import os
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+LOGGER_NAME = __name__
+
+DEFAULT_SESSION_DIR = ".siiv_sessions"
+
+
+class SessionLogError(Exception):
+    pass
+
+
+def new_session_id() -> str:
+    return f"{datetime.datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+
+
+def _jsonable(value: Any) -> Any:
+    # OpenAI tool call objects are pydantic models
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    return str(value)
+
+
+@dataclass
+class SessionReplay:
+    """Everything needed to continue a logged session."""
+
+    session_id: str
+    query_text: str
+    current_working_dir: str
+    messages: List[Dict[str, Any]] = field(default_factory=list)
+    state: Dict[str, Any] = field(default_factory=dict)
+    # a model reply that was logged but not fully applied (e.g. a crash while its tools ran)
+    pending_response: Optional[Dict[str, Any]] = None
+    finished: bool = False
+    final_message: Optional[str] = None
+
+
+class SessionLog:
+    """
+    Append-only JSON-lines log of one agent session, written as it runs.
+
+    Each model reply is logged as soon as it arrives, and the new messages
+    and session state once it has been applied, so a crashed or interrupted
+    session can be resumed from its last completed step without calling the
+    model again. Messages are logged as deltas; a full snapshot is written
+    only when the history was rewritten (e.g. by context compaction).
+    """
+
+    def __init__(self, log_dir: str, session_id: str, fsync: bool = False):
+        self.session_id = session_id
+        self.path = Path(log_dir) / f"{session_id}.jsonl"
+        self._fsync = fsync
+        self._logged: List[Dict[str, Any]] = []
+        self._handle = None
+        self._logger = logging.getLogger(LOGGER_NAME)
+
+    def start(self, query_text: str, current_working_dir: str) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._append(
+            {
+                "type": "start",
+                "session_id": self.session_id,
+                "query_text": query_text,
+                "current_working_dir": current_working_dir,
+                "created_at": datetime.datetime.now().isoformat(),
+            }
+        )
+        self._logger.info("Logging session %s to %s", self.session_id, self.path)
+
+    def record_response(self, step: int, response: Dict[str, Any]) -> None:
+        self._append({"type": "response", "step": step, "response": response})
+
+    def checkpoint(self, step: int, messages: List[Dict[str, Any]], state: Dict[str, Any]) -> None:
+        """Log the messages added since the last checkpoint, plus the session state."""
+        logged = len(self._logged)
+        record: Dict[str, Any] = {"type": "checkpoint", "step": step, "state": state}
+        if len(messages) >= logged and messages[:logged] == self._logged:
+            record["append"] = messages[logged:]
+        else:
+            record["snapshot"] = messages
+        self._append(record)
+        self._logged = list(messages)
+
+    def finish(self, final_message: Optional[str]) -> None:
+        self._append({"type": "finish", "final_message": final_message})
+
+    def load(self) -> SessionReplay:
+        """Rebuild the session from the log; later writes continue the same log."""
+        if not self.path.exists():
+            raise SessionLogError(f"No session log at {self.path}")
+        self._drop_partial_line()
+        replay: Optional[SessionReplay] = None
+        with open(self.path, encoding="utf-8") as handle:
+            for line_number, line in enumerate(handle, start=1):
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    self._logger.warning("Ignoring unreadable line %d of %s", line_number, self.path)
+                    continue
+                if record["type"] == "start":
+                    replay = SessionReplay(
+                        session_id=record["session_id"],
+                        query_text=record["query_text"],
+                        current_working_dir=record["current_working_dir"],
+                    )
+                elif replay is None:
+                    raise SessionLogError(f"{self.path} does not start with a start record")
+                elif record["type"] == "response":
+                    replay.pending_response = record["response"]
+                elif record["type"] == "checkpoint":
+                    if "snapshot" in record:
+                        replay.messages = record["snapshot"]
+                    else:
+                        replay.messages = replay.messages + record["append"]
+                    replay.state = record["state"]
+                    replay.pending_response = None
+                elif record["type"] == "finish":
+                    replay.finished = True
+                    replay.final_message = record["final_message"]
+        if replay is None:
+            raise SessionLogError(f"{self.path} is empty")
+        self._logged = list(replay.messages)
+        return replay
+
+    def _drop_partial_line(self) -> None:
+        """Truncate a partial last line left by a crash mid-write, so the next append starts a fresh line."""
+        with open(self.path, "r+b") as handle:
+            data = handle.read()
+            complete = data.rfind(b"\n") + 1
+            if complete < len(data):
+                self._logger.warning("Dropping a partial last line (%d bytes) of %s", len(data) - complete, self.path)
+                handle.truncate(complete)
+
+    def close(self) -> None:
+        if self._handle:
+            self._handle.close()
+            self._handle = None
+
+    def _append(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, default=_jsonable)
+        if self._handle is None:
+            # kept open across appends; close() releases it
+            self._handle = open(self.path, "a", encoding="utf-8")  # noqa: SIM115
+        self._handle.write(line + "\n")
+        self._handle.flush()
+        if self._fsync:
+            os.fsync(self._handle.fileno())
@@ -0,0 +1,192 @@
+import logging
+import threading
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
+
+LOGGER_NAME = __name__
+
+# USD per million tokens: (input, cached input, output). Unknown and local models cost nothing.
+MODEL_PRICES_PER_MILLION = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+}
+
+PERCENTILES = (50, 90, 99)
+
+
+@dataclass
+class LLMCallRecord:
+    model: Optional[str]
+    prompt_tokens: int
+    completion_tokens: int
+    cached_tokens: int
+    latency_seconds: float
+    cost_usd: float
+
+    @property
+    def cached_ratio(self) -> float:
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+
+@dataclass
+class ToolCallRecord:
+    name: str
+    seconds: float
+    output_chars: int
+
+
+def _get(usage: Any, key: str) -> Any:
+    if usage is None:
+        return None
+    if isinstance(usage, dict):
+        return usage.get(key)
+    return getattr(usage, key, None)
+
+
+def parse_usage(usage: Any) -> Dict[str, int]:
+    """prompt/completion/cached token counts from an OpenAI-style usage dict or object."""
+    details = _get(usage, "prompt_tokens_details")
+    return {
+        "prompt_tokens": _get(usage, "prompt_tokens") or 0,
+        "completion_tokens": _get(usage, "completion_tokens") or 0,
+        "cached_tokens": _get(details, "cached_tokens") or 0,
+    }
+
+
+def estimate_cost(model: Optional[str], prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float:
+    prices = MODEL_PRICES_PER_MILLION.get(model or "")
+    if prices is None:
+        return 0.0
+    input_price, cached_price, output_price = prices
+    uncached_tokens = max(0, prompt_tokens - cached_tokens)
+    return (
+        uncached_tokens * input_price + cached_tokens * cached_price + completion_tokens * output_price
+    ) / 1_000_000
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Linear-interpolated percentile; None for no values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * pct / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    return {f"p{pct}": percentile(values, pct) for pct in PERCENTILES}
+
+
+class SessionMetrics:
+    """
+    Per-session accounting of LLM calls (tokens, latency, cost) and tool calls
+    (time, output size). summary() returns the aggregates as a dict,
+    format_table() as text for printing when the session ends.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.llm_calls: List[LLMCallRecord] = []
+        self.tool_calls: List[ToolCallRecord] = []
+
+    def record_llm_call(self, model: Optional[str], usage: Any, latency_seconds: float) -> LLMCallRecord:
+        tokens = parse_usage(usage)
+        record = LLMCallRecord(
+            model=model,
+            latency_seconds=latency_seconds,
+            cost_usd=estimate_cost(model, **tokens),
+            **tokens,
+        )
+        with self._lock:
+            self.llm_calls.append(record)
+        logging.getLogger(LOGGER_NAME).info(
+            "LLM call: %d prompt tokens, %d cached (%.0f%%), %d completion, %.2fs",
+            record.prompt_tokens,
+            record.cached_tokens,
+            record.cached_ratio * 100,
+            record.completion_tokens,
+            latency_seconds,
+        )
+        return record
+
+    def record_tool_call(self, name: str, seconds: float, output_chars: int) -> ToolCallRecord:
+        record = ToolCallRecord(name=name, seconds=seconds, output_chars=output_chars)
+        with self._lock:
+            self.tool_calls.append(record)
+        return record
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            llm_calls = list(self.llm_calls)
+            tool_calls = list(self.tool_calls)
+
+        tools: Dict[str, Dict[str, Any]] = {}
+        for name in sorted({t.name for t in tool_calls}):
+            calls = [t for t in tool_calls if t.name == name]
+            tools[name] = {
+                "calls": len(calls),
+                "total_seconds": sum(t.seconds for t in calls),
+                "seconds": _percentiles([t.seconds for t in calls]),
+                "output_chars": sum(t.output_chars for t in calls),
+                "max_output_chars": max(t.output_chars for t in calls),
+            }
+
+        prompt_tokens = sum(c.prompt_tokens for c in llm_calls)
+        cached_tokens = sum(c.cached_tokens for c in llm_calls)
+        return {
+            "llm": {
+                "calls": len(llm_calls),
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": sum(c.completion_tokens for c in llm_calls),
+                "cached_tokens": cached_tokens,
+                "cached_ratio": cached_tokens / prompt_tokens if prompt_tokens else 0.0,
+                "cached_ratio_per_call": [c.cached_ratio for c in llm_calls],
+                "cost_usd": sum(c.cost_usd for c in llm_calls),
+                "total_seconds": sum(c.latency_seconds for c in llm_calls),
+                "latency_seconds": _percentiles([c.latency_seconds for c in llm_calls]),
+                "prompt_tokens_per_call": _percentiles([c.prompt_tokens for c in llm_calls]),
+            },
+            "tools": tools,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Every recorded call, for writing out next to the summary."""
+        with self._lock:
+            return {
+                "llm_calls": [asdict(c) for c in self.llm_calls],
+                "tool_calls": [asdict(t) for t in self.tool_calls],
+            }
+
+    def format_table(self) -> str:
+        summary = self.summary()
+        llm = summary["llm"]
+        latency = llm["latency_seconds"]
+        prompt = llm["prompt_tokens_per_call"]
+
+        lines = [
+            f"LLM calls: {llm['calls']}  cost: ${llm['cost_usd']:.4f}  time: {llm['total_seconds']:.1f}s",
+            f"  tokens  prompt: {llm['prompt_tokens']}  cached: {llm['cached_tokens']} ({llm['cached_ratio']:.0%})  completion: {llm['completion_tokens']}",
+            f"  latency p50/p90/p99: {_fmt(latency['p50'])} / {_fmt(latency['p90'])} / {_fmt(latency['p99'])} s",
+            f"  prompt tokens/call p50/p90/p99: {_fmt(prompt['p50'], 0)} / {_fmt(prompt['p90'], 0)} / {_fmt(prompt['p99'], 0)}",
+            "",
+            f"{'tool':<32} {'calls':>5} {'total s':>8} {'p50 s':>7} {'p90 s':>7} {'out chars':>10} {'max chars':>10}",
+        ]
+        # biggest context contributors first
+        for name, tool in sorted(summary["tools"].items(), key=lambda item: -item[1]["output_chars"]):
+            lines.append(
+                f"{name:<32} {tool['calls']:>5} {tool['total_seconds']:>8.2f} "
+                f"{_fmt(tool['seconds']['p50']):>7} {_fmt(tool['seconds']['p90']):>7} "
+                f"{tool['output_chars']:>10} {tool['max_output_chars']:>10}"
+            )
+        return "\n".join(lines)
+
+    def log_summary(self) -> None:
+        logging.getLogger(LOGGER_NAME).info("Session metrics:\n%s", self.format_table())
+
+
+def _fmt(value: Optional[float], digits: int = 2) -> str:
+    return "n/a" if value is None else f"{value:.{digits}f}"
@@ -0,0 +1,233 @@
+import ast
+import json
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from agent.tool_request_parser import END_TAGS, START_TAG
+
+LOGGER_NAME = __name__
+
+_JSON_TYPES = {
+    "string": str,
+    "boolean": bool,
+    "integer": int,
+    "number": (int, float),
+    "array": list,
+    "object": dict,
+}
+
+
+class ToolCallRepairError(Exception):
+    pass
+
+
+@dataclass
+class RepairResult:
+    name: str
+    arguments: Dict[str, Any]
+    fixes: List[str] = field(default_factory=list)
+
+
+def extract_block(text: str) -> Optional[str]:
+    """The JSON after the last [TOOL_REQUEST] tag, up to its end tag or, if that is missing, the end of the text."""
+    start = text.rfind(START_TAG)
+    if start == -1:
+        return None
+    block = text[start + len(START_TAG) :]
+    ends = [block.find(tag) for tag in END_TAGS if tag in block]
+    if ends:
+        block = block[: min(ends)]
+    return block.strip()
+
+
+def _strip_code_fence(block: str) -> str:
+    return re.sub(r"^```(?:json)?\s*|\s*```$", "", block.strip())
+
+
+def _remove_trailing_commas(block: str) -> str:
+    """Drop commas right before a closing brace/bracket, leaving string values (file contents, diffs) untouched."""
+    out = []
+    in_string = False
+    escaped = False
+    for index, char in enumerate(block):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == "," and block[index + 1 :].lstrip()[:1] in ("}", "]"):
+            continue
+        out.append(char)
+    return "".join(out)
+
+
+def _escape_control_chars_in_strings(block: str) -> str:
+    """Escape raw newlines/tabs inside double-quoted strings (typical in `diff` and `content` arguments)."""
+    out = []
+    in_string = False
+    escaped = False
+    for char in block:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            elif char == "\n":
+                char = "\\n"
+            elif char == "\r":
+                char = "\\r"
+            elif char == "\t":
+                char = "\\t"
+        elif char == '"':
+            in_string = True
+        out.append(char)
+    return "".join(out)
+
+
+def _close_brackets(block: str) -> str:
+    """Append the closing braces/brackets a truncated block is missing."""
+    stack = []
+    in_string = False
+    escaped = False
+    for char in block:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]" and stack:
+            stack.pop()
+    return block + ("" if not in_string else '"') + "".join(reversed(stack))
+
+
+# applied cumulatively, cheapest and safest first
+REPAIRS: List[Tuple[str, Callable[[str], str]]] = [
+    ("code_fence", _strip_code_fence),
+    # before trailing_commas, so raw newlines cannot confuse where strings end
+    ("control_chars", _escape_control_chars_in_strings),
+    ("trailing_commas", _remove_trailing_commas),
+    ("unclosed_brackets", _close_brackets),
+]
+
+
+def _parse(block: str) -> Optional[Any]:
+    try:
+        return json.loads(block)
+    except json.JSONDecodeError:
+        return None
+
+
+def _parse_python_literal(block: str) -> Optional[Any]:
+    """Single quotes and True/False/None: the model wrote a Python dict instead of JSON."""
+    try:
+        value = ast.literal_eval(block)
+        # sets, bytes, tuple keys and the like have no JSON form
+        json.dumps(value)
+    except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+        return None
+    return value if isinstance(value, dict) else None
+
+
+def validate_tool_call(name: str, arguments: Any, tool_schema: List[dict]) -> List[str]:
+    """Problems with a tool call according to the tool schema; empty if it is valid."""
+    tools = {tool["function"]["name"]: tool["function"] for tool in tool_schema}
+    if name not in tools:
+        return [f"Unknown tool '{name}'. Available tools: {', '.join(sorted(tools))}"]
+    if not isinstance(arguments, dict):
+        return ["'arguments' must be a JSON object"]
+
+    function = tools[name]
+    parameters = function.get("parameters") or function
+    properties = parameters.get("properties", {})
+    errors = [
+        f"Missing required argument '{required}'"
+        for required in parameters.get("required", [])
+        if required not in arguments
+    ]
+    for key, value in arguments.items():
+        expected = properties.get(key, {}).get("type")
+        python_type = _JSON_TYPES.get(expected) if isinstance(expected, str) else None
+        if python_type and value is not None and not isinstance(value, python_type):
+            errors.append(f"Argument '{key}' should be of type {expected}")
+        if expected in ("integer", "number") and isinstance(value, bool):
+            errors.append(f"Argument '{key}' should be of type {expected}")
+    return errors
+
+
+class ToolCallRepairer:
+    """
+    Deterministic fixes for malformed [TOOL_REQUEST] blocks: code fences,
+    trailing commas, raw newlines in strings, single quotes, a missing end
+    tag and unclosed brackets. A repaired call is only accepted if it
+    validates against the tool schema, so the model is re-prompted only when
+    repair fails. Success rates are kept in stats().
+    """
+
+    def __init__(self, tool_schema: List[dict]):
+        self._tool_schema = tool_schema
+        self.attempts = 0
+        self.repaired = 0
+        self.fix_counts: Dict[str, int] = {}
+        self._logger = logging.getLogger(LOGGER_NAME)
+
+    def repair(self, text: str) -> RepairResult:
+        block = extract_block(text or "")
+        if block is None:
+            raise ToolCallRepairError("No [TOOL_REQUEST] block found")
+
+        self.attempts += 1
+        fixes: List[str] = []
+        raw = _parse(block)
+        for fix_name, fix in REPAIRS:
+            if raw is not None:
+                break
+            fixed = fix(block)
+            if fixed != block:
+                fixes.append(fix_name)
+                block = fixed
+            raw = _parse(block)
+        if raw is None:
+            raw = _parse_python_literal(block)
+            fixes.append("python_literal")
+
+        if raw is None:
+            raise ToolCallRepairError("Tool request is not valid JSON, even after repair")
+        if not isinstance(raw, dict) or not isinstance(raw.get("name"), str):
+            raise ToolCallRepairError("Tool request must be an object with 'name' and 'arguments'")
+
+        arguments = raw.get("arguments", {})
+        if isinstance(arguments, str):
+            # arguments sent as a JSON string, OpenAI style
+            arguments = _parse(arguments)
+            fixes.append("string_arguments")
+        errors = validate_tool_call(raw["name"], arguments, self._tool_schema)
+        if errors:
+            raise ToolCallRepairError("; ".join(errors))
+
+        self.repaired += 1
+        for fix_name in fixes:
+            self.fix_counts[fix_name] = self.fix_counts.get(fix_name, 0) + 1
+        self._logger.info("Repaired tool request locally (%s)", ", ".join(fixes) or "no fixes needed")
+        return RepairResult(name=raw["name"], arguments=arguments, fixes=fixes)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "attempts": self.attempts,
+            "repaired": self.repaired,
+            "success_rate": self.repaired / self.attempts if self.attempts else None,
+            "fixes": dict(self.fix_counts),
+        }
@@ -0,0 +1,85 @@
+import json
+import logging
+import uuid
+
+try:
+    import demjson3
+except ImportError:  # lenient parsing is only a fallback
+    demjson3 = None
+
+LOGGER_NAME = __name__
+
+START_TAG = "[TOOL_REQUEST]"
+END_TAGS = ("[END_TOOL_REQUEST]", "[/TOOL_REQUEST]")
+
+
+class BadToolRequestError(Exception):
+    pass
+
+
+class NoToolRequestError(Exception):
+    pass
+
+
+class InvalidCommandJson(Exception):
+    pass
+
+
+def find_last_tool_request(text: str) -> str:
+    """The body of the last [TOOL_REQUEST] ... [END_TOOL_REQUEST] block (either end tag)."""
+    end_idx = max(text.rfind(tag) for tag in END_TAGS)
+    if end_idx == -1:
+        raise NoToolRequestError("Missing [END_TOOL_REQUEST] tag")
+
+    start_idx = text.rfind(START_TAG, 0, end_idx)
+    if start_idx == -1:
+        raise BadToolRequestError(
+            "Missing [TOOL_REQUEST] tag before [/END_TOOL_REQUEST]"
+        )
+    return text[start_idx + len(START_TAG) : end_idx].strip()
+
+
+def decode_tool_request(block: str) -> dict:
+    """Strict json first; the slow lenient demjson3 parser only when that fails."""
+    try:
+        return json.loads(block)
+    except json.JSONDecodeError as e:
+        strict_error = e
+
+    if demjson3 is None:
+        raise InvalidCommandJson(f"Invalid json provided for tool request: {strict_error}")
+    logging.getLogger(LOGGER_NAME).info("Tool request is not strict json; trying lenient parser")
+    try:
+        return demjson3.decode(block)
+    except Exception as e:
+        raise InvalidCommandJson(f"Invalid json provided for tool request: {e}")
+
+
+def parse_tool_request_to_llm_format(text: str) -> dict:
+    """
+    Converts the last TOOL_REQUEST block into an LLM-style tool call dict.
+
+    Args:
+        text (str): The input string with [TOOL_REQUEST] JSON block.
+
+    Returns:
+        ... dict: Tool call in LLM function format.
+    """
+    logger = logging.getLogger(LOGGER_NAME)
+
+    block = find_last_tool_request(text)
+    raw_json = decode_tool_request(block)
+    if not isinstance(raw_json, dict) or "name" not in raw_json:
+        raise InvalidCommandJson("Tool request must be an object with 'name' and 'arguments'")
+
+    tool_call = {
+        "id": str(uuid.uuid4()),
+        "function": {
+            "name": raw_json["name"],
+            "arguments": json.dumps(raw_json.get("arguments", {})),
+        },
+    }
+
+    logger.info("Found tool call %s (%d chars)", raw_json["name"], len(block))
+    logger.debug("Tool request block: %s", block)
+    return tool_call
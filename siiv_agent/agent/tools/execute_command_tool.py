@@ -8,10 +8,12 @@ LOGGER_NAME = __name__
 
 class ExecuteCommandTool(ToolInterface):
 
-    def __init__(self, pwd: str, allowed_commands: List[str] = None):
+    def __init__(self, pwd: str, allowed_commands: List[str] = None, interactive: bool = True):
         # Optional safety: restrict which commands can be executed
         self._pwd = pwd
         self._allowed_commands = allowed_commands or []
+        # without a user to ask, commands that need approval are refused
+        self._interactive = interactive
         self._logger = logging.getLogger(LOGGER_NAME)
 
     def get_schema(self) -> Dict[str, Any]:
@@ -83,6 +85,16 @@ class ExecuteCommandTool(ToolInterface):
         ):
             requires_approval = True
 
+        if requires_approval and not self._interactive:
+            self._logger.info("Refusing command that needs approval in non-interactive mode.")
+            return ToolExecutionResult(
+                tool_name="execute_command",
+                args=args,
+                stdout="",
+                stderr="Command requires approval, but no user is available to approve it. Command not executed",
+                return_code=1,
+            )
+
         if requires_approval:
             print(f"{command}")
             print("Approval required to execute this command.")
@@ -37,6 +37,8 @@ def _should_ignore_file(file_path: str) -> bool:
 
 
 class FindFileTool(ToolInterface):
+    read_only = True
+
     def __init__(self, pwd: str):
         self._root_path = pwd
         self._logger = logging.getLogger(LOGGER_NAME)
@@ -28,6 +28,8 @@ def extract_definitions(file_path: Path) -> List[str]:
 
 
 class ListCodeDefinitionNamesTool(ToolInterface):
+    read_only = True
+
     def __init__(self, pwd: str):
         self._root_path = pwd
 
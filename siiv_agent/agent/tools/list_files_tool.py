@@ -48,6 +48,7 @@ def _should_ignore_file(file_path: str) -> bool:
 
 
 class ListFilesTool(ToolInterface):
+    read_only = True
 
     def __init__(self, pwd: str):
         self._root_path = pwd
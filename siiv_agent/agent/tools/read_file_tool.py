@@ -7,6 +7,7 @@ from agent.tools.tool_interface import ToolExecutionResult, ToolInterface
 
 
 class ReadFileTool(ToolInterface):
+    read_only = True
 
     def __init__(self, pwd: str):
         self._root_path = pwd
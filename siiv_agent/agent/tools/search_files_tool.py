@@ -6,6 +6,8 @@ from agent.tools.tool_interface import ToolExecutionResult, ToolInterface
 
 
 class SearchFilesTool(ToolInterface):
+    read_only = True
+
     def __init__(self, root_path: str):
         self._root_path = Path(root_path).resolve()
 
@@ -29,6 +29,9 @@ class ToolExecutionResult:
 
 
 class ToolInterface(ABC):
+    # read-only tools have no side effects, so ToolManager may run them concurrently
+    read_only = False
+
     @abstractmethod
     def get_schema(self) -> Dict[str, Any]:
         pass
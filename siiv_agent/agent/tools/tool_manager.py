@@ -1,4 +1,9 @@
-from typing import Any, Dict, List, Optional
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
 
 from agent.tools.ask_merlin_for_information_tool import \
     AskMerlinForInformationTool
@@ -12,18 +17,52 @@ from agent.tools.read_file_tool import ReadFileTool
 from agent.tools.replace_in_file_tool import ReplaceInFileTool
 from agent.tools.search_files_tool import SearchFilesTool
 from agent.tools.tool_interface import ToolExecutionResult, ToolInterface
+from agent.tools.tool_result_cache import ToolResultCache
 from agent.tools.write_to_file_tool import WriteToFileTool
 from agent.tools.propose_useful_agent_tool import ProposeUsefulAgentTool  # Import the new tool
 
+LOGGER_NAME = __name__
+
+DEFAULT_MAX_PARALLEL_TOOLS = 8
+
 
 class TaskCompleteError(Exception):
     pass
 
 
+class ToolCallCancelledError(Exception):
+    """Set as the error of calls not started because the session was cancelled."""
+
+
+@dataclass
+class ScheduledToolCall:
+    """Outcome of one call run by ToolManager.execute_tool_calls."""
+
+    name: str
+    args: Dict[str, Any]
+    call_id: Optional[str] = None
+    result: Optional[ToolExecutionResult] = None
+    seconds: float = 0.0
+    # raised by the tool (e.g. TaskCompleteError); left for the caller to handle in order
+    error: Optional[BaseException] = None
+
+
 class ToolManager:
 
-    def __init__(self, tool_list: List[ToolInterface]):
+    def __init__(
+        self,
+        tool_list: List[ToolInterface],
+        max_parallel_tools: int = DEFAULT_MAX_PARALLEL_TOOLS,
+        result_cache: Optional[ToolResultCache] = None,
+    ):
         self._tool_list = tool_list
+        self._max_parallel_tools = max_parallel_tools
+        # memoizes read-only tools; None runs every call
+        self.result_cache = result_cache
+        self._step = 0
+        self._step_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._logger = logging.getLogger(LOGGER_NAME)
 
         self._tool_map = {}
         for tool in tool_list:
@@ -36,13 +75,106 @@ class ToolManager:
         return [tool.get_schema() for tool in self._tool_list]
 
     def execute_tool_by_name(
-        self, name: str, args: Dict[str, Any]
+        self, name: str, args: Dict[str, Any], call_id: Optional[str] = None
     ) -> Optional[ToolExecutionResult]:
         tool = self._tool_map.get(name)
-        return tool.execute(**args) if tool else None
+        if tool is None:
+            return None
+        with self._step_lock:
+            self._step += 1
+            step = self._step
+        if self.result_cache is None:
+            return tool.execute(**args)
+
+        if tool.read_only:
+            cached = self.result_cache.lookup(name, args)
+            if cached is not None:
+                return cached
+            result = tool.execute(**args)
+            self.result_cache.store(name, args, result, step, call_id)
+            return result
+        try:
+            return tool.execute(**args)
+        finally:
+            self.result_cache.invalidate_for(name, args)
+
+    def is_read_only(self, name: str) -> bool:
+        tool = self._tool_map.get(name)
+        # an unknown tool does nothing, so it never has to wait its turn
+        return tool is None or tool.read_only
+
+    def execute_tool_calls(
+        self,
+        calls: List[Tuple[str, Dict[str, Any]]],
+        call_ids: Optional[List[str]] = None,
+        cancelled: Optional[threading.Event] = None,
+    ) -> List[ScheduledToolCall]:
+        """
+        Run the (name, args) calls of one assistant message. `call_ids` are the
+        calls' tool_call_ids, which cache hits refer back to. Consecutive
+        read-only calls run concurrently; a mutating call runs alone, after
+        everything before it and before everything after it. Results come back
+        in call order. Scheduling stops after the group in which a tool raised,
+        so nothing runs past a finish_task or a crash. Once `cancelled` is set,
+        the calls not yet started get a ToolCallCancelledError instead.
+        """
+        call_ids = call_ids or [None] * len(calls)
+        outcomes = [
+            ScheduledToolCall(name=name, args=args, call_id=call_id) for (name, args), call_id in zip(calls, call_ids)
+        ]
+        groups = self._groups(outcomes)
+        for index, group in enumerate(groups):
+            if cancelled is not None and cancelled.is_set():
+                for outcome in (outcome for rest in groups[index:] for outcome in rest):
+                    outcome.error = ToolCallCancelledError(f"{outcome.name} was not run: the session was cancelled")
+                break
+            if len(group) == 1 or self._max_parallel_tools <= 1:
+                for outcome in group:
+                    self._run(outcome)
+            else:
+                self._logger.info("Running %d read-only tool calls concurrently", len(group))
+                list(self._get_executor().map(self._run, group))
+            if any(outcome.error is not None for outcome in group):
+                break
+        return outcomes
+
+    def _groups(self, outcomes: List[ScheduledToolCall]) -> List[List[ScheduledToolCall]]:
+        groups: List[List[ScheduledToolCall]] = []
+        for outcome in outcomes:
+            read_only = self.is_read_only(outcome.name)
+            if read_only and groups and self.is_read_only(groups[-1][0].name):
+                groups[-1].append(outcome)
+            else:
+                groups.append([outcome])
+        return groups
+
+    def _run(self, outcome: ScheduledToolCall) -> None:
+        started = time.monotonic()
+        try:
+            outcome.result = self.execute_tool_by_name(outcome.name, outcome.args, outcome.call_id)
+        except Exception as e:
+            outcome.error = e
+        outcome.seconds = time.monotonic() - started
+
+    def close(self) -> None:
+        """Stop the worker threads of parallel read-only calls; a later batch starts new ones."""
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._max_parallel_tools, thread_name_prefix="tool")
+        return self._executor
 
     @classmethod
-    def default(cls, root_dir: str) -> "ToolManager":
+    def default(
+        cls,
+        root_dir: str,
+        max_parallel_tools: int = DEFAULT_MAX_PARALLEL_TOOLS,
+        cache_results: bool = True,
+        interactive: bool = True,
+    ) -> "ToolManager":
         return cls(
             [
                 ExecuteCommandTool(
@@ -68,6 +200,7 @@ class ToolManager:
                         "date",
                         "datetime",
                     ],
+                    interactive=interactive,
                 ),
                 ListFilesTool(pwd=root_dir),
                 ReadFileTool(pwd=root_dir),
@@ -77,7 +210,9 @@ class ToolManager:
                 ProposeUsefulAgentTool(),  # Add the new tool here
                 ListCodeDefinitionNamesTool(pwd=root_dir),
                 FinishTaskTool(),
-            ]
+            ],
+            max_parallel_tools=max_parallel_tools,
+            result_cache=ToolResultCache(root_dir) if cache_results else None,
         )
 
 
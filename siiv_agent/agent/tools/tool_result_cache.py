@@ -0,0 +1,133 @@
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from agent.tools.tool_interface import ToolExecutionResult
+
+LOGGER_NAME = __name__
+
+# arguments that name the file or directory a tool reads or writes
+PATH_ARGUMENTS = ("file_path", "directory", "path")
+
+# mutating tools whose only effect is on the path they are given; any other mutating tool clears everything
+WRITE_PATH_ARGUMENTS = {
+    "write_to_file": "file_path",
+    "replace_in_file": "file_path",
+}
+
+
+@dataclass
+class CachedToolResult:
+    result: ToolExecutionResult
+    # tool call number (within the session) that produced the result
+    step: int
+    path: str
+    # id of the tool message that carried the result, when the caller passed one
+    call_id: Optional[str] = None
+
+
+class ToolResultCache:
+    """
+    Session-scoped memo of read-only tool results, keyed by tool name and
+    normalized arguments. A repeat returns a short "unchanged since call N"
+    reference instead of the full output. Writes invalidate every entry whose
+    path contains or is contained in the written path; commands with unknown
+    effects clear the cache.
+    """
+
+    def __init__(self, root_dir: Optional[str] = None):
+        self._root_dir = root_dir or os.getcwd()
+        self._entries: Dict[Tuple[str, str], CachedToolResult] = {}
+        self._lock = threading.Lock()
+        self._logger = logging.getLogger(LOGGER_NAME)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _normalize_path(self, path: Any) -> str:
+        if not isinstance(path, str) or not path:
+            return self._root_dir
+        return os.path.normpath(os.path.join(self._root_dir, path))
+
+    def _path_of(self, args: Dict[str, Any]) -> str:
+        for name in PATH_ARGUMENTS:
+            if name in args:
+                return self._normalize_path(args[name])
+        return self._root_dir
+
+    def _key(self, name: str, args: Dict[str, Any]) -> Tuple[str, str]:
+        normalized = {
+            key: self._normalize_path(value) if key in PATH_ARGUMENTS else value
+            for key, value in args.items()
+        }
+        return name, json.dumps(normalized, sort_keys=True, default=str)
+
+    def lookup(self, name: str, args: Dict[str, Any]) -> Optional[ToolExecutionResult]:
+        """A reference to the earlier identical result, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(self._key(name, args))
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        self._logger.info("Tool result cache hit for %s %s (call %d)", name, args, entry.step)
+        # the model sees tool_call_ids, not our call counter, so prefer the id
+        reference = f"tool_call_id {entry.call_id}" if entry.call_id else f"tool call {entry.step}"
+        return ToolExecutionResult(
+            tool_name=name,
+            args=args,
+            stdout=(
+                f"[Unchanged since {reference}: {name} with these arguments returned "
+                f"the same {len(entry.result.stdout)} characters as before. Refer to that result.]"
+            ),
+            stderr="",
+            return_code=0,
+        )
+
+    def store(
+        self, name: str, args: Dict[str, Any], result: ToolExecutionResult, step: int, call_id: Optional[str] = None
+    ) -> None:
+        if result.return_code != 0:
+            return
+        with self._lock:
+            self._entries[self._key(name, args)] = CachedToolResult(
+                result=result, step=step, path=self._path_of(args), call_id=call_id
+            )
+
+    def invalidate_for(self, name: str, args: Dict[str, Any]) -> None:
+        """Forget whatever the mutating tool call `name(args)` may have changed."""
+        path_argument = WRITE_PATH_ARGUMENTS.get(name)
+        if path_argument is None or path_argument not in args:
+            self.clear()
+            return
+        written = self._normalize_path(args[path_argument])
+        with self._lock:
+            stale = [
+                key
+                for key, entry in self._entries.items()
+                if _contains(entry.path, written) or _contains(written, entry.path)
+            ]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+            }
+
+
+def _contains(directory: str, path: str) -> bool:
+    return path == directory or path.startswith(directory.rstrip(os.sep) + os.sep)
@@ -1,26 +1,155 @@
+from typing import Any, Dict, Iterator, List, Optional
+
 import chromadb
 from chromadb.config import Settings
+from embedding_collections import (bump_index_version, check_collection_model,
+                                   resolve_active_collection)
+from ingestion_log import IngestionLog
+
+CHROMA_LOCAL_PATH = "./chroma_storage"
+DEFAULT_PAGE_SIZE = 1000
 
-# Initialize Chroma client
-client = chromadb.PersistentClient(path="./chroma_storage")
+# Chroma client and collection are created on first use, not at import time
+_client = None
+_collection = None
 # client = chromadb.Client(Settings(
 #    anonymized_telemetry=False),
 #    chroma_db_impl="duckdb+parquet",
 #    persist_directory="./chroma_storage",
 #    )
-collection = client.get_or_create_collection(name="code_chunks")
+
+# when set, writes are logged and applied in bulk in the background
+_ingestion_log = None
+
+
+def get_collection():
+    """
+    Return the active collection, the one VectorClient queries, connecting to
+    chroma the first time it is needed. It must already exist (see embed_pipeline.py).
+    """
+    global _client, _collection
+    if _collection is None:
+        collection_name, model = resolve_active_collection(CHROMA_LOCAL_PATH)
+        _client = chromadb.PersistentClient(path=CHROMA_LOCAL_PATH)
+        collection = _client.get_collection(name=collection_name)
+        check_collection_model(collection, model=model)
+        _collection = collection
+    return _collection
+
+
+def enable_ingestion_log(log_path: Optional[str] = None):
+    """Route writes through a write-ahead IngestionLog (by default next to the collection)."""
+    global _ingestion_log
+    if _ingestion_log is None:
+        collection = get_collection()
+        _ingestion_log = IngestionLog(
+            collection,
+            log_path=log_path or f"{CHROMA_LOCAL_PATH}/{collection.name}.ingest.log",
+            chroma_path=CHROMA_LOCAL_PATH,
+        )
+        _ingestion_log.start()
+    return _ingestion_log
+
+
+def disable_ingestion_log():
+    """Apply everything still pending and go back to direct writes."""
+    global _ingestion_log
+    if _ingestion_log is not None:
+        _ingestion_log.close()
+        _ingestion_log = None
+
+
+def _record_write():
+    """Direct writes bump the index version here; the ingestion log bumps it when it applies its batch."""
+    bump_index_version(CHROMA_LOCAL_PATH, get_collection().name)
+
+
+# --- Batched Functions ---
+
+
+def upsert_documents(
+    ids: List[str],
+    documents: List[str],
+    embeddings: Optional[List[list]] = None,
+    metadatas: Optional[List[Dict[str, Any]]] = None,
+):
+    """Insert or replace many documents in a single call."""
+    if _ingestion_log is not None:
+        _ingestion_log.upsert(
+            ids=ids,
+            documents=documents,
+            embeddings=embeddings,
+            metadatas=metadatas,
+        )
+        return
+    get_collection().upsert(
+        ids=ids,
+        documents=documents,
+        embeddings=embeddings,
+        metadatas=metadatas,
+    )
+    _record_write()
+
+
+def delete_documents(ids: List[str]):
+    """Delete many documents in a single call."""
+    if _ingestion_log is not None:
+        _ingestion_log.delete(ids=ids)
+        return
+    get_collection().delete(ids=ids)
+    _record_write()
+
+
+def get_documents(
+    ids: List[str], include: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """Fetch many documents by ID in a single call."""
+    return get_collection().get(
+        ids=ids, include=include or ["documents", "embeddings", "metadatas"]
+    )
+
+
+def iter_documents(
+    page_size: int = DEFAULT_PAGE_SIZE, include: Optional[List[str]] = None
+) -> Iterator[Dict[str, Any]]:
+    """Yield the whole collection one page at a time."""
+    collection = get_collection()
+    offset = 0
+    while True:
+        page = collection.get(
+            limit=page_size,
+            offset=offset,
+            include=include if include is not None else ["documents", "metadatas"],
+        )
+        if not page["ids"]:
+            return
+        yield page
+        offset += len(page["ids"])
+
 
 # --- CRUD Functions ---
 
 
 def create_document(doc_id: str, text: str, embedding: list = None):
-    """Create or add a document with optional embedding."""
+    """
+    Create or add a document with optional embedding. Written directly, an
+    existing id is an error; through the ingestion log, which applies writes
+    later in bulk, it is an upsert and overwrites the existing document.
+    """
     try:
-        collection.add(
+        if _ingestion_log is not None:
+            _ingestion_log.add(
+                ids=[doc_id],
+                documents=[text],
+                embeddings=[embedding] if embedding else None,
+            )
+            return
+        get_collection().add(
             documents=[text],
             ids=[doc_id],
             embeddings=[embedding] if embedding else None,
         )
+        _record_write()
         print(f"✅ Created document with ID: {doc_id}")
     except Exception as e:
         print(f"❌ Failed to create document: {e}")
@@ -29,9 +158,7 @@ def create_document(doc_id: str, text: str, embedding: list = None):
 def read_document(doc_id: str):
     """Read/retrieve a document by ID."""
     try:
-        result = collection.get(
-            ids=[doc_id], include=["documents", "embeddings", "metadatas"]
-        )
+        result = get_documents(ids=[doc_id])
         print(f"📄 Document found: {result}")
         return result
     except Exception as e:
@@ -39,12 +166,11 @@ def read_document(doc_id: str):
 
 
 def update_document(doc_id: str, new_text: str, new_embedding: list = None):
-    """Update a document by deleting it and re-adding it."""
+    """Update a document in place with a single upsert."""
     try:
-        collection.delete(ids=[doc_id])
-        collection.add(
-            documents=[new_text],
+        upsert_documents(
             ids=[doc_id],
+            documents=[new_text],
             embeddings=[new_embedding] if new_embedding else None,
         )
         print(f"🔄 Updated document with ID: {doc_id}")
@@ -55,7 +181,7 @@ def update_document(doc_id: str, new_text: str, new_embedding: list = None):
 def delete_document(doc_id: str):
     """Delete a document by ID."""
     try:
-        collection.delete(ids=[doc_id])
+        delete_documents(ids=[doc_id])
         print(f"🗑️ Deleted document with ID: {doc_id}")
     except Exception as e:
         print(f"❌ Failed to delete document: {e}")
@@ -64,10 +190,9 @@ def delete_document(doc_id: str):
 def list_all_ids():
     """List all object/document IDs in the collection."""
     try:
-        # Set a high limit to retrieve all items; adjust as needed
-        # results = collection.get(include=['ids'], limit=1000)
-        results = collection.get(limit=1000)
-        ids = results["ids"]
+        ids = []
+        for page in iter_documents(include=[]):
+            ids.extend(page["ids"])
         print(f"✅ All document IDs: {ids}")
         return ids
     except Exception as e:
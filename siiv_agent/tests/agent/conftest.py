@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# the embedding and indexing modules import each other as top-level modules (they are run from agent/)
+sys.path.append(str(Path(__file__).resolve().parents[2] / 'agent'))
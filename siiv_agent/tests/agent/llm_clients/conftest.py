@@ -0,0 +1,19 @@
+import pytest
+
+class FakeClock:
+    """Callable monotonic clock for tests; sleep() advances it instantly and records the delay."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+@pytest.fixture
+def clock():
+    return FakeClock()
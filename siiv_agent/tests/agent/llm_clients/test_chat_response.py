@@ -0,0 +1,55 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from agent.llm_clients.chat_response import create_completion, create_completion_async
+from agent.llm_clients.rate_limiter import RateLimiter, estimate_tokens
+from openai import RateLimitError
+
+class RawResponse:
+    def __init__(self, headers, total_tokens=None):
+        self.headers = headers
+        self._usage = SimpleNamespace(total_tokens=total_tokens) if total_tokens is not None else None
+
+    def parse(self):
+        return SimpleNamespace(usage=self._usage)
+
+MESSAGES = [{'role': 'user', 'content': 'x' * 400}]
+HEADERS = {'x-ratelimit-limit-tokens': '1000', 'x-ratelimit-remaining-tokens': '900'}
+
+def test_headers_and_usage_teach_the_limiter(clock):
+    limiter = RateLimiter(clock=clock, sleep=clock.sleep)
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        return RawResponse(HEADERS, total_tokens=500)
+
+    create_completion(limiter, create, model='m', messages=MESSAGES)
+    assert calls == [{'model': 'm', 'messages': MESSAGES}]
+    # 900 remaining, less the 500 actually used on top of the estimate already taken
+    estimated = estimate_tokens(json.dumps(MESSAGES))
+    assert limiter._tokens.level == pytest.approx(900 - (500 - estimated))
+
+def test_async_stream_keeps_the_estimate(clock):
+    limiter = RateLimiter(clock=clock, sleep=clock.sleep)
+
+    async def create(**kwargs):
+        return RawResponse(HEADERS)
+
+    asyncio.run(create_completion_async(limiter, create, messages=MESSAGES, stream=True))
+    assert limiter._tokens.level == pytest.approx(900)
+
+def test_rate_limit_error_blocks_callers(clock):
+    limiter = RateLimiter(clock=clock, sleep=clock.sleep)
+    response = httpx.Response(429, headers={'retry-after': '7'}, request=httpx.Request('POST', 'http://api/v1/chat/completions'))
+
+    def create(**kwargs):
+        raise RateLimitError('slow down', response=response, body=None)
+
+    with pytest.raises(RateLimitError):
+        create_completion(limiter, create, messages=MESSAGES)
+    limiter.acquire()
+    assert clock.sleeps == [7.0]
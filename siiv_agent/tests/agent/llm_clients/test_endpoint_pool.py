@@ -0,0 +1,59 @@
+from agent.llm_clients.endpoint_pool import (STRATEGY_LATENCY, Endpoint, EndpointPool, parse_endpoints,
+                                             session_key_for)
+
+def make_pool(clock, count=3, **kwargs):
+    return EndpointPool([Endpoint(url=f'http://box{i}:1234/v1/chat/completions', model='m') for i in range(count)], clock=clock, **kwargs)
+
+def test_parse_endpoints():
+    endpoints = parse_endpoints('http://a/v1/chat/completions|gemma, http://b/v1/chat/completions', default_model='default')
+    assert [(e.url, e.model) for e in endpoints] == [('http://a/v1/chat/completions', 'gemma'), ('http://b/v1/chat/completions', 'default')]
+
+def test_least_outstanding_spreads_load(clock):
+    pool = make_pool(clock)
+    first = pool.choose()
+    with pool.track(first):
+        second = pool.choose()
+        assert second is not first
+
+def test_latency_strategy_prefers_fast_endpoint(clock):
+    pool = make_pool(clock, count=2, strategy=STRATEGY_LATENCY)
+    slow, fast = pool.endpoints
+    slow.ewma_latency = 10.0
+    fast.ewma_latency = 1.0
+    assert pool.choose() is fast
+
+def test_session_sticks_to_endpoint(clock):
+    pool = make_pool(clock)
+    messages = [{'role': 'system', 'content': 's'}, {'role': 'user', 'content': 'task'}]
+    key = session_key_for(messages)
+    assert session_key_for(messages + [{'role': 'assistant', 'content': 'more'}]) == key
+
+    chosen = pool.choose(session_key=key)
+    # other traffic makes the sticky endpoint busier, but the session stays put
+    chosen.outstanding = 5
+    assert pool.choose(session_key=key) is chosen
+
+def test_unhealthy_endpoint_is_skipped_until_it_recovers(clock):
+    pool = make_pool(clock, count=2, unhealthy_seconds=30.0)
+    first, second = pool.endpoints
+    key = 'session'
+    assert pool.choose(session_key=key) is first
+
+    pool.mark_unhealthy(first)
+    assert pool.choose(session_key=key) is second
+
+    clock.now += 31.0
+    assert pool.is_healthy(first)
+
+def test_check_health_uses_probe(clock):
+    pool = make_pool(clock, count=2)
+    first, second = pool.endpoints
+
+    def probe(endpoint):
+        if endpoint is first:
+            raise ConnectionError('down')
+        return True
+
+    pool.check_health(probe)
+    assert not pool.is_healthy(first)
+    assert pool.is_healthy(second)
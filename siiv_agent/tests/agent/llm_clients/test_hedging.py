@@ -0,0 +1,76 @@
+import time
+import pytest
+from agent.llm_clients.chat_response import ChatAndToolResponse
+from agent.llm_clients.hedging import HedgingLLMClient
+
+class FakeClient:
+    def __init__(self, name, delay=0.0, error=None, token_delay=0.0):
+        self.name = name
+        self.delay = delay
+        self.error = error
+        self.token_delay = token_delay
+        self.calls = 0
+
+    def call_chat(self, messages, tool_schema, **params):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return ChatAndToolResponse(content=self.name, tool_calls=None)
+
+    def call_chat_stream(self, messages, tool_schema, on_content=None, on_tool_call=None, **params):
+        self.calls += 1
+        time.sleep(self.delay)
+        on_content(self.name)
+        time.sleep(self.token_delay)
+        on_content('!')
+        return ChatAndToolResponse(content=self.name + '!', tool_calls=None)
+
+def warmed_up(primary, hedge, latency=0.01):
+    client = HedgingLLMClient(primary, hedge, min_samples=3, min_hedge_delay=0.0)
+    for _ in range(3):
+        client._primary_latencies.add(latency)
+        client._primary_ttfts.add(latency)
+    return client
+
+def test_no_hedging_before_enough_samples():
+    primary, hedge = FakeClient('primary', delay=0.05), FakeClient('hedge')
+    client = HedgingLLMClient(primary, hedge, min_samples=3)
+    assert client.call_chat([], []).content == 'primary'
+    assert hedge.calls == 0
+
+def test_slow_primary_is_hedged():
+    primary, hedge = FakeClient('primary', delay=0.5), FakeClient('hedge')
+    client = warmed_up(primary, hedge)
+    assert client.call_chat([], []).content == 'hedge'
+    assert client.stats()['hedge_wins'] == 1
+
+def test_failed_hedge_falls_back_to_primary():
+    primary, hedge = FakeClient('primary', delay=0.1), FakeClient('hedge', error=ConnectionError())
+    client = warmed_up(primary, hedge)
+    assert client.call_chat([], []).content == 'primary'
+
+def test_both_failing_raises_primary_error():
+    primary = FakeClient('primary', delay=0.05, error=ValueError('primary'))
+    hedge = FakeClient('hedge', error=ConnectionError())
+    client = warmed_up(primary, hedge)
+    with pytest.raises(ValueError):
+        client.call_chat([], [])
+
+def test_stream_only_forwards_the_winner():
+    primary, hedge = FakeClient('primary', delay=0.3), FakeClient('hedge')
+    client = warmed_up(primary, hedge)
+    received = []
+    response = client.call_chat_stream([], [], on_content=received.append)
+    assert response.content == 'hedge!'
+    assert received == ['hedge', '!']
+
+def test_stream_with_timely_first_token_is_not_hedged():
+    # first token right away, but generating the rest takes far longer than the TTFT p95
+    primary, hedge = FakeClient('primary', token_delay=0.3), FakeClient('hedge')
+    client = warmed_up(primary, hedge)
+    received = []
+    assert client.call_chat_stream([], [], on_content=received.append).content == 'primary!'
+    assert received == ['primary', '!']
+    assert hedge.calls == 0
+    assert (client.stats()['hedged'], client.stats()['hedge_wins']) == (0, 0)
@@ -0,0 +1,39 @@
+import pytest
+from agent.llm_clients.model_router import (REASON_DEFAULT, REASON_PARSE_FAILURE, REASON_PLANNING,
+                                            REASON_TOOL_ERRORS, TIER_LARGE, TIER_SMALL, ModelRouter,
+                                            RoutingPolicy, RoutingSignals)
+
+@pytest.fixture
+def router():
+    return ModelRouter({TIER_SMALL: 'small-client', TIER_LARGE: 'large-client'})
+
+def test_routine_turn_goes_to_small_model(router):
+    assert router.choose(RoutingSignals(turn=3)) == (TIER_SMALL, REASON_DEFAULT, 'small-client')
+
+@pytest.mark.parametrize('signals, reason', [
+    (RoutingSignals(turn=0, planning=True), REASON_PLANNING),
+    (RoutingSignals(turn=4, consecutive_parse_failures=1), REASON_PARSE_FAILURE),
+    (RoutingSignals(turn=4, consecutive_tool_errors=2), REASON_TOOL_ERRORS),
+])
+def test_escalation(router, signals, reason):
+    assert router.choose(signals) == (TIER_LARGE, reason, 'large-client')
+
+def test_single_tool_error_does_not_escalate(router):
+    assert router.choose(RoutingSignals(turn=4, consecutive_tool_errors=1))[0] == TIER_SMALL
+
+def test_planning_escalation_can_be_disabled():
+    policy = RoutingPolicy(escalate_planning=False)
+    assert policy.decide(RoutingSignals(turn=0, planning=True)) == (TIER_SMALL, REASON_DEFAULT)
+
+def test_summary_groups_by_tier_and_reason(router):
+    router.record(TIER_SMALL, REASON_DEFAULT, 1.0, 0.001)
+    router.record(TIER_SMALL, REASON_DEFAULT, 3.0, 0.001)
+    router.record(TIER_LARGE, REASON_PLANNING, 8.0, 0.02)
+    summary = router.summary()
+    assert summary['small/default']['calls'] == 2
+    assert summary['small/default']['mean_seconds'] == 2.0
+    assert summary['large/planning']['cost_usd'] == pytest.approx(0.02)
+
+def test_missing_tier_is_rejected():
+    with pytest.raises(ValueError):
+        ModelRouter({TIER_SMALL: 'small-client'})
@@ -0,0 +1,41 @@
+import pytest
+from agent.llm_clients.rate_limiter import RateLimiter, parse_reset_duration
+
+def test_parse_reset_duration():
+    assert parse_reset_duration('1s') == 1.0
+    assert parse_reset_duration('6m0s') == 360.0
+    assert parse_reset_duration('20ms') == pytest.approx(0.02)
+    assert parse_reset_duration('2') == 2.0
+    assert parse_reset_duration('soon') is None
+
+def test_unknown_limits_never_wait(clock):
+    limiter = RateLimiter(clock=clock, sleep=clock.sleep)
+    for _ in range(100):
+        assert limiter.acquire(tokens=10000) == 0.0
+    assert clock.sleeps == []
+
+def test_waits_only_when_request_budget_is_spent(clock):
+    limiter = RateLimiter(requests_per_minute=2, clock=clock, sleep=clock.sleep)
+    assert limiter.acquire() == 0.0
+    assert limiter.acquire() == 0.0
+    # one request refills every 30s
+    assert limiter.acquire() == pytest.approx(30.0)
+
+def test_token_budget_is_corrected_by_actual_usage(clock):
+    limiter = RateLimiter(tokens_per_minute=600, clock=clock, sleep=clock.sleep)
+    limiter.acquire(tokens=100)
+    limiter.record_usage(estimated_tokens=100, actual_tokens=700)
+    # bucket is now at -100; 100 tokens needs 200 tokens of refill at 10/s
+    assert limiter.acquire(tokens=100) == pytest.approx(20.0)
+
+def test_headers_teach_limits_and_retry_after_blocks(clock):
+    limiter = RateLimiter(clock=clock, sleep=clock.sleep)
+    limiter.update_from_headers({
+        'x-ratelimit-limit-requests': '60',
+        'x-ratelimit-remaining-requests': '0',
+        'x-ratelimit-reset-requests': '5s',
+    })
+    assert limiter.acquire() == pytest.approx(5.0)
+
+    limiter.update_from_headers({'Retry-After': '3'})
+    assert limiter.acquire() >= 3.0
@@ -0,0 +1,117 @@
+import pytest
+from agent.agent_session import AgentSession
+from agent.llm_clients.chat_response import ChatAndToolResponse
+from agent.llm_clients.response_cache import (CacheMissError, CachingLLMClient,
+                                              DiskResponseCache,
+                                              canonical_request_hash)
+
+class FakeClient:
+    _model = 'fake-model'
+
+    def __init__(self):
+        self.calls = 0
+
+    def call_chat(self, messages, tool_schema, **params):
+        self.calls += 1
+        return ChatAndToolResponse(content=f'answer {self.calls}', tool_calls=None)
+
+MESSAGES = [{'role': 'user', 'content': 'hi'}]
+
+def test_hash_ignores_key_order_but_not_content():
+    a = canonical_request_hash('m', [{'role': 'user', 'content': 'hi'}], [], {'temperature': 0.8})
+    b = canonical_request_hash('m', [{'content': 'hi', 'role': 'user'}], [], {'temperature': 0.8})
+    c = canonical_request_hash('m', [{'role': 'user', 'content': 'hi'}], [], {'temperature': 0.2})
+    assert a == b
+    assert a != c
+
+def test_record_mode_calls_model_once(tmp_path):
+    inner = FakeClient()
+    client = CachingLLMClient(inner, DiskResponseCache(str(tmp_path)), mode='record')
+    first = client.call_chat(messages=MESSAGES, tool_schema=[])
+    second = client.call_chat(messages=MESSAGES, tool_schema=[])
+    assert first.content == second.content == 'answer 1'
+    assert inner.calls == 1
+    assert (client.hits, client.misses) == (1, 1)
+
+def test_replay_mode_serves_recording_and_fails_on_miss(tmp_path):
+    cache = DiskResponseCache(str(tmp_path))
+    CachingLLMClient(FakeClient(), cache, mode='record').call_chat(messages=MESSAGES, tool_schema=[])
+
+    inner = FakeClient()
+    replay = CachingLLMClient(inner, cache, mode='replay')
+    assert replay.call_chat(messages=MESSAGES, tool_schema=[]).content == 'answer 1'
+    with pytest.raises(CacheMissError):
+        replay.call_chat(messages=[{'role': 'user', 'content': 'new'}], tool_schema=[])
+    assert inner.calls == 0
+
+def test_hits_restore_usage_and_model(tmp_path):
+    class UsageClient(FakeClient):
+        def call_chat(self, messages, tool_schema, **params):
+            response = super().call_chat(messages, tool_schema, **params)
+            response.usage = {'prompt_tokens': 12, 'completion_tokens': 3}
+            response.model = 'gpt-4o-mini-2024-07-18'
+            return response
+
+    cache = DiskResponseCache(str(tmp_path))
+    CachingLLMClient(UsageClient(), cache, mode='record').call_chat(messages=MESSAGES, tool_schema=[])
+
+    replayed = CachingLLMClient(FakeClient(), cache, mode='replay').call_chat(messages=MESSAGES, tool_schema=[])
+    assert replayed.usage == {'prompt_tokens': 12, 'completion_tokens': 3}
+    assert replayed.model == 'gpt-4o-mini-2024-07-18'
+
+def test_cache_evicts_past_size_limit(tmp_path):
+    cache = DiskResponseCache(str(tmp_path), max_bytes=100)
+    for i in range(5):
+        cache.put(f'key{i}', {'content': 'x' * 40, 'tool_calls': None})
+    assert len(list(tmp_path.glob('*.json'))) < 5
+
+def test_hash_masks_current_time_and_tool_call_ids():
+    def run(now, call_id):
+        return canonical_request_hash('m', [
+            {'role': 'user', 'content': [{'type': 'text', 'text': f'<task>\nfix\n</task>\nCurrent time: {now}'}]},
+            {'role': 'assistant', 'tool_calls': [{'id': call_id, 'type': 'function', 'function': {'name': 'read_file', 'arguments': '{}'}}]},
+            {'role': 'tool', 'tool_call_id': call_id, 'content': f'[Unchanged since tool call {call_id}]'},
+        ], [], {})
+    assert run('2025-01-01 10:00:00', 'aaaa-1111') == run('2025-06-30 23:59:59', 'bbbb-2222')
+    assert run('2025-01-01 10:00:00', 'aaaa-1111') != canonical_request_hash('m', [{'role': 'user', 'content': 'other'}], [], {})
+
+class ScriptedModel:
+    _model = 'fake-model'
+
+    def __init__(self, replies):
+        self._replies = list(replies)
+        self.calls = 0
+
+    def call_chat(self, messages, tool_schema, **params):
+        self.calls += 1
+        return ChatAndToolResponse(content=self._replies.pop(0), tool_calls=None)
+
+def run_session(client, workspace, now):
+    session = AgentSession(query_text='read the notes', current_working_dir=str(workspace), interactive=False)
+    # a later run starts at a different time
+    task = session.messages[1]['content'][-1]
+    task['text'] = task['text'].rsplit('Current time: ', 1)[0] + f'Current time: {now}'
+    while True:
+        response = client.call_chat(messages=session.messages, tool_schema=session.tool_schema)
+        if session.handle_response(response):
+            return session
+
+def test_agent_session_replays_from_recording(tmp_path):
+    workspace = tmp_path / 'repo'
+    workspace.mkdir()
+    (workspace / 'notes.txt').write_text('hello')
+    cache = DiskResponseCache(str(tmp_path / 'cache'))
+    # [TOOL_REQUEST] calls get a fresh uuid from the session on every run
+    replies = [
+        '[TOOL_REQUEST]{"name": "read_file", "arguments": {"file_path": "notes.txt"}}[END_TOOL_REQUEST]',
+        '[TOOL_REQUEST]{"name": "read_file", "arguments": {"file_path": "notes.txt"}}[END_TOOL_REQUEST]',
+        '[TOOL_REQUEST]{"name": "finish_task", "arguments": {"summary": "read it"}}[END_TOOL_REQUEST]',
+    ]
+    model = ScriptedModel(replies)
+    recorded = run_session(CachingLLMClient(model, cache, mode='record'), workspace, '2025-01-01 10:00:00')
+    assert model.calls == 3
+
+    offline = ScriptedModel([])
+    replayed = run_session(CachingLLMClient(offline, cache, mode='replay'), workspace, '2025-02-02 11:11:11')
+    assert offline.calls == 0
+    assert replayed.final_message == recorded.final_message == 'read it'
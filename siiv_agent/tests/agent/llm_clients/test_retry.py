@@ -0,0 +1,84 @@
+import pytest
+from agent.llm_clients.hedging import HedgeCancelledError
+from agent.llm_clients.retry import (CircuitBreaker, CircuitOpenError, LLMCallError, RetriesExhaustedError,
+                                     RetryPolicy, call_with_retry, classify_error)
+
+def flaky(errors, result='ok'):
+    errors = list(errors)
+    def call():
+        if errors:
+            raise errors.pop(0)
+        return result
+    return call
+
+def test_classify_error():
+    assert classify_error(LLMCallError(429, 'slow down')).retryable
+    assert classify_error(LLMCallError(503, 'busy')).kind == 'http_503'
+    assert not classify_error(LLMCallError(400, 'bad request')).retryable
+    assert classify_error(ConnectionResetError()).kind == 'connection'
+    assert not classify_error(ValueError('bug')).retryable
+
+def test_retries_transient_errors(clock):
+    breaker = CircuitBreaker('test', clock=clock)
+    call = flaky([LLMCallError(502, 'bad gateway'), ConnectionError()])
+    assert call_with_retry(call, RetryPolicy(max_attempts=3), breaker, sleep=clock.sleep) == 'ok'
+    assert len(clock.sleeps) == 2
+    assert breaker.state == 'closed'
+
+def test_non_retryable_error_raises_immediately(clock):
+    breaker = CircuitBreaker('test', clock=clock)
+    with pytest.raises(LLMCallError):
+        call_with_retry(flaky([LLMCallError(401, 'no key')]), RetryPolicy(), breaker, sleep=clock.sleep)
+    assert clock.sleeps == []
+
+def test_exhausted_retries_carry_metadata(clock):
+    breaker = CircuitBreaker('test', failure_threshold=10, clock=clock)
+    call = flaky([LLMCallError(500, 'boom')] * 3)
+    with pytest.raises(RetriesExhaustedError) as excinfo:
+        call_with_retry(call, RetryPolicy(max_attempts=3), breaker, sleep=clock.sleep)
+    failures = excinfo.value.failures
+    assert [f.attempt for f in failures] == [1, 2, 3]
+    assert all(f.status_code == 500 and f.endpoint == 'test' for f in failures)
+    assert failures[-1].delay is None
+
+def test_backoff_is_capped_and_honours_retry_after():
+    policy = RetryPolicy(base_delay=1.0, max_delay=4.0)
+    assert all(0 <= policy.delay_for(10) <= 4.0 for _ in range(50))
+    assert policy.delay_for(1, retry_after=7.0) >= 7.0
+
+def test_circuit_opens_and_half_opens(clock):
+    breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=30.0, clock=clock)
+    breaker.record_failure()
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    clock.now += 30.0
+    breaker.before_call()
+    # only one trial call while half-open
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+
+def test_retry_waits_out_open_circuit(clock):
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=10.0, clock=clock)
+    call = flaky([LLMCallError(503, 'busy')])
+    assert call_with_retry(call, RetryPolicy(max_attempts=3), breaker, sleep=clock.sleep) == 'ok'
+    assert sum(clock.sleeps) >= 10.0
+
+def test_non_retryable_errors_do_not_open_the_circuit(clock):
+    breaker = CircuitBreaker('test', failure_threshold=2, clock=clock)
+    for error in [LLMCallError(400, 'bad request'), HedgeCancelledError(), LLMCallError(404, 'no model')]:
+        with pytest.raises(type(error)):
+            call_with_retry(flaky([error]), RetryPolicy(), breaker, sleep=clock.sleep)
+    assert breaker.state == 'closed'
+
+    # a non-retryable answer during the half-open trial frees the trial slot
+    breaker.record_failure()
+    breaker.record_failure()
+    clock.now += 60.0
+    with pytest.raises(LLMCallError):
+        call_with_retry(flaky([LLMCallError(400, 'bad request')]), RetryPolicy(), breaker, sleep=clock.sleep)
+    assert call_with_retry(flaky([]), RetryPolicy(), breaker, sleep=clock.sleep) == 'ok'
+    assert breaker.state == 'closed'
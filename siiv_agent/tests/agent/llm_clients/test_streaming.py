@@ -0,0 +1,47 @@
+from agent.llm_clients.streaming import StreamAccumulator, iter_sse_chunks
+
+def tool_call_chunk(index, id=None, name=None, arguments=None):
+    return {'choices': [{'delta': {'tool_calls': [
+        {'index': index, 'id': id, 'function': {'name': name, 'arguments': arguments}}
+    ]}}]}
+
+def test_content_deltas_are_joined_and_passed_to_callback():
+    seen = []
+    accumulator = StreamAccumulator(on_content=seen.append)
+    accumulator.add_chunk({'choices': [{'delta': {'content': 'Hel'}}]})
+    accumulator.add_chunk({'choices': [{'delta': {'content': 'lo'}}]})
+    content, tool_calls, _ = accumulator.finish()
+    assert content == 'Hello'
+    assert tool_calls is None
+    assert seen == ['Hel', 'lo']
+
+def test_tool_call_deltas_are_assembled_and_emitted_when_complete():
+    emitted = []
+    accumulator = StreamAccumulator(on_tool_call=lambda t: emitted.append(t['function']['name']))
+    accumulator.add_chunk(tool_call_chunk(0, id='call_1', name='read_file', arguments='{"file_'))
+    accumulator.add_chunk(tool_call_chunk(0, arguments='path": "a.py"}'))
+    assert emitted == []
+    accumulator.add_chunk(tool_call_chunk(1, id='call_2', name='list_files', arguments='{}'))
+    assert emitted == ['read_file']
+
+    _, tool_calls, _ = accumulator.finish()
+    assert emitted == ['read_file', 'list_files']
+    assert tool_calls[0]['id'] == 'call_1'
+    assert tool_calls[0]['function']['arguments'] == '{"file_path": "a.py"}'
+    assert tool_calls[1]['function']['name'] == 'list_files'
+
+def test_metrics_use_reported_usage(clock):
+    accumulator = StreamAccumulator(clock=clock)
+    clock.now = 0.5
+    accumulator.add_chunk({'choices': [{'delta': {'content': 'a'}}]})
+    clock.now = 2.5
+    accumulator.add_chunk({'choices': [], 'usage': {'completion_tokens': 40}})
+    _, _, metrics = accumulator.finish()
+    assert metrics.time_to_first_token == 0.5
+    assert metrics.total_seconds == 2.5
+    assert metrics.completion_tokens == 40
+    assert metrics.tokens_per_second == 20.0
+
+def test_iter_sse_chunks_stops_at_done():
+    lines = [b'data: {"choices": []}', b'', b': keep-alive', b'data: [DONE]', b'data: {"late": 1}']
+    assert list(iter_sse_chunks(lines)) == [{'choices': []}]
@@ -0,0 +1,44 @@
+import json
+import pytest
+from agent.llm_clients.structured_output import (StructuredOutputError, drop_null_arguments, parse_step,
+                                                 step_schema, strict_tool_schema)
+
+TOOLS = [
+    {'type': 'function', 'function': {'name': 'list_files', 'description': 'List files', 'parameters': {
+        'type': 'object',
+        'properties': {'directory': {'type': 'string'}, 'recursive': {'type': 'boolean', 'default': False}},
+        'required': ['directory'],
+    }}},
+    # properties next to the name instead of under "parameters"
+    {'type': 'function', 'function': {'name': 'search_files', 'properties': {'regex': {'type': 'string'}}, 'required': ['regex']}},
+]
+
+def test_strict_tool_schema_requires_everything_and_makes_optionals_nullable():
+    list_files, search_files = strict_tool_schema(TOOLS)
+    parameters = list_files['function']['parameters']
+    assert list_files['function']['strict'] is True
+    assert parameters['required'] == ['directory', 'recursive']
+    assert parameters['additionalProperties'] is False
+    assert parameters['properties']['recursive'] == {'type': ['boolean', 'null']}
+    assert search_files['function']['parameters']['properties'] == {'regex': {'type': 'string'}}
+    # the input schema is not modified
+    assert TOOLS[0]['function']['parameters']['required'] == ['directory']
+
+def test_step_schema_offers_each_tool_or_no_call():
+    variants = step_schema(TOOLS)['properties']['tool_call']['anyOf']
+    assert [v.get('properties', {}).get('name', {}).get('enum') for v in variants] == [['list_files'], ['search_files'], None]
+
+def test_parse_step_with_tool_call():
+    content = json.dumps({'message': 'Looking around.', 'tool_call': {'name': 'list_files', 'arguments': {'directory': '.', 'recursive': None}}})
+    message, tool_calls = parse_step(content)
+    assert message == 'Looking around.'
+    assert tool_calls[0]['function']['name'] == 'list_files'
+    arguments = json.loads(tool_calls[0]['function']['arguments'])
+    assert drop_null_arguments(arguments) == {'directory': '.'}
+
+def test_parse_step_without_tool_call():
+    assert parse_step(json.dumps({'message': 'Which file?', 'tool_call': None})) == ('Which file?', None)
+
+def test_parse_step_rejects_non_json():
+    with pytest.raises(StructuredOutputError):
+        parse_step('[TOOL_REQUEST]{oops')
@@ -0,0 +1,54 @@
+import gzip
+import json
+from agent.llm_clients.trace_writer import TraceWriter
+
+def read_lines(directory):
+    lines = []
+    for path in sorted(directory.glob('*.jsonl.gz')):
+        with gzip.open(path, 'rt', encoding='utf-8') as handle:
+            lines.extend(json.loads(line) for line in handle)
+    return lines
+
+def record(writer, messages):
+    writer.record(
+        client='lm-studio',
+        model='m',
+        messages=messages,
+        tool_schema=[],
+        response={'choices': []},
+        latency_seconds=1.5,
+        usage={'total_tokens': 10},
+    )
+
+def test_records_are_written_as_compressed_jsonl(tmp_path):
+    writer = TraceWriter(directory=str(tmp_path))
+    messages = [{'role': 'user', 'content': 'hi'}]
+    record(writer, messages)
+    # appending after record() must not change what was traced
+    messages.append({'role': 'assistant', 'content': 'later'})
+    writer.close()
+
+    [line] = read_lines(tmp_path)
+    assert line['latency_seconds'] == 1.5
+    assert line['usage'] == {'total_tokens': 10}
+    assert line['message_count'] == 1
+    assert line['request']['messages'] == [{'role': 'user', 'content': 'hi'}]
+    assert len(line['request_ref']) == 64
+
+def test_payload_capture_can_be_disabled(tmp_path):
+    writer = TraceWriter(directory=str(tmp_path), capture_payloads=False)
+    record(writer, [{'role': 'user', 'content': 'secret'}])
+    writer.close()
+
+    [line] = read_lines(tmp_path)
+    assert 'request' not in line
+    assert 'response' not in line
+    assert 'secret' not in json.dumps(line)
+
+def test_files_rotate_by_size(tmp_path):
+    writer = TraceWriter(directory=str(tmp_path), max_bytes=1)
+    for i in range(3):
+        record(writer, [{'role': 'user', 'content': str(i)}])
+    writer.close()
+    assert len(read_lines(tmp_path)) == 3
+    assert len(list(tmp_path.glob('*.jsonl.gz'))) > 1
@@ -0,0 +1,160 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+from agent.agent_session import (AgentSession, handle_pytest_query_async, run_batch_task, run_concurrent_queries,
+                                 run_session_async)
+from agent.batch_runner import STATUS_FINISHED, STATUS_STEP_BUDGET, STATUS_TIMEOUT, STATUS_WAITING_FOR_USER, BatchTask
+from agent.context_compactor import ContextCompactor
+from agent.tools.write_to_file_tool import WriteToFileTool
+from agent.llm_clients.async_client_interface import AsyncLLMClientInterface
+from agent.llm_clients.chat_response import ChatAndToolResponse
+
+def tool_call(call_id, name, **arguments):
+    return {'id': call_id, 'type': 'function', 'function': {'name': name, 'arguments': json.dumps(arguments)}}
+
+def reply(content=None, *tool_calls):
+    return ChatAndToolResponse(content=content, tool_calls=list(tool_calls), model='gpt-4o-mini')
+
+class ScriptedClient(AsyncLLMClientInterface):
+    """Returns the scripted replies in order and keeps the messages of every request."""
+
+    def __init__(self, replies):
+        self._replies = list(replies)
+        self.requests = []
+
+    async def call_chat(self, messages, tool_schema, **params):
+        self.requests.append([dict(message) for message in messages])
+        return self._replies.pop(0)
+
+    async def call_chat_stream(self, messages, tool_schema, on_content=None, on_tool_call=None, **params):
+        return await self.call_chat(messages, tool_schema)
+
+@pytest.fixture
+def workspace(tmp_path):
+    (tmp_path / 'notes.txt').write_text('hello from notes')
+    return tmp_path
+
+def make_session(workspace):
+    return AgentSession(query_text='read the notes', current_working_dir=str(workspace), interactive=False)
+
+def test_tool_call_then_finish(workspace):
+    session = make_session(workspace)
+    client = ScriptedClient([
+        reply(None, tool_call('call-1', 'read_file', file_path='notes.txt')),
+        reply(None, tool_call('call-2', 'finish_task', summary='read it')),
+    ])
+    assert asyncio.run(run_session_async(session, client)) == STATUS_FINISHED
+    assert session.final_message == 'read it'
+    assert session.turn == 2
+
+    # the second request carries the tool result, keyed by the call id, as `content`
+    tool_message = client.requests[1][-1]
+    assert tool_message['role'] == 'tool'
+    assert tool_message['tool_call_id'] == 'call-1'
+    assert 'hello from notes' in tool_message['content']
+    assert [t.name for t in session.metrics.tool_calls] == ['read_file', 'finish_task']
+
+def test_tool_request_text_is_executed(workspace):
+    session = make_session(workspace)
+    text = 'Reading.\n[TOOL_REQUEST]\n{"name": "read_file", "arguments": {"file_path": "notes.txt"}}\n[END_TOOL_REQUEST]'
+    assert session.handle_response(reply(text)) is False
+    assistant, tool = session.messages[-2:]
+    assert assistant['content'] == text
+    assert tool['tool_call_id'] == assistant['tool_calls'][0]['id']
+    assert 'hello from notes' in tool['content']
+    assert not session.waiting_for_user
+
+def test_reply_without_tool_waits_for_user(workspace):
+    session = make_session(workspace)
+    client = ScriptedClient([reply('Which notes do you mean?')])
+    assert asyncio.run(run_session_async(session, client)) == STATUS_WAITING_FOR_USER
+    assert session.waiting_for_user
+    assert session.messages[-1] == {'role': 'assistant', 'content': 'Which notes do you mean?'}
+
+def test_user_answer_continues_session(workspace):
+    client = ScriptedClient([
+        reply('Which notes do you mean?'),
+        reply(None, tool_call('call-1', 'finish_task', summary='done')),
+    ])
+
+    async def ask_user(question):
+        assert question == 'Which notes do you mean?'
+        return 'notes.txt'
+
+    final = asyncio.run(handle_pytest_query_async('read the notes', str(workspace), client, ask_user=ask_user))
+    assert final == 'done'
+    assert client.requests[1][-1] == {'role': 'user', 'content': 'notes.txt'}
+
+def test_step_budget(workspace):
+    session = make_session(workspace)
+    client = ScriptedClient([reply(None, tool_call(f'call-{n}', 'list_files', directory='.', recursive=False)) for n in range(3)])
+    assert asyncio.run(run_session_async(session, client, max_steps=2)) == STATUS_STEP_BUDGET
+    assert session.turn == 2
+
+def test_unknown_tool_is_reported(workspace):
+    session = make_session(workspace)
+    session.handle_response(reply(None, tool_call('call-1', 'rm_rf')))
+    assert session.messages[-1]['content'] == "Tool 'rm_rf' not found."
+    assert session.consecutive_tool_errors == 1
+
+def test_concurrent_queries_keep_order(workspace):
+    clients = ScriptedClient([
+        reply(None, tool_call('a', 'finish_task', summary='first')),
+        reply(None, tool_call('b', 'finish_task', summary='second')),
+    ])
+    results = asyncio.run(run_concurrent_queries([('one', str(workspace)), ('two', str(workspace))], clients, max_concurrency=1))
+    assert results == ['first', 'second']
+
+def test_cache_hit_refers_to_visible_tool_message(workspace):
+    session = make_session(workspace)
+    session.handle_response(reply(None, tool_call('call-1', 'read_file', file_path='notes.txt')))
+    session.handle_response(reply(None, tool_call('call-2', 'read_file', file_path='./notes.txt')))
+    hit = session.messages[-1]
+    assert hit['tool_call_id'] == 'call-2'
+    assert 'Unchanged since tool_call_id call-1' in hit['content']
+    earlier = [m for m in session.messages if m.get('role') == 'tool' and m['tool_call_id'] == 'call-1']
+    assert len(earlier) == 1 and 'hello from notes' in earlier[0]['content']
+
+def test_timeout_waits_for_the_running_tool_and_skips_the_rest(workspace, monkeypatch):
+    write = WriteToFileTool.execute
+
+    def slow_write(self, **kwargs):
+        time.sleep(0.3)
+        return write(self, **kwargs)
+
+    monkeypatch.setattr(WriteToFileTool, 'execute', slow_write)
+    client = ScriptedClient([reply('Writing both.', tool_call('call-1', 'write_to_file', file_path='a.txt', content='a'),
+                                   tool_call('call-2', 'write_to_file', file_path='b.txt', content='b'))])
+    task = BatchTask(task_id='t', prompt='write', working_dir=str(workspace), timeout_seconds=0.1)
+
+    result = asyncio.run(run_batch_task(task, client))
+    assert result.status == STATUS_TIMEOUT
+    # the write in flight at the timeout finished before the result was reported; the next one never started
+    assert (workspace / 'a.txt').read_text() == 'a'
+    time.sleep(0.5)
+    assert not (workspace / 'b.txt').exists()
+
+def test_batch_task_releases_tool_threads(workspace):
+    client = ScriptedClient([
+        reply(None, tool_call('call-1', 'read_file', file_path='notes.txt'), tool_call('call-2', 'list_files', directory='.', recursive=False)),
+        reply(None, tool_call('call-3', 'finish_task', summary='done')),
+    ])
+    task = BatchTask(task_id='t', prompt='read', working_dir=str(workspace))
+    before = set(threading.enumerate())
+    assert asyncio.run(run_batch_task(task, client)).status == STATUS_FINISHED
+    assert not [t for t in set(threading.enumerate()) - before if t.name.startswith('tool')]
+
+def test_cache_survives_compaction_that_changes_nothing(workspace):
+    session = make_session(workspace)
+    session.handle_response(reply(None, tool_call('call-1', 'read_file', file_path='notes.txt')))
+    session.compact_history()
+    session.handle_response(reply(None, tool_call('call-2', 'read_file', file_path='notes.txt')))
+    assert 'Unchanged since tool_call_id call-1' in session.messages[-1]['content']
+
+    session.compactor = ContextCompactor(max_tokens=10, keep_recent_turns=0)
+    session.compact_history()
+    session.handle_response(reply(None, tool_call('call-3', 'read_file', file_path='notes.txt')))
+    assert 'hello from notes' in session.messages[-1]['content']
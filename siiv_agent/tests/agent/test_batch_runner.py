@@ -0,0 +1,45 @@
+import asyncio
+import json
+
+import pytest
+from agent.batch_runner import (STATUS_ERROR, STATUS_FINISHED, BatchResult, BatchTask, BatchTaskError, load_tasks,
+                                parse_task, run_batch)
+
+def test_parse_task_defaults():
+    task = parse_task('{"prompt": "fix it", "working_dir": "/repo", "max_steps": 5}', 3)
+    assert task == BatchTask(task_id='3', prompt='fix it', working_dir='/repo', max_steps=5)
+
+@pytest.mark.parametrize('line', ['not json', '[1]', '{"prompt": "x"}', '{"prompt": "", "working_dir": "/r"}'])
+def test_parse_task_rejects_bad_lines(line):
+    with pytest.raises(BatchTaskError):
+        parse_task(line, 1)
+
+def test_load_tasks_rejects_duplicate_ids(tmp_path):
+    path = tmp_path / 'tasks.jsonl'
+    path.write_text('{"id": "a", "prompt": "p", "working_dir": "/r"}\n\n{"id": "a", "prompt": "q", "working_dir": "/r"}\n')
+    with pytest.raises(BatchTaskError):
+        load_tasks(str(path))
+
+def test_run_batch_bounds_concurrency_and_writes_results(tmp_path):
+    tasks = [BatchTask(task_id=str(n), prompt=f'task {n}', working_dir='/r') for n in range(6)]
+    running = []
+    peak = []
+
+    async def run_task(task):
+        running.append(task.task_id)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.remove(task.task_id)
+        if task.task_id == '4':
+            raise RuntimeError('boom')
+        return BatchResult(task_id=task.task_id, status=STATUS_FINISHED, final_message=task.prompt)
+
+    output = tmp_path / 'out' / 'results.jsonl'
+    results = asyncio.run(run_batch(tasks, run_task, str(output), concurrency=2))
+
+    assert max(peak) == 2
+    assert [r.task_id for r in results] == [str(n) for n in range(6)]
+    assert results[4].status == STATUS_ERROR and 'boom' in results[4].error
+    written = [json.loads(line) for line in output.read_text().splitlines()]
+    assert sorted(r['task_id'] for r in written) == [str(n) for n in range(6)]
+    assert {r['status'] for r in written} == {STATUS_FINISHED, STATUS_ERROR}
@@ -0,0 +1,74 @@
+from agent.context_compactor import ELIDED_MARKER, ContextCompactor, estimate_message_tokens
+
+def tool_turn(index, output_chars):
+    call_id = f'call_{index}'
+    return [
+        {'role': 'assistant', 'tool_calls': [{'id': call_id, 'type': 'function', 'function': {'name': 'read_file', 'arguments': '{}'}}]},
+        {'role': 'tool', 'name': 'read_file', 'tool_call_id': call_id, 'content': 'x' * output_chars},
+    ]
+
+def conversation(turns, output_chars=4000):
+    messages = [{'role': 'system', 'content': 'system'}, {'role': 'user', 'content': 'task'}]
+    for index in range(turns):
+        messages.extend(tool_turn(index, output_chars))
+    return messages
+
+def assert_tool_pairs_valid(messages):
+    requested = set()
+    for message in messages:
+        for tool_call in message.get('tool_calls') or []:
+            requested.add(tool_call['id'])
+        if message['role'] == 'tool':
+            assert message['tool_call_id'] in requested
+
+def test_under_budget_is_untouched():
+    messages = conversation(3)
+    assert ContextCompactor(max_tokens=100000).compact(messages) is messages
+
+def test_stale_tool_output_is_elided_and_recent_kept():
+    messages = conversation(10)
+    compacted = ContextCompactor(max_tokens=5000, keep_recent_turns=2).compact(messages)
+
+    assert compacted[:2] == messages[:2]
+    tool_messages = [m for m in compacted if m['role'] == 'tool']
+    assert all(ELIDED_MARKER in m['content'] for m in tool_messages[:-2])
+    assert tool_messages[-2:] == [m for m in messages if m['role'] == 'tool'][-2:]
+    assert_tool_pairs_valid(compacted)
+
+def test_old_turns_are_dropped_when_eliding_is_not_enough():
+    messages = conversation(50)
+    compactor = ContextCompactor(max_tokens=3000, keep_recent_turns=2, elided_head_chars=400)
+    compacted = compactor.compact(messages)
+
+    assert sum(compactor.token_counts(compacted)) <= 3000
+    assert 'earlier turns were removed' in compacted[2]['content']
+    assert_tool_pairs_valid(compacted)
+    # the original history is not modified
+    assert len(messages[3]['content']) == 4000
+
+def test_list_content_is_counted():
+    parts = [{'type': 'text', 'text': 'y' * 4000}]
+    assert estimate_message_tokens({'role': 'user', 'content': parts}) >= 1000
+
+def test_repeat_compaction_adds_to_dropped_count():
+    compactor = ContextCompactor(max_tokens=3000, keep_recent_turns=2, elided_head_chars=400)
+    first = compactor.compact(conversation(50))
+    first_dropped = int(first[2]['content'][1:].split(' ')[0])
+
+    messages = first + [message for index in range(50, 70) for message in tool_turn(index, 4000)]
+    second = compactor.compact(messages)
+
+    notes = [m for m in second if 'earlier turns were removed' in str(m.get('content'))]
+    assert len(notes) == 1 and second[2] is notes[0]
+    kept_turns = sum(1 for m in second if m['role'] == 'assistant')
+    assert notes[0]['content'].startswith(f'[{70 - kept_turns} earlier turns')
+    assert 70 - kept_turns > first_dropped
+    assert_tool_pairs_valid(second)
+
+def test_nothing_left_to_cut_returns_the_same_history():
+    compactor = ContextCompactor(max_tokens=5000, keep_recent_turns=2)
+    compacted = compactor.compact(conversation(10))
+    assert compactor.compact(compacted) is compacted
+    # over budget, but every turn is recent
+    recent_only = conversation(2, output_chars=40000)
+    assert compactor.compact(recent_only) is recent_only
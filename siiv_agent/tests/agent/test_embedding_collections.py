@@ -0,0 +1,57 @@
+import threading
+
+import chromadb
+import pytest
+import retrieval
+from embedding_collections import bump_index_version, get_or_create_model_collection, read_index_version
+from query_cache import QueryResultCache
+from retrieval import VectorClient
+
+MODEL = 'text-embedding-test'
+
+def test_concurrent_bumps_are_not_lost(tmp_path):
+    errors = []
+
+    def bump_many():
+        try:
+            for _ in range(200):
+                bump_index_version(str(tmp_path), 'code_chunks-test')
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=bump_many) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert read_index_version(str(tmp_path), 'code_chunks-test') == 800
+    assert not list(tmp_path.glob('*.tmp'))
+
+@pytest.fixture
+def vector_client(tmp_path, monkeypatch):
+    embedded = []
+
+    def embed(text, model):
+        embedded.append(text)
+        return [1.0, 0.0, 0.0]
+
+    monkeypatch.setattr(retrieval, 'get_lm_studio_embedding', embed)
+    collection = get_or_create_model_collection(chromadb.PersistentClient(str(tmp_path / 'chroma')), model=MODEL, dimension=3)
+    metadata = {'code_type': 'function', 'docstring': '', 'end_line': 2, 'start_line': 1, 'symbol_name': 'f'}
+    collection.add(ids=['a', 'b'], documents=['def a(): pass', 'def b(): pass'], embeddings=[[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]],
+                   metadatas=[dict(metadata, file_path='a.py'), dict(metadata, file_path='b.py')])
+    client = VectorClient(collection, embedding_model=MODEL, chroma_local_path=str(tmp_path / 'chroma'), query_cache=QueryResultCache())
+    client.embedded = embedded
+    return client
+
+def test_write_invalidates_cached_retrieve(vector_client):
+    first = vector_client.retrieve('find a', top_k=2)
+    assert [chunk.file_path for chunk in first] == ['a.py', 'b.py']
+    assert vector_client.retrieve('find a', top_k=2) == first
+    assert len(vector_client.embedded) == 1 and vector_client.cache_stats()['hits'] == 1
+
+    vector_client.delete_document('a')
+    assert [chunk.file_path for chunk in vector_client.retrieve('find a', top_k=2)] == ['b.py']
+    assert len(vector_client.embedded) == 2
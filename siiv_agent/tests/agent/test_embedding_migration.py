@@ -0,0 +1,132 @@
+import time
+
+import chromadb
+import embedding_migration
+import pytest
+from embedding_collections import (EmbeddingModelMismatchError, MAX_COLLECTION_NAME_LENGTH, check_collection_model,
+                                   collection_name_for_model, get_or_create_model_collection, read_active_collection)
+from embedding_migration import EmbeddingMigration, open_source_collection
+
+NEW_MODEL = 'text-embedding-new-model@q8'
+
+def fake_embeddings(texts, model):
+    return [[float(len(text)), float(sum(map(ord, text)) % 97), 1.0] for text in texts]
+
+@pytest.fixture
+def client(tmp_path):
+    return chromadb.PersistentClient(str(tmp_path / 'chroma'))
+
+@pytest.fixture
+def embed(monkeypatch):
+    calls = []
+
+    def embeddings(texts, model):
+        calls.append(list(texts))
+        return fake_embeddings(texts, model)
+
+    monkeypatch.setattr(embedding_migration, 'get_lm_studio_embeddings', embeddings)
+    return calls
+
+def legacy_collection(client, count=4):
+    collection = client.create_collection('code_chunks')
+    ids = [f'doc-{n}' for n in range(count)]
+    documents = [f'def f{n}(): pass' for n in range(count)]
+    collection.add(ids=ids, documents=documents, embeddings=fake_embeddings(documents, 'old'),
+                   metadatas=[{'file_path': f'f{n}.py'} for n in range(count)])
+    return collection
+
+def migrate(client, source, tmp_path, **kwargs):
+    migration = EmbeddingMigration(client, source, NEW_MODEL, str(tmp_path / 'chroma'), **kwargs)
+    migration.run()
+    assert migration.error is None
+    return migration
+
+def test_collection_names_are_valid_and_distinct():
+    long_model = 'nomic-ai/' + 'x' * 200
+    names = {collection_name_for_model(model) for model in ['a', 'b', long_model, long_model + 'y']}
+    assert len(names) == 4
+    for name in names:
+        assert name.startswith('code_chunks-')
+        assert 3 <= len(name) <= MAX_COLLECTION_NAME_LENGTH
+        assert name[-1].isalnum()
+    assert '/' not in collection_name_for_model(long_model)
+
+def test_model_and_dimension_mismatch_are_refused(client):
+    collection = get_or_create_model_collection(client, model='m1', dimension=3)
+    check_collection_model(collection, model='m1', dimension=3)
+    with pytest.raises(EmbeddingModelMismatchError):
+        check_collection_model(collection, model='m2')
+    with pytest.raises(EmbeddingModelMismatchError):
+        check_collection_model(collection, model='m1', dimension=768)
+    with pytest.raises(EmbeddingModelMismatchError):
+        check_collection_model(legacy_collection(client), model='m1')
+
+def test_copy_is_throttled(client, tmp_path, embed):
+    source = legacy_collection(client, count=4)
+    started = time.monotonic()
+    migration = migrate(client, source, tmp_path, docs_per_second=20, batch_size=2)
+    assert time.monotonic() - started >= 0.18
+    assert embed[:2] == [['def f0(): pass', 'def f1(): pass'], ['def f2(): pass', 'def f3(): pass']]
+    assert migration.migrated_count == 4
+
+def test_catch_up_applies_writes_made_during_the_copy(client, tmp_path, monkeypatch):
+    source = legacy_collection(client, count=4)
+    calls = []
+
+    def embeddings(texts, model):
+        calls.append(list(texts))
+        if len(calls) == 2:
+            # writes landing in the source after the first page was copied
+            source.delete(ids=['doc-0'])
+            source.update(ids=['doc-1'], documents=['def f1(): return 1'], embeddings=fake_embeddings(['def f1(): return 1'], 'old'),
+                          metadatas=[{'file_path': 'f1.py', 'start_line': 2}])
+            source.add(ids=['doc-9'], documents=['def f9(): pass'], embeddings=fake_embeddings(['def f9(): pass'], 'old'),
+                       metadatas=[{'file_path': 'f9.py'}])
+        return fake_embeddings(texts, model)
+
+    monkeypatch.setattr(embedding_migration, 'get_lm_studio_embeddings', embeddings)
+    migration = migrate(client, source, tmp_path, docs_per_second=1000, batch_size=2)
+
+    include = ['documents', 'metadatas']
+    expected = source.get(include=include)
+    copied = migration.target_collection.get(ids=expected['ids'], include=include)
+    assert sorted(migration.target_collection.get(include=[])['ids']) == sorted(expected['ids'])
+    assert sorted(zip(copied['ids'], copied['documents'])) == sorted(zip(expected['ids'], expected['documents']))
+    assert migration.target_collection.get(ids=['doc-1'], include=['metadatas'])['metadatas'][0]['start_line'] == 2
+
+def test_switch_points_at_the_new_collection(client, tmp_path, embed):
+    source = legacy_collection(client, count=3)
+    switched = []
+    migration = EmbeddingMigration(client, source, NEW_MODEL, str(tmp_path / 'chroma'), docs_per_second=1000)
+    migration.on_switch(lambda collection, model: switched.append((collection.name, model)))
+    migration.run()
+
+    active = read_active_collection(str(tmp_path / 'chroma'))
+    assert active['collection'] == collection_name_for_model(NEW_MODEL)
+    assert active['embedding_model'] == NEW_MODEL and active['embedding_dimension'] == 3
+    assert switched == [(active['collection'], NEW_MODEL)]
+    check_collection_model(migration.target_collection, model=NEW_MODEL, dimension=3)
+
+def test_stopped_migration_does_not_switch(client, tmp_path, embed):
+    migration = EmbeddingMigration(client, legacy_collection(client), NEW_MODEL, str(tmp_path / 'chroma'))
+    migration.stop()
+    migration.run()
+    assert read_active_collection(str(tmp_path / 'chroma')) is None
+
+def test_legacy_collection_is_the_fallback_source(client, tmp_path, embed):
+    chroma_path = str(tmp_path / 'chroma')
+    legacy = legacy_collection(client)
+    assert open_source_collection(client, chroma_path).name == legacy.name
+
+    migrate(client, legacy, tmp_path, docs_per_second=1000)
+    # once migrated, the active collection is the source of the next migration
+    assert open_source_collection(client, chroma_path).name == collection_name_for_model(NEW_MODEL)
+    assert open_source_collection(client, chroma_path, name='code_chunks').name == 'code_chunks'
+
+@pytest.mark.parametrize('rate', [0, -1.0])
+def test_non_positive_rate_is_refused(client, tmp_path, rate):
+    with pytest.raises(ValueError):
+        EmbeddingMigration(client, legacy_collection(client), NEW_MODEL, str(tmp_path / 'chroma'), docs_per_second=rate)
+
+def test_unthrottled_migration(client, tmp_path, embed):
+    assert migrate(client, legacy_collection(client), tmp_path, docs_per_second=None).migrated_count == 4
@@ -0,0 +1,148 @@
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import chromadb
+import embed_pipeline
+import index_watcher
+import pytest
+from embedding_collections import collection_name_for_model, get_or_create_model_collection, write_active_collection
+from index_watcher import INotify, IndexWatcher
+
+MIGRATED_MODEL = 'text-embedding-migrated@q8'
+
+@pytest.fixture(autouse=True)
+def fake_embeddings(monkeypatch):
+    monkeypatch.setattr(embed_pipeline, 'get_lm_studio_embeddings', lambda texts, model: [[float(len(t)), 1.0, 0.0] for t in texts])
+
+@pytest.fixture
+def chroma_path(tmp_path):
+    return str(tmp_path / 'chroma')
+
+@pytest.fixture
+def repo(tmp_path):
+    path = tmp_path / 'repo'
+    path.mkdir()
+    return path
+
+def write_module(path, functions):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(''.join(f'def {name}():\n    return 1\n\n' for name in functions))
+
+def file_paths(collection):
+    return {metadata['file_path'] for metadata in collection.get(include=['metadatas'])['metadatas']}
+
+def test_watcher_writes_to_the_active_collection(repo, chroma_path):
+    client = chromadb.PersistentClient(chroma_path)
+    migrated = get_or_create_model_collection(client, model=MIGRATED_MODEL, dimension=3)
+    write_active_collection(chroma_path, collection_name=migrated.name, model=MIGRATED_MODEL, dimension=3)
+    write_module(repo / 'a.py', ['f'])
+
+    watcher = IndexWatcher(repo, chroma_path=chroma_path, debounce_seconds=0, use_inotify=False)
+    watcher._mark_changed(repo / 'a.py')
+    watcher._flush_if_quiet()
+
+    assert file_paths(migrated) == {str((repo / 'a.py').resolve())}
+    names = {collection.name for collection in client.list_collections()}
+    assert collection_name_for_model(embed_pipeline.EMBEDDING_MODEL) not in names
+
+def test_relative_and_absolute_paths_share_chunks(repo, chroma_path, monkeypatch):
+    collection = get_or_create_model_collection(chromadb.PersistentClient(chroma_path), model='m', dimension=3)
+    monkeypatch.chdir(repo)
+    write_module(repo / 'a.py', ['f', 'g'])
+    embed_pipeline.embed_file(collection, Path('a.py'), model='m', chroma_path=chroma_path)
+
+    write_module(repo / 'a.py', ['f'])
+    embed_pipeline.embed_file(collection, repo / '.' / 'a.py', model='m', chroma_path=chroma_path)
+
+    assert file_paths(collection) == {str(repo.resolve() / 'a.py')}
+    assert len(collection.get(include=[])['ids']) == 1
+
+@pytest.mark.skipif(INotify is None, reason='inotify is not available')
+def test_files_created_with_a_new_directory_are_indexed(repo, chroma_path):
+    collection = get_or_create_model_collection(chromadb.PersistentClient(chroma_path), model='m', dimension=3)
+    watcher = IndexWatcher(repo, collection=collection, model='m', chroma_path=chroma_path, debounce_seconds=0.05)
+    thread = threading.Thread(target=watcher.run_forever, daemon=True)
+    thread.start()
+    try:
+        time.sleep(0.2)
+        # written right after the mkdir, before the watcher can watch the new directory
+        write_module(repo / 'pkg' / 'sub' / 'mod.py', ['f'])
+        expected = {str((repo / 'pkg' / 'sub' / 'mod.py').resolve())}
+        deadline = time.monotonic() + 5
+        while file_paths(collection) != expected and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert file_paths(collection) == expected
+    finally:
+        watcher.stop()
+        thread.join(timeout=5)
+
+@pytest.mark.skipif(INotify is None, reason='inotify is not available')
+def test_directory_removed_before_it_is_watched_is_skipped(repo):
+    (repo / 'build' / 'tmp').mkdir(parents=True)
+    (repo / 'src').mkdir()
+
+    class RacingINotify(INotify):
+        def add_watch(self, path, mask):
+            if Path(path).name == 'tmp':
+                # removed after its parent was listed, before its own watch
+                (repo / 'build' / 'tmp').rmdir()
+            return super().add_watch(path, mask)
+
+    watcher = IndexWatcher(repo)
+    inotify = RacingINotify()
+    watch_dirs = {}
+    try:
+        watcher._add_watch(inotify, index_watcher.inotify_flags.CREATE, watch_dirs, repo)
+    finally:
+        inotify.close()
+
+    assert set(watch_dirs.values()) == {repo, repo / 'build', repo / 'src'}
+
+def test_polling_fallback_follows_creates_edits_and_deletes(repo, chroma_path):
+    collection = get_or_create_model_collection(chromadb.PersistentClient(chroma_path), model='m', dimension=3)
+    watcher = IndexWatcher(repo, collection=collection, model='m', chroma_path=chroma_path, debounce_seconds=0.05, poll_interval=0.05, use_inotify=False)
+    thread = threading.Thread(target=watcher.run_forever, daemon=True)
+    thread.start()
+
+    def wait_for(condition):
+        deadline = time.monotonic() + 5
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert condition()
+
+    try:
+        time.sleep(0.1)
+        write_module(repo / 'a.py', ['f'])
+        wait_for(lambda: file_paths(collection) == {str((repo / 'a.py').resolve())})
+
+        write_module(repo / 'a.py', ['f', 'g'])
+        wait_for(lambda: len(collection.get(include=[])['ids']) == 2)
+
+        (repo / 'a.py').unlink()
+        wait_for(lambda: file_paths(collection) == set())
+    finally:
+        watcher.stop()
+        thread.join(timeout=5)
+    assert not thread.is_alive()
+
+def test_changes_are_flushed_once_the_debounce_has_passed(repo, chroma_path, monkeypatch):
+    collection = get_or_create_model_collection(chromadb.PersistentClient(chroma_path), model='m', dimension=3)
+    now = [100.0]
+    monkeypatch.setattr(index_watcher, 'time', SimpleNamespace(monotonic=lambda: now[0]))
+    watcher = IndexWatcher(repo, collection=collection, model='m', chroma_path=chroma_path, debounce_seconds=1.0, use_inotify=False)
+    write_module(repo / 'a.py', ['f'])
+    write_module(repo / 'b.py', ['g'])
+
+    watcher._mark_changed(repo / 'a.py')
+    now[0] += 0.6
+    # a second change restarts the quiet period
+    watcher._mark_changed(repo / 'b.py')
+    now[0] += 0.6
+    watcher._flush_if_quiet()
+    assert file_paths(collection) == set()
+
+    now[0] += 0.5
+    watcher._flush_if_quiet()
+    assert file_paths(collection) == {str((repo / 'a.py').resolve()), str((repo / 'b.py').resolve())}
@@ -0,0 +1,104 @@
+import pytest
+from ingestion_log import IngestionLog
+
+class FakeCollection:
+    name = 'code_chunks__test'
+
+    def __init__(self):
+        self.docs = {}
+        self.upserts = []
+
+    def upsert(self, ids, documents, embeddings=None, metadatas=None):
+        self.upserts.append(ids)
+        for n, doc_id in enumerate(ids):
+            self.docs[doc_id] = {
+                'document': documents[n],
+                'embedding': embeddings[n] if embeddings else None,
+                'metadata': metadatas[n] if metadatas else None,
+            }
+
+    def _matching(self, where):
+        return [doc_id for doc_id, doc in self.docs.items()
+                if all((doc['metadata'] or {}).get(key) == value for key, value in where.items())]
+
+    def get(self, where=None, include=None):
+        return {'ids': self._matching(where or {})}
+
+    def delete(self, ids=None, where=None):
+        for doc_id in ids if ids is not None else self._matching(where):
+            self.docs.pop(doc_id, None)
+
+def chunk(file_path, n):
+    return {'ids': [f'{file_path}:{n}'], 'documents': [f'code {n}'], 'embeddings': [[float(n)]], 'metadatas': [{'file_path': file_path}]}
+
+@pytest.fixture
+def log_path(tmp_path):
+    return str(tmp_path / 'chunks.ingest.log')
+
+def open_log(collection, log_path):
+    # no background flushes during a test; flush() is called explicitly
+    log = IngestionLog(collection, log_path=log_path, flush_interval=3600)
+    log.start()
+    return log
+
+def test_replays_only_unapplied_operations_after_crash(log_path):
+    collection = FakeCollection()
+    log = open_log(collection, log_path)
+    log.upsert(**chunk('a.py', 1))
+    assert log.flush() == 1
+    log.upsert(**chunk('a.py', 2))
+    log.delete(['a.py:1'])
+    # crash: the process dies without close(), so the last two operations were never applied
+    assert set(collection.docs) == {'a.py:1'}
+
+    recovered = FakeCollection()
+    recovered.docs = dict(collection.docs)
+    restarted = open_log(recovered, log_path)
+    restarted.close()
+    assert set(recovered.docs) == {'a.py:2'}
+    # the checkpointed upsert of a.py:1 was not applied a second time
+    assert recovered.upserts == [['a.py:2']]
+
+def test_stale_chunks_go_only_after_the_new_ones_are_in(log_path):
+    collection = FakeCollection()
+    log = open_log(collection, log_path)
+    log.upsert(**chunk('a.py', 1))
+    log.upsert(**chunk('a.py', 2))
+    log.flush()
+
+    # a.py re-indexed: chunk 2 is gone, chunk 3 is new; a flush lands between upsert and cleanup
+    log.upsert(**chunk('a.py', 3))
+    log.flush()
+    assert set(collection.docs) == {'a.py:1', 'a.py:2', 'a.py:3'}
+    log.delete_where_except({'file_path': 'a.py'}, ['a.py:1', 'a.py:3'])
+    log.flush()
+    assert set(collection.docs) == {'a.py:1', 'a.py:3'}
+
+def test_later_upserts_survive_an_earlier_cleanup_in_the_same_batch(log_path):
+    collection = FakeCollection()
+    log = open_log(collection, log_path)
+    log.upsert(**chunk('a.py', 1))
+    log.delete_where_except({'file_path': 'a.py'}, ['a.py:1'])
+    # the next edit of a.py, still without its own cleanup
+    log.upsert(**chunk('a.py', 2))
+    log.flush()
+    assert set(collection.docs) == {'a.py:1', 'a.py:2'}
+
+def test_delete_where_then_upsert_keeps_the_upsert(log_path):
+    collection = FakeCollection()
+    log = open_log(collection, log_path)
+    log.upsert(**chunk('a.py', 1))
+    log.flush()
+    log.delete_where({'file_path': 'a.py'})
+    log.upsert(**chunk('a.py', 2))
+    log.flush()
+    assert set(collection.docs) == {'a.py:2'}
+
+def test_mixed_batch_keeps_embeddings_and_metadata(log_path):
+    collection = FakeCollection()
+    log = open_log(collection, log_path)
+    log.upsert(**chunk('a.py', 1))
+    log.upsert(ids=['note'], documents=['no vector, no metadata'])
+    log.flush()
+    assert collection.docs['a.py:1'] == {'document': 'code 1', 'embedding': [1.0], 'metadata': {'file_path': 'a.py'}}
+    assert collection.docs['note'] == {'document': 'no vector, no metadata', 'embedding': None, 'metadata': None}
@@ -0,0 +1,22 @@
+import json
+from agent.prompt_layout import canonicalize_message, canonicalize_tool_schema, prefix_fingerprint
+
+def tool(name, **properties):
+    return {'type': 'function', 'function': {'name': name, 'parameters': {'type': 'object', 'properties': properties}}}
+
+def test_tool_schema_is_byte_stable_regardless_of_order():
+    first = canonicalize_tool_schema([tool('read_file', path={'type': 'string'}), tool('list_files')])
+    second = canonicalize_tool_schema([tool('list_files'), {'function': {'parameters': {'properties': {'path': {'type': 'string'}}, 'type': 'object'}, 'name': 'read_file'}, 'type': 'function'}])
+    assert json.dumps(first) == json.dumps(second)
+    assert [t['function']['name'] for t in first] == ['list_files', 'read_file']
+
+def test_canonicalize_message_normalizes_whitespace():
+    message = canonicalize_message({'role': 'system', 'content': 'You are helpful.  \r\nUse tools.\n\n'})
+    assert message == {'role': 'system', 'content': 'You are helpful.\nUse tools.\n'}
+    assert canonicalize_message(message) == message
+
+def test_prefix_fingerprint_changes_with_prefix():
+    tools = canonicalize_tool_schema([tool('list_files')])
+    system = [{'role': 'system', 'content': 'a\n'}]
+    assert prefix_fingerprint(system, tools) == prefix_fingerprint(list(system), list(tools))
+    assert prefix_fingerprint(system, tools) != prefix_fingerprint([{'role': 'system', 'content': 'b\n'}], tools)
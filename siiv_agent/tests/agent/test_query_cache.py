@@ -0,0 +1,44 @@
+import pytest
+from agent import query_cache
+from agent.query_cache import QueryResultCache, make_cache_key
+
+@pytest.fixture
+def cache():
+    return QueryResultCache(max_entries=2, ttl_seconds=60)
+
+def test_key_normalizes_whitespace_and_case():
+    key1 = make_cache_key('  Find  the Parser ', 5, None, 1)
+    key2 = make_cache_key('find the parser', 5, None, 1)
+    assert key1 == key2
+
+def test_key_changes_with_index_version_top_k_and_filters():
+    base = make_cache_key('query', 5, None, 1)
+    assert make_cache_key('query', 5, None, 2) != base
+    assert make_cache_key('query', 10, None, 1) != base
+    assert make_cache_key('query', 5, {'code_type': 'function'}, 1) != base
+
+def test_hit_and_miss_are_counted(cache):
+    assert cache.get('a') is None
+    cache.put('a', ['chunk'])
+    assert cache.get('a') == ['chunk']
+    stats = cache.stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+    assert stats['hit_rate'] == 0.5
+
+def test_least_recently_used_entry_is_evicted(cache):
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.stats()['evictions'] == 1
+
+def test_expired_entry_is_a_miss(cache, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(query_cache.time, 'monotonic', lambda: now[0])
+    cache.put('a', 1)
+    now[0] += 61
+    assert cache.get('a') is None
+    assert cache.stats()['expirations'] == 1
@@ -0,0 +1,93 @@
+import pytest
+from agent.session_log import SessionLog, SessionLogError
+
+SYSTEM = {'role': 'system', 'content': 'system'}
+TASK = {'role': 'user', 'content': 'task'}
+
+def make_log(tmp_path):
+    log = SessionLog(str(tmp_path), 'abc')
+    log.start('task', '/repo')
+    return log
+
+def test_resume_from_last_checkpoint(tmp_path):
+    log = make_log(tmp_path)
+    messages = [SYSTEM, TASK]
+    log.checkpoint(0, messages, {'turn': 0})
+    messages = messages + [{'role': 'assistant', 'tool_calls': []}, {'role': 'tool', 'content': 'out'}]
+    log.checkpoint(1, messages, {'turn': 1})
+    log.close()
+
+    replay = SessionLog(str(tmp_path), 'abc').load()
+    assert replay.query_text == 'task'
+    assert replay.current_working_dir == '/repo'
+    assert replay.messages == messages
+    assert replay.state == {'turn': 1}
+    assert replay.pending_response is None
+    assert not replay.finished
+
+def test_only_new_messages_are_appended(tmp_path):
+    log = make_log(tmp_path)
+    log.checkpoint(0, [SYSTEM, TASK], {})
+    log.checkpoint(1, [SYSTEM, TASK, {'role': 'user', 'content': 'more'}], {})
+    lines = log.path.read_text().splitlines()
+    assert '"snapshot"' not in lines[-1]
+    assert lines[-1].count('"role"') == 1
+
+def test_rewritten_history_is_snapshotted(tmp_path):
+    log = make_log(tmp_path)
+    log.checkpoint(0, [SYSTEM, TASK, {'role': 'tool', 'content': 'long output'}], {})
+    compacted = [SYSTEM, TASK, {'role': 'tool', 'content': 'elided'}]
+    log.checkpoint(1, compacted, {})
+    log.close()
+    assert '"snapshot"' in log.path.read_text().splitlines()[-1]
+    assert SessionLog(str(tmp_path), 'abc').load().messages == compacted
+
+def test_pending_response_survives_crash(tmp_path):
+    log = make_log(tmp_path)
+    log.checkpoint(0, [SYSTEM, TASK], {'turn': 0})
+    log.record_response(1, {'content': 'reading', 'tool_calls': [], 'usage': None, 'model': 'm'})
+    log.close()
+    # partial line from a crash mid-write
+    with open(log.path, 'a') as handle:
+        handle.write('{"type": "checkp')
+
+    replay = SessionLog(str(tmp_path), 'abc').load()
+    assert replay.pending_response['content'] == 'reading'
+    assert replay.messages == [SYSTEM, TASK]
+
+def test_resumed_log_keeps_appending(tmp_path):
+    log = make_log(tmp_path)
+    log.checkpoint(0, [SYSTEM, TASK], {})
+    log.close()
+
+    resumed = SessionLog(str(tmp_path), 'abc')
+    replay = resumed.load()
+    resumed.checkpoint(1, replay.messages + [{'role': 'user', 'content': 'more'}], {})
+    resumed.finish('done')
+    resumed.close()
+
+    replay = SessionLog(str(tmp_path), 'abc').load()
+    assert len(replay.messages) == 3
+    assert replay.finished and replay.final_message == 'done'
+
+def test_missing_log(tmp_path):
+    with pytest.raises(SessionLogError):
+        SessionLog(str(tmp_path), 'nope').load()
+
+def test_resume_after_partial_write_keeps_later_records(tmp_path):
+    log = make_log(tmp_path)
+    log.checkpoint(0, [SYSTEM, TASK], {'turn': 0})
+    log.close()
+    with open(log.path, 'a') as handle:
+        handle.write('{"type": "checkp')
+
+    resumed = SessionLog(str(tmp_path), 'abc')
+    messages = resumed.load().messages + [{'role': 'assistant', 'content': 'reading'}]
+    resumed.checkpoint(1, messages, {'turn': 1})
+    messages = messages + [{'role': 'user', 'content': 'more'}]
+    resumed.checkpoint(2, messages, {'turn': 2})
+    resumed.close()
+
+    replay = SessionLog(str(tmp_path), 'abc').load()
+    assert replay.messages == messages
+    assert replay.state == {'turn': 2}
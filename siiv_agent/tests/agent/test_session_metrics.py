@@ -0,0 +1,40 @@
+import pytest
+from agent.session_metrics import SessionMetrics, estimate_cost, parse_usage, percentile
+
+def test_percentile():
+    assert percentile([], 50) is None
+    assert percentile([3.0], 90) == 3.0
+    assert percentile([1.0, 2.0, 3.0, 4.0, 5.0], 50) == 3.0
+    assert percentile([1.0, 2.0], 50) == pytest.approx(1.5)
+
+def test_parse_usage_reads_cached_tokens():
+    usage = {'prompt_tokens': 1000, 'completion_tokens': 50, 'prompt_tokens_details': {'cached_tokens': 800}}
+    assert parse_usage(usage) == {'prompt_tokens': 1000, 'completion_tokens': 50, 'cached_tokens': 800}
+    assert parse_usage(None) == {'prompt_tokens': 0, 'completion_tokens': 0, 'cached_tokens': 0}
+
+def test_estimate_cost_discounts_cached_tokens():
+    full = estimate_cost('gpt-4o-mini', 1_000_000, 0)
+    cached = estimate_cost('gpt-4o-mini', 1_000_000, 0, cached_tokens=1_000_000)
+    assert full == pytest.approx(0.15)
+    assert cached == pytest.approx(0.075)
+    assert estimate_cost('gemma-2-9b-tf', 1_000_000, 1_000_000) == 0.0
+
+def test_summary_aggregates_llm_and_tool_calls():
+    metrics = SessionMetrics()
+    metrics.record_llm_call('gpt-4o-mini', {'prompt_tokens': 100, 'completion_tokens': 10}, 1.0)
+    metrics.record_llm_call('gpt-4o-mini', {'prompt_tokens': 300, 'completion_tokens': 30}, 3.0)
+    metrics.record_tool_call('read_file', 0.1, 5000)
+    metrics.record_tool_call('read_file', 0.3, 1000)
+    metrics.record_tool_call('list_files', 0.2, 200)
+
+    summary = metrics.summary()
+    assert summary['llm']['calls'] == 2
+    assert summary['llm']['prompt_tokens'] == 400
+    assert summary['llm']['latency_seconds']['p50'] == pytest.approx(2.0)
+    assert summary['tools']['read_file']['calls'] == 2
+    assert summary['tools']['read_file']['output_chars'] == 6000
+    assert summary['tools']['read_file']['max_output_chars'] == 5000
+
+    table = metrics.format_table()
+    # the tool adding the most context is listed first
+    assert table.index('read_file') < table.index('list_files')
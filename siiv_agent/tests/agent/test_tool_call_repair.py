@@ -0,0 +1,81 @@
+import pytest
+from agent.tool_call_repair import ToolCallRepairError, ToolCallRepairer, extract_block, validate_tool_call
+
+TOOLS = [
+    {'type': 'function', 'function': {'name': 'replace_in_file', 'parameters': {
+        'type': 'object',
+        'properties': {'file_path': {'type': 'string'}, 'diff': {'type': 'string'}},
+        'required': ['file_path', 'diff'],
+    }}},
+    {'type': 'function', 'function': {'name': 'list_files', 'parameters': {
+        'type': 'object',
+        'properties': {'directory': {'type': 'string'}, 'recursive': {'type': 'boolean'}},
+        'required': ['directory'],
+    }}},
+]
+
+@pytest.fixture
+def repairer():
+    return ToolCallRepairer(TOOLS)
+
+def test_extract_block_without_end_tag():
+    assert extract_block('Let me look.\n[TOOL_REQUEST]\n{"name": "list_files"}') == '{"name": "list_files"}'
+    assert extract_block('[TOOL_REQUEST] {"a": 1} [END_TOOL_REQUEST] trailing') == '{"a": 1}'
+    assert extract_block('no tool here') is None
+
+@pytest.mark.parametrize('block, fix', [
+    ('{"name": "list_files", "arguments": {"directory": ".",},}', 'trailing_commas'),
+    ('{"name": "replace_in_file", "arguments": {"file_path": "a.py", "diff": "line one\nline two"}}', 'control_chars'),
+    ('{"name": "list_files", "arguments": {"directory": "src"', 'unclosed_brackets'),
+    ('```json\n{"name": "list_files", "arguments": {"directory": "."}}\n```', 'code_fence'),
+])
+def test_mechanical_fixes(repairer, block, fix):
+    result = repairer.repair(f'[TOOL_REQUEST]{block}[END_TOOL_REQUEST]')
+    assert fix in result.fixes
+    assert result.name in ('list_files', 'replace_in_file')
+
+@pytest.mark.parametrize('name, argument', [('write_to_file', 'content'), ('replace_in_file', 'diff')])
+def test_string_values_survive_repair_byte_for_byte(name, argument):
+    tools = TOOLS + [{'type': 'function', 'function': {'name': 'write_to_file', 'parameters': {
+        'type': 'object', 'properties': {'file_path': {'type': 'string'}, 'content': {'type': 'string'}},
+    }}}]
+    value = 'X = [\n    1,\n    2,\n]\nd = {"k": 1, }\ne = [3,]'
+    escaped_quotes = value.replace('"', '\\"')
+    # raw newlines (control_chars) plus a real trailing comma outside the strings (trailing_commas)
+    block = f'{{"name": "{name}", "arguments": {{"file_path": "a.py", "{argument}": "{escaped_quotes}",}}}}'
+    result = ToolCallRepairer(tools).repair(f'[TOOL_REQUEST]{block}[END_TOOL_REQUEST]')
+    assert result.fixes == ['control_chars', 'trailing_commas']
+    assert result.arguments[argument] == value
+
+def test_single_quotes_and_python_literals(repairer):
+    result = repairer.repair("[TOOL_REQUEST]{'name': 'list_files', 'arguments': {'directory': '.', 'recursive': True}}")
+    assert result.arguments == {'directory': '.', 'recursive': True}
+
+def test_repaired_call_must_match_schema(repairer):
+    with pytest.raises(ToolCallRepairError, match='Missing required argument'):
+        repairer.repair('[TOOL_REQUEST]{"name": "list_files", "arguments": {}}[END_TOOL_REQUEST]')
+    with pytest.raises(ToolCallRepairError, match='Unknown tool'):
+        repairer.repair('[TOOL_REQUEST]{"name": "rm_rf", "arguments": {}}[END_TOOL_REQUEST]')
+
+@pytest.mark.parametrize('block', [
+    "{'name': 'list_files', 'arguments': {[1]: 2}}",
+    "{'name': 'list_files', 'arguments': {'directory': {1, 2}}}",
+    "{'name': ['list_files'], 'arguments': {}}",
+])
+def test_unusable_python_literals_are_repair_errors(repairer, block):
+    with pytest.raises(ToolCallRepairError):
+        repairer.repair(f'[TOOL_REQUEST]{block}[END_TOOL_REQUEST]')
+
+def test_stats_track_success_rate(repairer):
+    repairer.repair('[TOOL_REQUEST]{"name": "list_files", "arguments": {"directory": ".",}}')
+    with pytest.raises(ToolCallRepairError):
+        repairer.repair('[TOOL_REQUEST] this is not json at all')
+    stats = repairer.stats()
+    assert stats['attempts'] == 2
+    assert stats['repaired'] == 1
+    assert stats['success_rate'] == 0.5
+    assert stats['fixes']['trailing_commas'] == 1
+
+def test_validate_tool_call_types():
+    assert validate_tool_call('list_files', {'directory': '.', 'recursive': 'yes'}, TOOLS) == ["Argument 'recursive' should be of type boolean"]
+    assert validate_tool_call('list_files', {'directory': '.'}, TOOLS) == []
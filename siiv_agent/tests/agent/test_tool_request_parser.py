@@ -0,0 +1,53 @@
+import json
+
+import pytest
+from agent import tool_request_parser
+from agent.tool_request_parser import (BadToolRequestError, InvalidCommandJson, NoToolRequestError,
+                                       find_last_tool_request, parse_tool_request_to_llm_format)
+
+def test_parses_last_block():
+    text = (
+        '[TOOL_REQUEST]{"name": "first", "arguments": {}}[END_TOOL_REQUEST]\n'
+        'Then:\n[TOOL_REQUEST]\n{"name": "list_files", "arguments": {"directory": "."}}\n[/TOOL_REQUEST]'
+    )
+    tool_call = parse_tool_request_to_llm_format(text)
+    assert tool_call['function']['name'] == 'list_files'
+    assert json.loads(tool_call['function']['arguments']) == {'directory': '.'}
+    assert tool_call['id']
+
+def test_block_with_regex_characters():
+    # "({" used to reach a broken re.sub and crash every parse
+    text = '[TOOL_REQUEST] ({"name": "x"} [END_TOOL_REQUEST]'
+    assert find_last_tool_request(text) == '({"name": "x"}'
+    assert find_last_tool_request('[TOOL_REQUEST]{"name": "x", "arguments": {"p": "a(b"}}[END_TOOL_REQUEST]')
+
+def test_missing_tags():
+    with pytest.raises(NoToolRequestError):
+        parse_tool_request_to_llm_format('no tool request here')
+    with pytest.raises(BadToolRequestError):
+        parse_tool_request_to_llm_format('{"name": "x"} [END_TOOL_REQUEST]')
+
+def test_invalid_json_without_lenient_parser(monkeypatch):
+    monkeypatch.setattr(tool_request_parser, 'demjson3', None)
+    with pytest.raises(InvalidCommandJson):
+        parse_tool_request_to_llm_format("[TOOL_REQUEST]{name: 'x'}[END_TOOL_REQUEST]")
+
+def test_lenient_parser_only_on_fallback(monkeypatch):
+    calls = []
+
+    class FakeDemjson:
+        @staticmethod
+        def decode(block):
+            calls.append(block)
+            return {'name': 'lenient', 'arguments': {}}
+
+    monkeypatch.setattr(tool_request_parser, 'demjson3', FakeDemjson)
+    parse_tool_request_to_llm_format('[TOOL_REQUEST]{"name": "strict"}[END_TOOL_REQUEST]')
+    assert calls == []
+    tool_call = parse_tool_request_to_llm_format("[TOOL_REQUEST]{name: 'x'}[END_TOOL_REQUEST]")
+    assert tool_call['function']['name'] == 'lenient'
+    assert len(calls) == 1
+
+def test_requires_name():
+    with pytest.raises(InvalidCommandJson):
+        parse_tool_request_to_llm_format('[TOOL_REQUEST][1, 2][END_TOOL_REQUEST]')
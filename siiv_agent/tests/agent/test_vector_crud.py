@@ -0,0 +1,63 @@
+import chromadb
+import pytest
+import vector_crud
+from embedding_collections import get_or_create_model_collection, read_index_version, write_active_collection
+
+MIGRATED_MODEL = 'text-embedding-migrated'
+
+@pytest.fixture
+def crud(tmp_path, monkeypatch):
+    chroma_path = str(tmp_path / 'chroma')
+    active = get_or_create_model_collection(chromadb.PersistentClient(chroma_path), model=MIGRATED_MODEL, dimension=3)
+    write_active_collection(chroma_path, collection_name=active.name, model=MIGRATED_MODEL, dimension=3)
+    monkeypatch.setattr(vector_crud, 'CHROMA_LOCAL_PATH', chroma_path)
+    monkeypatch.setattr(vector_crud, '_client', None)
+    monkeypatch.setattr(vector_crud, '_collection', None)
+    monkeypatch.setattr(vector_crud, '_ingestion_log', None)
+    return vector_crud
+
+def version(crud):
+    return read_index_version(crud.CHROMA_LOCAL_PATH, crud.get_collection().name)
+
+def embedding(n):
+    return [float(n), 1.0, 0.0]
+
+def test_crud_round_trip_bumps_the_index_version(crud):
+    crud.create_document('doc-1', 'original', embedding(1))
+    assert version(crud) == 1
+    assert crud.read_document('doc-1')['documents'] == ['original']
+
+    crud.update_document('doc-1', 'updated', embedding(2))
+    assert version(crud) == 2
+    assert crud.read_document('doc-1')['documents'] == ['updated']
+
+    crud.delete_document('doc-1')
+    assert version(crud) == 3
+    assert crud.read_document('doc-1')['ids'] == []
+
+def test_batched_writes_bump_the_index_version(crud):
+    crud.upsert_documents(ids=['a', 'b'], documents=['A', 'B'], embeddings=[embedding(1), embedding(2)])
+    crud.delete_documents(ids=['a'])
+    assert version(crud) == 2
+    assert crud.get_documents(['a', 'b'], include=['documents'])['documents'] == ['B']
+
+def test_iter_documents_pages_through_everything(crud):
+    ids = [f'doc-{n}' for n in range(5)]
+    crud.upsert_documents(ids=ids, documents=[f'text {n}' for n in range(5)], embeddings=[embedding(n) for n in range(5)],
+                          metadatas=[{'n': n} for n in range(5)])
+
+    pages = list(crud.iter_documents(page_size=2))
+    assert [len(page['ids']) for page in pages] == [2, 2, 1]
+    assert sorted(doc_id for page in pages for doc_id in page['ids']) == ids
+    assert {metadata['n'] for page in pages for metadata in page['metadatas']} == set(range(5))
+    assert sorted(crud.list_all_ids()) == ids
+
+def test_empty_collection(crud):
+    assert list(crud.iter_documents()) == []
+    assert crud.list_all_ids() == []
+
+def test_writes_go_to_the_active_collection(crud):
+    crud.upsert_documents(ids=['a'], documents=['A'], embeddings=[embedding(1)])
+    collection = crud.get_collection()
+    assert collection.metadata['embedding_model'] == MIGRATED_MODEL
+    assert collection.get(ids=['a'])['ids'] == ['a']
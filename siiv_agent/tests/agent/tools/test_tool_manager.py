@@ -0,0 +1,94 @@
+import threading
+import time
+
+from agent.tools.finish_task_tool import TaskCompleteError
+from agent.tools.tool_interface import ToolExecutionResult, ToolInterface
+from agent.tools.tool_manager import ToolManager
+
+class RecordingTool(ToolInterface):
+    def __init__(self, name, read_only, log, delay=0.0, barrier=None):
+        self.name = name
+        self.read_only = read_only
+        self._log = log
+        self._delay = delay
+        self._barrier = barrier
+
+    def get_schema(self):
+        return {'type': 'function', 'function': {'name': self.name, 'parameters': {'type': 'object', 'properties': {}}}}
+
+    def execute(self, **kwargs):
+        self._log.append(('start', self.name, kwargs.get('n')))
+        if self._barrier:
+            # only passes if the other read-only calls are running at the same time
+            self._barrier.wait(timeout=2)
+        time.sleep(self._delay)
+        self._log.append(('end', self.name, kwargs.get('n')))
+        return ToolExecutionResult(self.name, kwargs, f'{self.name} {kwargs.get("n")}', '', 0)
+
+class FinishTool(RecordingTool):
+    def execute(self, **kwargs):
+        raise TaskCompleteError('done')
+
+def test_read_only_calls_run_concurrently_in_order():
+    log = []
+    barrier = threading.Barrier(3)
+    manager = ToolManager([RecordingTool('read_file', True, log, barrier=barrier)])
+    outcomes = manager.execute_tool_calls([('read_file', {'n': n}) for n in range(3)])
+    assert not barrier.broken
+    assert [outcome.result.stdout for outcome in outcomes] == ['read_file 0', 'read_file 1', 'read_file 2']
+
+def test_mutating_calls_are_barriers():
+    log = []
+    manager = ToolManager([
+        RecordingTool('read_file', True, log, delay=0.01),
+        RecordingTool('write_to_file', False, log),
+    ])
+    calls = [('read_file', {'n': 0}), ('read_file', {'n': 1}), ('write_to_file', {'n': 2}), ('read_file', {'n': 3})]
+    outcomes = manager.execute_tool_calls(calls)
+    write_start = log.index(('start', 'write_to_file', 2))
+    assert ('end', 'read_file', 0) in log[:write_start]
+    assert ('end', 'read_file', 1) in log[:write_start]
+    assert log.index(('start', 'read_file', 3)) > log.index(('end', 'write_to_file', 2))
+    assert [outcome.name for outcome in outcomes] == ['read_file', 'read_file', 'write_to_file', 'read_file']
+
+def test_stops_after_task_complete():
+    log = []
+    manager = ToolManager([RecordingTool('read_file', True, log), FinishTool('finish_task', False, log)])
+    outcomes = manager.execute_tool_calls([('finish_task', {}), ('read_file', {'n': 1})])
+    assert isinstance(outcomes[0].error, TaskCompleteError)
+    assert outcomes[1].result is None and outcomes[1].error is None
+    assert log == []
+
+def test_unknown_tool_has_no_result():
+    manager = ToolManager([])
+    outcomes = manager.execute_tool_calls([('nope', {}), ('nope', {})])
+    assert [outcome.result for outcome in outcomes] == [None, None]
+
+def test_cancelled_calls_are_not_started():
+    log = []
+    cancelled = threading.Event()
+
+    class CancellingTool(RecordingTool):
+        def execute(self, **kwargs):
+            cancelled.set()
+            return super().execute(**kwargs)
+
+    manager = ToolManager([CancellingTool('write_to_file', False, log), RecordingTool('read_file', True, log)])
+    outcomes = manager.execute_tool_calls([('write_to_file', {'n': 0}), ('read_file', {'n': 1}), ('write_to_file', {'n': 2})],
+                                          cancelled=cancelled)
+
+    assert log == [('start', 'write_to_file', 0), ('end', 'write_to_file', 0)]
+    assert outcomes[0].result.stdout == 'write_to_file 0'
+    assert [type(outcome.error).__name__ for outcome in outcomes[1:]] == ['ToolCallCancelledError'] * 2
+
+def test_close_stops_the_worker_threads():
+    manager = ToolManager([RecordingTool('read_file', True, [])])
+    manager.execute_tool_calls([('read_file', {'n': n}) for n in range(3)])
+    workers = list(manager._executor._threads)
+    assert workers and all(worker.is_alive() for worker in workers)
+
+    manager.close()
+    assert not any(worker.is_alive() for worker in workers)
+    # still usable afterwards
+    assert [o.result.stdout for o in manager.execute_tool_calls([('read_file', {'n': 1}), ('read_file', {'n': 2})])] == ['read_file 1', 'read_file 2']
+    manager.close()
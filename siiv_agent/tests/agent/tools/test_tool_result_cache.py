@@ -0,0 +1,64 @@
+from agent.tools.tool_interface import ToolExecutionResult, ToolInterface
+from agent.tools.tool_manager import ToolManager
+from agent.tools.tool_result_cache import ToolResultCache
+
+class CountingTool(ToolInterface):
+    def __init__(self, name, read_only):
+        self.name = name
+        self.read_only = read_only
+        self.calls = 0
+
+    def get_schema(self):
+        return {'type': 'function', 'function': {'name': self.name, 'parameters': {'type': 'object', 'properties': {}}}}
+
+    def execute(self, **kwargs):
+        self.calls += 1
+        return ToolExecutionResult(self.name, kwargs, f'{self.name} output {self.calls}', '', 0)
+
+def make_manager(root='/repo'):
+    tools = {
+        'read_file': CountingTool('read_file', True),
+        'list_files': CountingTool('list_files', True),
+        'write_to_file': CountingTool('write_to_file', False),
+        'execute_command': CountingTool('execute_command', False),
+    }
+    return ToolManager(list(tools.values()), result_cache=ToolResultCache(root)), tools
+
+def test_repeat_returns_reference():
+    manager, tools = make_manager()
+    first = manager.execute_tool_by_name('read_file', {'file_path': 'src/a.py'})
+    # same file spelled differently
+    again = manager.execute_tool_by_name('read_file', {'file_path': './src/../src/a.py'})
+    assert tools['read_file'].calls == 1
+    assert first.stdout == 'read_file output 1'
+    assert 'Unchanged since tool call 1' in again.stdout
+    assert manager.result_cache.stats()['hits'] == 1
+
+def test_write_invalidates_file_and_containing_directory():
+    manager, tools = make_manager()
+    manager.execute_tool_by_name('read_file', {'file_path': 'src/a.py'})
+    manager.execute_tool_by_name('read_file', {'file_path': 'src/b.py'})
+    manager.execute_tool_by_name('list_files', {'directory': 'src', 'recursive': True})
+    manager.execute_tool_by_name('write_to_file', {'file_path': 'src/a.py', 'content': 'x'})
+
+    assert manager.execute_tool_by_name('read_file', {'file_path': 'src/a.py'}).stdout == 'read_file output 3'
+    assert manager.execute_tool_by_name('list_files', {'directory': 'src', 'recursive': True}).stdout == 'list_files output 2'
+    assert 'Unchanged' in manager.execute_tool_by_name('read_file', {'file_path': 'src/b.py'}).stdout
+
+def test_command_clears_everything():
+    manager, tools = make_manager()
+    manager.execute_tool_by_name('read_file', {'file_path': 'a.py'})
+    manager.execute_tool_by_name('execute_command', {'command': 'black .'})
+    manager.execute_tool_by_name('read_file', {'file_path': 'a.py'})
+    assert tools['read_file'].calls == 2
+
+def test_failures_are_not_cached():
+    cache = ToolResultCache('/repo')
+    cache.store('read_file', {'file_path': 'missing.py'}, ToolExecutionResult('read_file', {}, '', 'not found', 1), step=1)
+    assert cache.lookup('read_file', {'file_path': 'missing.py'}) is None
+
+def test_different_arguments_miss():
+    manager, tools = make_manager()
+    manager.execute_tool_by_name('list_files', {'directory': 'src', 'recursive': True})
+    manager.execute_tool_by_name('list_files', {'directory': 'src', 'recursive': False})
+    assert tools['list_files'].calls == 2